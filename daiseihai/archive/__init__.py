@@ -0,0 +1 @@
+default_app_config = 'daiseihai.archive.apps.ArchiveConfig'
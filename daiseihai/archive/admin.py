@@ -1,6 +1,41 @@
-from django.contrib import admin
+import datetime
 
-from daiseihai.archive import forms, models
+from django.contrib import admin, messages
+
+from daiseihai.archive import forms, images, models, probe, signals
+
+
+class ChatAdmin(admin.ModelAdmin):
+    form = forms.ChatForm
+    list_display = ('__str__', 'line_count', 'coverage', 'size')
+
+    def coverage(self, obj):
+        """Time span covered by the chat log."""
+        if obj.first_timestamp is None:
+            return None
+        start = datetime.datetime.fromtimestamp(obj.first_timestamp / 1000,
+                                                tz=datetime.timezone.utc)
+        end = datetime.datetime.fromtimestamp(obj.last_timestamp / 1000,
+                                              tz=datetime.timezone.utc)
+        return f'{start:%Y-%m-%d %H:%M:%S} – {end:%Y-%m-%d %H:%M:%S}'
+
+
+class EmoteInline(admin.TabularInline):
+    model = models.Emote
+
+
+class TeamIconInline(admin.TabularInline):
+    model = models.TeamIcon
+
+
+class LeagueAdmin(admin.ModelAdmin):
+    inlines = [EmoteInline, TeamIconInline]
+
+    def changeform_view(self, *args, **kwargs):
+        # Update the chat of the league once for the league and all of its
+        # changed emotes and team icons.
+        with signals.league_chat_updates():
+            return super().changeform_view(*args, **kwargs)
 
 
 class MatchupInline(admin.TabularInline):
@@ -11,6 +46,15 @@ class VideoBookmarkInline(admin.TabularInline):
     model = models.VideoBookmark
 
 
+class TournamentAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        for _, error in images.build_renditions([obj], [], workers=1):
+            if error:
+                self.message_user(request, f'Unable to render logo: {error}',
+                                  level=messages.WARNING)
+
+
 class VideoAdmin(admin.ModelAdmin):
     inlines = [MatchupInline, VideoBookmarkInline]  
     form = forms.VideoForm
@@ -26,11 +70,50 @@ class VideoAdmin(admin.ModelAdmin):
                 ('chat_start', 'sync_help_video_timestamp', 'sync_help_chat_timestamp'),
             )
         }),
+        ('Media', {
+            'fields': (
+                ('duration', 'bitrate'),
+                ('width', 'height'),
+                ('video_codec', 'audio_codec'),
+            )
+        }),
     )
+    readonly_fields = ('duration', 'bitrate', 'width', 'height', 'video_codec', 'audio_codec')
+
+    actions = ['suggest_chat_start', 'probe_media']
+
+    def probe_media(self, request, queryset):
+        """Read the duration and other metadata of the local video files."""
+        probed = 0
+        for video, error in probe.probe_videos(queryset.select_related('chat'), force=True):
+            if error:
+                self.message_user(request, f'Unable to probe {video}: {error}',
+                                  level=messages.ERROR)
+            else:
+                probed += 1
+        self.message_user(request, f'Probed {probed} video(s).')
+    probe_media.short_description = 'Read metadata from video files'
+
+    def suggest_chat_start(self, request, queryset):
+        """Fill in missing chat start timestamps from chat activity."""
+        updated = 0
+        for video in queryset.filter(chat__isnull=False, chat_start__isnull=True):
+            chat_start = video.suggest_chat_start()
+            if chat_start is not None:
+                video.chat_start = chat_start
+                video.save(update_fields=['chat_start'])
+                video.update_chat_slice()
+                updated += 1
+        self.message_user(request, f'Suggested chat start for {updated} video(s).')
+    suggest_chat_start.short_description = 'Suggest chat start from chat activity'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        obj.update_chat_slice()
 
 
-admin.site.register(models.Chat)
-admin.site.register(models.League)
+admin.site.register(models.Chat, ChatAdmin)
+admin.site.register(models.League, LeagueAdmin)
 admin.site.register(models.Team)
-admin.site.register(models.Tournament)
+admin.site.register(models.Tournament, TournamentAdmin)
 admin.site.register(models.Video, VideoAdmin)
@@ -0,0 +1,229 @@
+"""Read-only JSON API of the archive.
+
+Rows are serialized straight from `values()` queries without creating model
+instances. Video listings are paginated with a keyset cursor on
+`(date, order, id)`, so deep pages cost as much as the first one, and every
+response carries the ETag of the version stamps of its content.
+"""
+import datetime
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views import View
+
+from daiseihai.archive import models
+from daiseihai.archive.views import VersionedPageMixin
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_TOURNAMENT_FIELDS = ('slug', 'name', 'start_date', 'end_date', 'league__slug', 'logo',
+                      'video_count')
+_TEAM_FIELDS = ('slug', 'name', 'main_color', 'secondary_color', 'game_count', 'video_count')
+_VIDEO_FIELDS = ('id', 'type', 'tournament__slug', 'date', 'order', 'part', 'part_count',
+                 'filename', 'url', 'duration', 'chat_id', 'chat_start')
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _media_url(model, field, name):
+    return model._meta.get_field(field).storage.url(name) if name else None
+
+
+def _tournament(row):
+    return {
+        'slug': row['slug'],
+        'name': row['name'],
+        'start_date': row['start_date'].isoformat(),
+        'end_date': row['end_date'].isoformat(),
+        'league': row['league__slug'],
+        'logo': _media_url(models.Tournament, 'logo', row['logo']),
+        'video_count': row['video_count'],
+    }
+
+
+def _team(row):
+    return {
+        'slug': row['slug'],
+        'name': row['name'],
+        'colors': [row['main_color'], row['secondary_color']],
+        'game_count': row['game_count'],
+        'video_count': row['video_count'],
+    }
+
+
+def _video(row, matchups):
+    kwargs = {'slug': row['tournament__slug'], 'date': row['date'].isoformat()}
+    return {
+        'id': row['id'],
+        'type': row['type'],
+        'tournament': row['tournament__slug'],
+        'date': row['date'].isoformat(),
+        'order': row['order'],
+        'part': row['part'],
+        'part_count': row['part_count'],
+        'page': reverse('video_detail_order', kwargs=dict(kwargs, order=row['order'])),
+        'link': row['url'] or urljoin(settings.VIDEO_URL, row['filename']),
+        'duration': row['duration'],
+        'chat': (reverse('video_chat', kwargs=dict(kwargs, order=row['order']))
+                 if row['chat_id'] and (row['chat_start'] or 0) > 0 else None),
+        'matchups': matchups.get(row['id'], []),
+    }
+
+
+def _matchups(video_ids) -> dict:
+    """Return the matchups of the videos with `video_ids` by video ID."""
+    matchups = {}
+    rows = models.Matchup.objects.filter(video__in=video_ids)\
+                                 .values_list('video', 'home__slug', 'away__slug', 'spoiler')\
+                                 .order_by('video', 'order')
+    for video_id, home, away, spoiler in rows.iterator():
+        matchups.setdefault(video_id, []).append(
+            {'home': home, 'away': away, 'spoiler': spoiler}
+        )
+    return matchups
+
+
+def _serialize_videos(queryset):
+    return _serialize_video_rows(list(queryset.values(*_VIDEO_FIELDS).iterator()))
+
+
+def _serialize_video_rows(rows):
+    matchups = _matchups([row['id'] for row in rows])
+    return [_video(row, matchups) for row in rows]
+
+
+def encode_cursor(date: str, order: int, pk: int) -> str:
+    return f'{date}.{order}.{pk}'
+
+
+def decode_cursor(cursor: str):
+    try:
+        date, order, pk = cursor.split('.')
+        return datetime.date.fromisoformat(date), int(order), int(pk)
+    except ValueError:
+        raise InvalidCursor(cursor)
+
+
+class APIView(VersionedPageMixin, View):
+    def get(self, request, *args, **kwargs):
+        try:
+            return JsonResponse(self.get_data())
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+
+class TournamentListAPIView(APIView):
+    def get_data(self):
+        tournaments = models.Tournament.objects.filter(video_count__gt=0)\
+                                               .values(*_TOURNAMENT_FIELDS)
+        return {'tournaments': [_tournament(row) for row in tournaments.iterator()]}
+
+
+class TournamentAPIView(APIView):
+    def get_version_scopes(self):
+        return [f'tournament:{self.kwargs["slug"]}']
+
+    def get_page_object(self):
+        row = models.Tournament.objects.filter(slug=self.kwargs['slug'])\
+                                       .values(*_TOURNAMENT_FIELDS).first()
+        if row is None:
+            raise Http404('No tournament found')
+        return row
+
+    def get_data(self):
+        return {'tournament': _tournament(self.page_object)}
+
+
+class TeamListAPIView(APIView):
+    def get_data(self):
+        teams = models.Team.objects.filter(game_count__gt=0).values(*_TEAM_FIELDS)
+        return {'teams': [_team(row) for row in teams.iterator()]}
+
+
+class TeamAPIView(APIView):
+    def get_version_scopes(self):
+        return [f'team:{self.kwargs["slug"]}']
+
+    def get_page_object(self):
+        row = models.Team.objects.filter(slug=self.kwargs['slug']).values(*_TEAM_FIELDS).first()
+        if row is None:
+            raise Http404('No team found')
+        return row
+
+    def get_data(self):
+        return {'team': _team(self.page_object)}
+
+
+class VideoListAPIView(APIView):
+    """Visible videos in `(date, order, id)` order, optionally of a single
+    tournament or team. `latest` lists the newest videos first.
+    """
+
+    latest = False
+    page_query_params = ('tournament', 'team', 'cursor', 'limit')
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.GET.get('limit', PAGE_SIZE))
+        except ValueError:
+            limit = PAGE_SIZE
+        return min(max(limit, 1), MAX_PAGE_SIZE)
+
+    def get_data(self):
+        queryset = models.Video.objects.filter(is_visible=True)
+        if 'tournament' in self.request.GET:
+            queryset = queryset.filter(tournament__slug=self.request.GET['tournament'])
+        if 'team' in self.request.GET:
+            team = models.Team.objects.filter(slug=self.request.GET['team']).first()
+            if team is None:
+                raise Http404('No team found')
+            queryset = queryset.filter(team.video_filter)
+
+        cursor = self.request.GET.get('cursor')
+        if cursor:
+            date, order, pk = decode_cursor(cursor)
+            if self.latest:
+                keyset = Q(date__lt=date) | Q(date=date, order__lt=order) | \
+                    Q(date=date, order=order, id__lt=pk)
+            else:
+                keyset = Q(date__gt=date) | Q(date=date, order__gt=order) | \
+                    Q(date=date, order=order, id__gt=pk)
+            queryset = queryset.filter(keyset)
+        ordering = ('-date', '-order', '-id') if self.latest else ('date', 'order', 'id')
+
+        limit = self.get_limit()
+        # One extra row tells whether there is a next page.
+        videos = _serialize_videos(queryset.order_by(*ordering)[:limit + 1])
+        next_cursor = None
+        if len(videos) > limit:
+            videos = videos[:limit]
+            last = videos[-1]
+            next_cursor = encode_cursor(last['date'], last['order'], last['id'])
+        return {'videos': videos, 'next': next_cursor}
+
+
+class VideoAPIView(APIView):
+    def get_version_scopes(self):
+        return [f'video:{self.kwargs["pk"]}']
+
+    def get_page_object(self):
+        row = models.Video.objects.filter(pk=self.kwargs['pk'], is_visible=True)\
+                                  .values(*_VIDEO_FIELDS).first()
+        if row is None:
+            raise Http404('No video found')
+        return row
+
+    def get_data(self):
+        video = _serialize_video_rows([self.page_object])[0]
+        video['bookmarks'] = [
+            {'name': name, 'position': position.total_seconds()}
+            for name, position in models.VideoBookmark.objects.filter(video=video['id'])
+                                                             .values_list('name', 'position')
+        ]
+        return {'video': video}
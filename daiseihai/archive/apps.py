@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.core import checks
+
+from daiseihai import compression
 
 
 class ArchiveConfig(AppConfig):
-    name = 'archive'
+    name = 'daiseihai.archive'
+
+    def ready(self):
+        from daiseihai.archive import signals  # noqa: F401
+        checks.register(compression.check_brotli, deploy=True)
@@ -0,0 +1,151 @@
+"""Query count and timing budgets for the archive views."""
+from collections import namedtuple
+import datetime
+import random
+import time
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from daiseihai.archive import constants, factories, models, stats
+
+ViewBudget = namedtuple('ViewBudget', ('queries', 'seconds'))
+Measurement = namedtuple('Measurement', ('name', 'path', 'queries', 'seconds', 'budget'))
+QueryPlan = namedtuple('QueryPlan', ('name', 'plan', 'seconds'))
+
+# Query counts must not grow with the size of the archive.
+VIEW_BUDGETS = {
+    'index': ViewBudget(queries=1, seconds=1.0),
+    'team_list': ViewBudget(queries=1, seconds=1.0),
+    'tournament': ViewBudget(queries=3, seconds=2.0),
+    'team_detail': ViewBudget(queries=3, seconds=2.0),
+    'video_detail': ViewBudget(queries=2, seconds=0.5),
+}
+
+# Page and fragment caches would hide the queries made by the views.
+_NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def populate(tournaments=200, videos_per_tournament=20, teams=100, seed=0):
+    """Fill the database with a synthetic archive. Every tournament plays on the
+    same days, videos on the same day are split into two parts and every tenth
+    tournament consists of single videos.
+    """
+    rng = random.Random(seed)
+    league = factories.LeagueFactory(name='Benchmark League', slug='bench-league')
+    # Not every database returns primary keys from bulk inserts, so the rows
+    # are fetched again by slug.
+    team_slugs = [f'bench-team-{i}' for i in range(teams)]
+    models.Team.objects.bulk_create(
+        factories.TeamFactory.build(name=f'/t{i}/', slug=slug)
+        for i, slug in enumerate(team_slugs)
+    )
+    team_objects = list(models.Team.objects.filter(slug__in=team_slugs))
+    # Point every tournament at the same logo name so that no logo files are
+    # written.
+    tournament_objects = [
+        factories.TournamentFactory.build(league=league, slug=f'bench-tournament-{i}',
+                                          logo='logos/benchmark.png')
+        for i in range(tournaments)
+    ]
+    models.Tournament.objects.bulk_create(tournament_objects)
+    tournament_objects = models.Tournament.objects.filter(
+        slug__in=[tournament.slug for tournament in tournament_objects]
+    ).order_by('start_date')
+
+    videos = []
+    for i, tournament in enumerate(tournament_objects):
+        video_type = constants.VIDEO_TYPE_SINGLE if i % 10 == 9 else constants.VIDEO_TYPE_NORMAL
+        for j in range(videos_per_tournament):
+            day = datetime.date(2100, 1, 1) + datetime.timedelta(days=j // 2)
+            videos.append(factories.VideoFactory.build(
+                tournament=tournament, type=video_type, date=day, order=j % 2 + 1,
+            ))
+    models.Video.objects.bulk_create(videos)
+
+    matchups = []
+    for video in models.Video.objects.filter(tournament__league=league):
+        count = 1 if video.type == constants.VIDEO_TYPE_SINGLE else 4
+        for order in range(1, count + 1):
+            home, away = rng.sample(team_objects, 2)
+            matchups.append(models.Matchup(video=video, home=home, away=away, order=order))
+    models.Matchup.objects.bulk_create(matchups)
+    # The last video gets a chat and bookmarks for the video page.
+    video = models.Video.objects.filter(tournament__league=league).last()
+    chat = factories.ChatFactory.build(file='chats/benchmark.txt')
+    chat.save()
+    models.Video.objects.filter(pk=video.pk).update(chat=chat, chat_start=1)
+    models.VideoBookmark.objects.bulk_create(
+        factories.VideoBookmarkFactory.build(video=video, position=datetime.timedelta(minutes=i))
+        for i in range(4)
+    )
+    # Bulk inserts skip the signals that keep the statistics up to date.
+    stats.rebuild()
+
+
+def view_paths():
+    """Return a representative URL path for each benchmarked view."""
+    tournament = models.Tournament.objects.filter(videos__type=constants.VIDEO_TYPE_NORMAL)\
+                                          .order_by('-start_date').first()
+    # The team with the longest history shows how team pages scale.
+    team = models.Team.objects.order_by('-video_count').first()
+    video = models.Video.objects.select_related('tournament')\
+                                .filter(bookmarks__isnull=False).distinct().last()
+    return {
+        'index': '/',
+        'team_list': '/teams/',
+        'tournament': f'/{tournament.slug}/',
+        'team_detail': f'/team/{team.slug}/',
+        'video_detail': f'/video/{video.tournament.slug}/{video.date}/{video.order}/',
+    }
+
+
+def view_querysets():
+    """Return the main query of each benchmarked view."""
+    paths = view_paths()
+    _, tournament_slug, date, order = paths['video_detail'].strip('/').split('/')
+    tournament = models.Tournament.objects.get(slug=paths['tournament'].strip('/'))
+    team = models.Team.objects.get(slug=paths['team_detail'].strip('/').split('/')[-1])
+    return {
+        'index': models.Tournament.objects.filter(video_count__gt=0),
+        'team_list': models.Team.objects.filter(video_count__gt=0),
+        'tournament': models.Video.objects.filter(tournament=tournament, is_visible=True),
+        'team_detail': team.videos.filter(is_visible=True),
+        'video_detail': models.Video.objects.filter(tournament__slug=tournament_slug,
+                                                    date=date, order=order),
+    }
+
+
+def explain(repeat=10):
+    """Return a `QueryPlan` with the query plan and the mean execution time of
+    the main query of each benchmarked view.
+    """
+    # PostgreSQL can report the actual row counts and timings of each node.
+    options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+    plans = []
+    for name, queryset in view_querysets().items():
+        plan = queryset.explain(**options)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.all())
+        plans.append(QueryPlan(name, plan, (time.perf_counter() - start) / repeat))
+    return plans
+
+
+def measure():
+    """Request every benchmarked view once and return a `Measurement` for each."""
+    client = Client()
+    measurements = []
+    with override_settings(CACHES=_NO_CACHE, VERSION_CACHE='default',
+                           ALLOWED_HOSTS=['testserver']):
+        for name, path in view_paths().items():
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(path)
+                seconds = time.perf_counter() - start
+            if response.status_code != 200:
+                raise AssertionError(f'{path} returned {response.status_code}')
+            measurements.append(Measurement(name, path, len(queries), seconds,
+                                            VIEW_BUDGETS[name]))
+    return measurements
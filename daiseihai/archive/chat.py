@@ -0,0 +1,432 @@
+"""Reading and indexing of chat logs.
+
+Chat logs are tab-separated text files with one message per line: timestamp in
+milliseconds since the epoch, team code, username and the message itself. Lines
+are expected to be in ascending timestamp order. Messages are HTML-escaped.
+
+Chat slices of videos use the same format, but their messages are stored
+tokenized into text, greentext and emote tokens as JSON, so that clients can
+build them without parsing the messages themselves.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import accumulate
+import functools
+import hashlib
+import html
+import json
+import os
+import re
+import struct
+import tempfile
+
+from daiseihai.archive import constants
+
+ChatLine = namedtuple('ChatLine', ('timestamp', 'team', 'user', 'message'))
+ChatStats = namedtuple('ChatStats', ('line_count', 'first_timestamp', 'last_timestamp',
+                                     'size'))
+
+# Record the byte offset of every Nth line in the index.
+INDEX_INTERVAL = 256
+
+_INDEX_HEADER = struct.Struct('<QQ')
+_INDEX_ENTRY = struct.Struct('<qQ')
+
+
+_DENSITY_HEADER = struct.Struct('<QQq')
+
+# Emotes are written as `:name:` separated from the rest of the message by
+# whitespace.
+EMOTE_RE = re.compile(r'(?<!\S):([A-Za-z0-9]+):(?!\S)')
+
+
+class ChatFormatError(Exception):
+    pass
+
+
+def parse_line(raw: bytes) -> ChatLine:
+    """Parse a single raw chat log line."""
+    timestamp, team, user, message = raw.decode('utf-8').rstrip('\r\n').split('\t', 3)
+    return ChatLine(int(timestamp), team, user, message)
+
+
+def iter_lines(fp):
+    """Yield `(offset, ChatLine)` pairs from a binary chat log file object,
+    starting from its current position.
+    """
+    offset = fp.tell()
+    for raw in fp:
+        if raw.strip():
+            yield offset, parse_line(raw)
+        offset += len(raw)
+
+
+def _raw_lines(fp):
+    """Yield the lines of the binary file object `fp`, reading Django files
+    chunk by chunk.
+    """
+    if not hasattr(fp, 'chunks'):
+        yield from fp
+        return
+    pending = b''
+    for chunk in fp.chunks():
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for raw in lines:
+            yield raw + b'\n'
+    if pending:
+        yield pending
+
+
+def ingest(fp, blocked_users=()):
+    """Validate and normalize a chat log from the binary file object `fp`.
+
+    Lines from `blocked_users` and blank lines are dropped and the remaining
+    lines are sorted by timestamp if they are not in order already. Lines are
+    written to a temporary file as they are read, so only the timestamp and
+    offset of each line are kept in memory. Returns the normalized chat log as
+    a temporary file positioned at its start and its `ChatStats`.
+    """
+    normalized = tempfile.TemporaryFile()
+    timestamps = array('q')
+    offsets = array('Q')
+    size = 0
+    in_order = True
+    try:
+        for number, raw in enumerate(_raw_lines(fp), start=1):
+            if not raw.strip():
+                continue
+            try:
+                line = parse_line(raw)
+            except (UnicodeDecodeError, ValueError):
+                raise ChatFormatError(f'Line {number} is not a valid chat line')
+            if line.user in blocked_users:
+                continue
+            if timestamps and line.timestamp < timestamps[-1]:
+                in_order = False
+            data = format_line(line)
+            timestamps.append(line.timestamp)
+            offsets.append(size)
+            normalized.write(data)
+            size += len(data)
+        if not in_order:
+            normalized = _sort_lines(normalized, timestamps, offsets, size)
+    except BaseException:
+        normalized.close()
+        raise
+    normalized.seek(0)
+    stats = ChatStats(
+        line_count=len(timestamps),
+        first_timestamp=min(timestamps) if timestamps else None,
+        last_timestamp=max(timestamps) if timestamps else None,
+        size=size,
+    )
+    return normalized, stats
+
+
+def _sort_lines(unsorted, timestamps, offsets, size):
+    """Return a temporary file with the lines of the file `unsorted`, which
+    start at `offsets`, in `timestamps` order. Closes `unsorted`.
+    """
+    ends = offsets[1:] + array('Q', [size])
+    order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+    result = tempfile.TemporaryFile()
+    with unsorted:
+        for i in order:
+            unsorted.seek(offsets[i])
+            result.write(unsorted.read(ends[i] - offsets[i]))
+    return result
+
+
+def index_path(path: str) -> str:
+    """Return the path of the offset index for the chat log at `path`."""
+    return f'{path}.idx'
+
+
+@contextmanager
+def _replace(path: str):
+    """Yield a binary file object that replaces the file at `path` once it is
+    written, so that readers never see a partially written file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def build_index(path: str):
+    """Write an offset index for the chat log at `path`.
+
+    The index contains the size and modification time of the chat log it was
+    built from followed by `(timestamp, offset)` pairs for every
+    `INDEX_INTERVAL`th line.
+    """
+    stat = os.stat(path)
+    with open(path, 'rb') as chat_file, _replace(index_path(path)) as index_file:
+        index_file.write(_INDEX_HEADER.pack(stat.st_size, stat.st_mtime_ns))
+        for number, (offset, line) in enumerate(iter_lines(chat_file)):
+            if number % INDEX_INTERVAL == 0:
+                index_file.write(_INDEX_ENTRY.pack(line.timestamp, offset))
+
+
+def is_index_stale(path: str) -> bool:
+    """Check whether the offset index for the chat log at `path` is missing or
+    was built from a different version of the file.
+    """
+    try:
+        with open(index_path(path), 'rb') as index_file:
+            header = index_file.read(_INDEX_HEADER.size)
+    except FileNotFoundError:
+        return True
+    stat = os.stat(path)
+    return header != _INDEX_HEADER.pack(stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=32)
+def _load_index(path: str, mtime_ns: int):
+    with open(path, 'rb') as index_file:
+        index_file.seek(_INDEX_HEADER.size)
+        entries = list(_INDEX_ENTRY.iter_unpack(index_file.read()))
+    return [timestamp for timestamp, _ in entries], [offset for _, offset in entries]
+
+
+def load_index(path: str):
+    """Return the timestamps and offsets of the index for the chat log at
+    `path`, building the index first if it is out of date.
+    """
+    if is_index_stale(path):
+        build_index(path)
+    idx_path = index_path(path)
+    return _load_index(idx_path, os.stat(idx_path).st_mtime_ns)
+
+
+def iter_window(path: str, start: int, end=None):
+    """Yield all lines from the chat log at `path` with timestamps in the
+    `[start, end)` range. Without `end`, yield everything from `start` onwards.
+    """
+    timestamps, offsets = load_index(path)
+    position = bisect_left(timestamps, start) - 1
+    with open(path, 'rb') as chat_file:
+        chat_file.seek(offsets[position] if position >= 0 else 0)
+        for _, line in iter_lines(chat_file):
+            if end is not None and line.timestamp >= end:
+                break
+            if line.timestamp >= start:
+                yield line
+
+
+def seek_offset(path: str, timestamp: int) -> int:
+    """Return the byte offset in the chat log at `path` from which reading
+    reaches every line with a timestamp of at least `timestamp`.
+    """
+    timestamps, offsets = load_index(path)
+    position = bisect_left(timestamps, timestamp) - 1
+    return offsets[position] if position >= 0 else 0
+
+
+def read_chunk(path: str, offset: int, start: int, until: int, limit: int):
+    """Read up to `limit` lines with timestamps in the `[start, until]` range
+    from the chat log at `path`, starting at the byte offset `offset`.
+
+    Returns the lines, the offset of the first unread line and whether the end
+    of the file was reached. The file is only open during the call, so readers
+    can keep their place in a chat log without holding it open.
+    """
+    lines = []
+    with open(path, 'rb') as chat_file:
+        chat_file.seek(offset)
+        for offset, line in iter_lines(chat_file):
+            if line.timestamp > until or len(lines) == limit:
+                return lines, offset, False
+            if line.timestamp >= start:
+                lines.append(line)
+        return lines, chat_file.tell(), True
+
+
+def read_window(path: str, start: int, end: int):
+    """Return all lines from the chat log at `path` with timestamps in the
+    `[start, end)` range.
+    """
+    return list(iter_window(path, start, end))
+
+
+def format_line(line: ChatLine) -> bytes:
+    """Format a chat line as a raw chat log line."""
+    return '\t'.join((str(line.timestamp), line.team, line.user, line.message))\
+              .encode('utf-8') + b'\n'
+
+
+def emote_key(names) -> str:
+    """Return a key identifying the emote set with the given `names`."""
+    if not names:
+        return ''
+    return hashlib.sha1('\n'.join(sorted(names)).encode()).hexdigest()[:16]
+
+
+def tokenize(message: str, emotes) -> list:
+    """Split an HTML-escaped chat message into `[kind, value]` tokens.
+
+    Known `emotes` become emote tokens holding the emote name and the text
+    between them becomes unescaped text tokens, or greentext tokens if the
+    message is quoting.
+    """
+    text_kind = constants.CHAT_TOKEN_TEXT
+    if message.startswith(('&gt;', '>')):
+        text_kind = constants.CHAT_TOKEN_GREENTEXT
+    tokens = []
+    position = 0
+    for match in EMOTE_RE.finditer(message):
+        if match.group(1) not in emotes:
+            continue
+        if match.start() > position:
+            tokens.append([text_kind, html.unescape(message[position:match.start()])])
+        tokens.append([constants.CHAT_TOKEN_EMOTE, match.group(1)])
+        position = match.end()
+    if position < len(message) or not tokens:
+        tokens.append([text_kind, html.unescape(message[position:])])
+    return tokens
+
+
+def encode_tokens(tokens) -> str:
+    return json.dumps(tokens, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_tokens(message: str) -> list:
+    return json.loads(message)
+
+
+def message_tokens(message: str, emotes=None) -> list:
+    """Return the tokens of a chat log message tokenized against `emotes`, or
+    of an already tokenized chat slice message without them.
+    """
+    return decode_tokens(message) if emotes is None else tokenize(message, emotes)
+
+
+def message_tokens_json(message: str, emotes=None) -> str:
+    """Return `message_tokens` encoded as JSON."""
+    return message if emotes is None else encode_tokens(tokenize(message, emotes))
+
+
+def slice_lines(path: str, start: int, end=None, emotes=None) -> bytes:
+    """Return the lines in the `[start, end)` range of the chat log at `path`
+    as a chat log with timestamps relative to `start`. With `emotes`, the
+    messages are tokenized against them.
+    """
+    lines = (line._replace(timestamp=line.timestamp - start)
+             for line in iter_window(path, start, end))
+    if emotes is not None:
+        lines = (line._replace(message=encode_tokens(tokenize(line.message, emotes)))
+                 for line in lines)
+    return b''.join(format_line(line) for line in lines)
+
+
+def density_path(path: str) -> str:
+    """Return the path of the message density histogram for the chat log at
+    `path`.
+    """
+    return f'{path}.density'
+
+
+def build_density(path: str):
+    """Write a histogram of messages per second for the chat log at `path`.
+
+    The histogram file contains the size and modification time of the chat log
+    it was built from and the second of its first bin, followed by the message
+    counts as unsigned 32-bit integers.
+    """
+    stat = os.stat(path)
+    with open(path, 'rb') as chat_file:
+        # Only the timestamps are needed, so the rest of each line is not
+        # decoded. Sorting is linear for chat logs, which are in order.
+        seconds = sorted(int(raw.split(b'\t', 1)[0]) // 1000
+                         for raw in chat_file if raw.strip())
+    first = seconds[0] if seconds else 0
+    counts = array('I', bytes(4 * (seconds[-1] - first + 1 if seconds else 0)))
+    # The messages of each second form a run in the sorted timestamps, which
+    # bisect measures without visiting every message.
+    position = 0
+    while position < len(seconds):
+        second = seconds[position]
+        end = bisect_right(seconds, second, position)
+        counts[second - first] = end - position
+        position = end
+    with _replace(density_path(path)) as density_file:
+        density_file.write(_DENSITY_HEADER.pack(stat.st_size, stat.st_mtime_ns, first))
+        counts.tofile(density_file)
+
+
+def is_density_stale(path: str) -> bool:
+    """Check whether the message density histogram for the chat log at `path`
+    is missing or was built from a different version of the file.
+    """
+    try:
+        with open(density_path(path), 'rb') as density_file:
+            header = density_file.read(_DENSITY_HEADER.size)
+    except FileNotFoundError:
+        return True
+    stat = os.stat(path)
+    if len(header) != _DENSITY_HEADER.size:
+        return True
+    size, mtime_ns, _ = _DENSITY_HEADER.unpack(header)
+    return (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=32)
+def _load_density(path: str, mtime_ns: int):
+    with open(path, 'rb') as density_file:
+        _, _, first = _DENSITY_HEADER.unpack(density_file.read(_DENSITY_HEADER.size))
+        counts = array('I', density_file.read())
+    return first, counts
+
+
+def load_density(path: str):
+    """Return the first second and the per-second message counts of the chat
+    log at `path`, building the histogram first if it is out of date.
+    """
+    if is_density_stale(path):
+        build_density(path)
+    d_path = density_path(path)
+    return _load_density(d_path, os.stat(d_path).st_mtime_ns)
+
+
+def suggest_offset(path: str, anchors, window=60, exclude=()):
+    """Suggest the chat timestamp (in milliseconds) of the start of a video.
+
+    `anchors` are positions in the video, in seconds, where chat activity is
+    expected to burst, such as kickoffs. The suggested start is the one where
+    the message count in the `window` seconds after the anchors exceeds the
+    count in the `window` seconds before them the most. Starts within the
+    `[start, end)` millisecond ranges in `exclude` are not considered.
+    """
+    anchors = sorted(int(anchor) for anchor in anchors)
+    first, counts = load_density(path)
+    if not anchors or not counts:
+        return None
+    # Prefix sums make the message count of any range a single subtraction.
+    totals = array('q', accumulate(counts, initial=0))
+    length = len(counts)
+
+    def range_count(start, end):
+        return totals[min(max(end, 0), length)] - totals[min(max(start, 0), length)]
+
+    best_score, best_start = 0, None
+    for start in range(-anchors[0], length - anchors[-1]):
+        start_ms = (first + start) * 1000
+        if any(low <= start_ms < high for low, high in exclude):
+            continue
+        score = 0
+        for anchor in anchors:
+            position = start + anchor
+            score += range_count(position, position + window)
+            score -= range_count(position - window, position)
+        # Prefer the latest of equally good starts so that the anchors line up
+        # with the onset of the bursts rather than the time before them.
+        if score > 0 and score >= best_score:
+            best_score, best_start = score, start_ms
+    return best_start
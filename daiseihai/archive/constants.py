@@ -4,3 +4,16 @@ VIDEO_TYPE_CHOICES = (
     (VIDEO_TYPE_NORMAL, 'Normal'),
     (VIDEO_TYPE_SINGLE, 'Single'),
 )
+
+# Longest chat window (in milliseconds) that can be requested at once.
+CHAT_SEGMENT_MAX_LENGTH = 10 * 60 * 1000
+
+# Kinds of the tokens chat messages are split into.
+CHAT_TOKEN_TEXT = 1
+CHAT_TOKEN_GREENTEXT = 2
+CHAT_TOKEN_EMOTE = 3
+
+# Tournaments with at least this many videos are split into matchdays, of which
+# only the first ones are rendered with the tournament page.
+MATCHDAY_LAYOUT_MIN_VIDEOS = 30
+INITIAL_MATCHDAYS = 1
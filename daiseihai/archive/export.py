@@ -0,0 +1,176 @@
+"""Static HTML export of the archive.
+
+The export holds every page of the archive, but video pages still load their
+chat from the `video_chat` endpoint and the search link leads to the search
+view, so chat and search only work when the export is served next to a running
+site.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import html
+import json
+import os
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from daiseihai.archive import constants, models, versions
+
+MANIFEST_NAME = '.export-manifest.json'
+
+_REDIRECT_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta http-equiv="refresh" content="0; url={url}">
+    <link rel="canonical" href="{url}">
+    <script>window.location.replace({url_json} + window.location.search);</script>
+</head>
+</html>
+'''
+
+
+def _video_paths(video):
+    """Return the URL path of a video page and, if one exists, the shorter URL
+    path of the same page.
+    """
+    kwargs = {'slug': video.tournament.slug, 'date': video.date.isoformat()}
+    paths = [reverse('video_detail_order', kwargs=dict(kwargs, order=video.order))]
+    if video.order == 1:
+        paths.append(reverse('video_detail', kwargs=kwargs))
+    # Mirror LegacyVideoRedirectView when picking the canonical URL.
+    canonical = paths[0] if video.order != 1 or video.part_count > 1 else paths[-1]
+    return paths, canonical
+
+
+def collect_pages():
+    """Return a dict mapping the URL path of every exported page to the version
+    scopes of its content, and a dict mapping legacy video URL paths to their
+    redirect targets.
+    """
+    pages = {
+        reverse('index'): ['archive'],
+        reverse('team_list'): ['archive'],
+    }
+    tournaments = models.Tournament.objects.filter(video_count__gt=0)
+    for slug, video_count in tournaments.values_list('slug', 'video_count'):
+        pages[reverse('tournament', kwargs={'slug': slug})] = [f'tournament:{slug}']
+        if video_count < constants.MATCHDAY_LAYOUT_MIN_VIDEOS:
+            continue
+        days = models.Video.objects.filter(tournament__slug=slug, is_visible=True)\
+                                   .values_list('date', flat=True).distinct()
+        for day in days:
+            path = reverse('tournament_matchday', kwargs={'slug': slug, 'date': day.isoformat()})
+            pages[path] = [f'tournament:{slug}']
+    teams = models.Team.objects.filter(video_count__gt=0)
+    for slug in teams.values_list('slug', flat=True):
+        pages[reverse('team_detail', kwargs={'slug': slug})] = [f'team:{slug}']
+
+    redirects = {}
+    for video in models.Video.objects.select_related('tournament').filter(is_visible=True):
+        paths, canonical = _video_paths(video)
+        for path in paths:
+            pages[path] = [f'video:{video.pk}']
+        redirects[reverse('legacy_video_detail', kwargs={'pk': video.pk})] = canonical
+    return pages, redirects
+
+
+def page_key(scopes) -> str:
+    """Return a key that changes whenever a page using `scopes` has to be
+    rendered again.
+    """
+    stamps = versions.get_versions(*scopes)
+    release = settings.RAVEN_CONFIG['release'] or ''
+    source = ':'.join([release] + [f'{scope}={stamps[scope]}' for scope in sorted(scopes)])
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def _file_path(target: str, path: str) -> str:
+    return os.path.join(target, path.strip('/'), 'index.html')
+
+
+def _write(target: str, path: str, content: bytes):
+    file_path = _file_path(target, path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'wb') as f:
+        f.write(content)
+
+
+def render_pages(target: str, paths, host: str):
+    """Render the pages at `paths` into `target`. Returns the paths that could
+    not be rendered.
+    """
+    factory = RequestFactory(HTTP_HOST=host, secure=True)
+    failed = []
+    for path in paths:
+        match = resolve(path)
+        response = match.func(factory.get(path), *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code == 200:
+            _write(target, path, response.content)
+        else:
+            failed.append(path)
+    return failed
+
+
+def write_redirect(target: str, path: str, url: str):
+    """Write a page at `path` redirecting to `url`."""
+    content = _REDIRECT_TEMPLATE.format(url=html.escape(url),
+                                        url_json=html.escape(json.dumps(url)))
+    _write(target, path, content.encode('utf-8'))
+
+
+def _init_worker():
+    django.setup()
+
+
+def export(target: str, host: str, processes=1, full=False):
+    """Export the archive into `target`, rendering only pages whose content
+    changed since the previous export unless `full` is set.
+
+    Returns the rendered, removed and failed page paths.
+    """
+    manifest_path = os.path.join(target, MANIFEST_NAME)
+    manifest = {}
+    if not full and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    pages, redirects = collect_pages()
+    keys = {path: page_key(scopes) for path, scopes in pages.items()}
+    keys.update({path: f'redirect:{url}' for path, url in redirects.items()})
+    changed = [path for path in pages if manifest.get(path) != keys[path]]
+
+    if processes > 1 and len(changed) > 1:
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        chunks = [changed[i::processes] for i in range(processes)]
+        with ProcessPoolExecutor(processes, initializer=_init_worker) as executor:
+            results = executor.map(render_pages, [target] * processes, chunks,
+                                   [host] * processes)
+            failed = [path for result in results for path in result]
+    else:
+        failed = render_pages(target, changed, host)
+
+    for path, url in redirects.items():
+        if manifest.get(path) != keys[path]:
+            write_redirect(target, path, url)
+
+    removed = [path for path in manifest if path not in keys]
+    for path in removed:
+        try:
+            os.remove(_file_path(target, path))
+        except FileNotFoundError:
+            pass
+
+    for path in failed:
+        keys.pop(path)
+    os.makedirs(target, exist_ok=True)
+    with open(manifest_path, 'w') as f:
+        json.dump(keys, f, indent=0, sort_keys=True)
+    rendered = [path for path in changed if path not in failed]
+    return rendered, removed, failed
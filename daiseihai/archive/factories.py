@@ -31,6 +31,15 @@ class LeagueFactory(factory.DjangoModelFactory):
         model = models.League
 
 
+class EmoteFactory(factory.DjangoModelFactory):
+    league = factory.SubFactory(LeagueFactory)
+    name = factory.Sequence(lambda n: 'emote{0}'.format(n + 1))
+    image = factory.django.ImageField(filename='emote.png')
+
+    class Meta:
+        model = models.Emote
+
+
 class TournamentFactory(factory.DjangoModelFactory):
     name = factory.Sequence(lambda n: '4chan Summer Cup {0}'.format(n + 2000))
     slug = factory.Sequence(lambda n: 'summer-cup-{0}'.format(n + 2000))
@@ -1,6 +1,26 @@
 from django import forms
+from django.conf import settings
+from django.core.files.base import File
 
-from daiseihai.archive import models
+from daiseihai.archive import chat, models
+
+
+class ChatForm(forms.ModelForm):
+    def clean_file(self):
+        """Validate and normalize newly uploaded chat logs."""
+        file = self.cleaned_data['file']
+        if 'file' not in self.changed_data:
+            return file
+        try:
+            content, stats = chat.ingest(file, settings.CHAT_BLOCKED_USERS)
+        except chat.ChatFormatError as e:
+            raise forms.ValidationError(str(e))
+        self.instance.set_stats(stats)
+        return File(content, name=file.name)
+
+    class Meta:
+        model = models.Chat
+        fields = ('date', 'file')
 
 
 class VideoForm(forms.ModelForm):
@@ -0,0 +1,22 @@
+"""Cached rendering of template fragments."""
+from django.core.cache import cache
+from django.template.loader import get_template
+from markupsafe import Markup
+
+from daiseihai.archive import versions
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def video_card(video, name=False) -> Markup:
+    """Render the `video_card` macro for `video`, reusing the cached card until
+    the video or anything shown on the card changes.
+    """
+    version = versions.get_version(f'video:{video.pk}')
+    key = f'archive:video-card:{video.pk}:{name:d}:{version}'
+    html = cache.get(key)
+    if html is None:
+        module = get_template('archive/videos.html', using='jinja2').template.module
+        html = str(module.video_card(video, name=name))
+        cache.set(key, html, FRAGMENT_CACHE_TIMEOUT)
+    return Markup(html)
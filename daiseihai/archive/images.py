@@ -0,0 +1,138 @@
+"""Fixed-size renditions of tournament logos and video poster frames.
+
+Renditions are stored under content-hashed names, so they can be cached
+forever, and each remembers a key of the source it was made from so that it is
+only rendered again when the source changes.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import io
+import subprocess
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from daiseihai.archive import probe
+
+LOGO_SIZE = (256, 256)
+POSTER_SIZE = (1280, 720)
+THUMBNAIL_SIZE = (320, 180)
+QUALITY = 80
+
+FRAME_TIMEOUT = 60
+
+
+class RenditionError(Exception):
+    pass
+
+
+def render(source: bytes, size) -> bytes:
+    """Return the image in `source` scaled down to fit `size` as WebP."""
+    try:
+        with Image.open(io.BytesIO(source)) as image:
+            image.load()
+    except (OSError, SyntaxError) as e:
+        raise RenditionError(f'Unable to read image: {e}')
+    if image.mode not in ('RGB', 'RGBA'):
+        transparent = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+    image.thumbnail(size, Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, 'WEBP', quality=QUALITY, method=6)
+    return output.getvalue()
+
+
+def rendition_file(prefix, content: bytes) -> ContentFile:
+    """Return `content` as a file named after `prefix` and a hash of the
+    content.
+    """
+    digest = hashlib.sha1(content).hexdigest()[:16]
+    return ContentFile(content, name=f'{prefix}.{digest}.webp')
+
+
+def extract_frame(path: str, position: float) -> bytes:
+    """Return the frame at `position` seconds of the video file at `path` as a
+    PNG image.
+    """
+    command = [settings.FFMPEG_PATH, '-v', 'error', '-ss', f'{position:.3f}', '-i', path,
+               '-frames:v', '1', '-f', 'image2pipe', '-c:v', 'png', '-']
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=FRAME_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise RenditionError(str(e))
+    if result.returncode != 0 or not result.stdout:
+        raise RenditionError(result.stderr.decode('utf-8', 'replace').strip()
+                             or 'No frame extracted')
+    return result.stdout
+
+
+def logo_source_key(tournament):
+    """Return the key of the logo the tournament's renditions are made from."""
+    if not tournament.logo:
+        return None
+    with tournament.logo.open('rb') as logo:
+        return hashlib.sha1(logo.read()).hexdigest()
+
+
+def poster_position(video) -> float:
+    """Return the position in seconds of the frame used as the video's poster:
+    the first bookmark, which is usually a kickoff, or a tenth into the video.
+    """
+    bookmarks = [bookmark.position.total_seconds() for bookmark in video.bookmarks.all()]
+    if bookmarks:
+        return min(bookmarks)
+    return (video.duration or 0) / 10
+
+
+def poster_source_key(video):
+    """Return the key of the video file and frame the video's poster is made
+    from.
+    """
+    if probe.video_path(video) is None or video.media_size is None:
+        return None
+    return f'{video.media_size}:{video.media_mtime}:{poster_position(video):.3f}'
+
+
+def _render_logo(tournament):
+    with tournament.logo.open('rb') as logo:
+        return {'logo_thumbnail': render(logo.read(), LOGO_SIZE)}
+
+
+def _render_poster(video):
+    frame = extract_frame(probe.video_path(video), poster_position(video))
+    return {'poster': render(frame, POSTER_SIZE), 'thumbnail': render(frame, THUMBNAIL_SIZE)}
+
+
+def _pending(objects, source_key, force):
+    for obj in objects:
+        key = source_key(obj)
+        if key is not None and (force or key != obj.rendition_key):
+            yield obj, key
+
+
+def build_renditions(tournaments, videos, workers=4, force=False):
+    """Render the logo renditions of `tournaments` and the posters of `videos`
+    in `workers` threads and store them on the objects. Renditions whose source
+    has not changed are skipped unless `force` is set.
+
+    Yields `(object, error)` pairs for every rendered object, where `error` is
+    a `RenditionError` if the renditions could not be made.
+    """
+    pending = [(obj, key, _render_logo)
+               for obj, key in _pending(tournaments, logo_source_key, force)]
+    pending += [(obj, key, _render_poster)
+                for obj, key in _pending(videos, poster_source_key, force)]
+    with ThreadPoolExecutor(workers) as executor:
+        futures = {executor.submit(function, obj): (obj, key) for obj, key, function in pending}
+        # Files and rows are saved from this thread; the workers only decode
+        # and encode images.
+        for future in as_completed(futures):
+            obj, key = futures[future]
+            try:
+                renditions = future.result()
+            except RenditionError as e:
+                yield obj, e
+                continue
+            obj.set_renditions(renditions, key)
+            yield obj, None
@@ -0,0 +1,225 @@
+"""Local load test of the chat stream with many concurrent viewers.
+
+Viewers are simulated in the same process as the ASGI application and talk to
+it through the ASGI interface directly, so the test measures how many paced
+streams one process can serve rather than the network stack.
+"""
+import asyncio
+from collections import namedtuple
+from contextlib import contextmanager
+import random
+import resource
+
+from asgiref.sync import async_to_sync
+from django.core import signals
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import reverse
+
+from daiseihai.archive import factories, stream
+
+LoadTestResult = namedtuple('LoadTestResult', (
+    'viewers', 'failed', 'seconds', 'lines', 'seeks', 'connect_p99', 'lateness_median',
+    'lateness_p99', 'loop_lag', 'peak_memory',
+))
+
+CHAT_EPOCH = 1600000000000
+
+
+class StreamViewer():
+    """Viewer reading a chat stream through the ASGI interface and recording
+    how long the stream takes to open and how late every line arrives compared
+    to the playback position. Playback starts when the stream is opened.
+    """
+
+    def __init__(self, app, path, position=0, rate=1.0):
+        self.app = app
+        self.path = path
+        self.rate = rate
+        self.status = None
+        self.stream_id = None
+        self.connect_time = None
+        self.events = []
+        self.lines = []
+        self.lateness = []
+        self._buffer = b''
+        self._measuring = False
+        self._reference = (None, position)
+
+    def position(self) -> float:
+        """Return the current playback position of the viewer."""
+        started, position = self._reference
+        return position + (asyncio.get_running_loop().time() - started) * 1000 * self.rate
+
+    async def watch(self, seconds):
+        """Read the stream until it ends or `seconds` have passed."""
+        self._reference = (asyncio.get_running_loop().time(), self._reference[1])
+
+        async def receive():
+            await asyncio.sleep(seconds)
+            return {'type': 'http.disconnect'}
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': self.path, 'headers': [],
+            'query_string': f'position={int(self._reference[1])}&rate={self.rate}'.encode(),
+        }
+        await self.app(scope, receive, self._send)
+
+    async def seek(self, position, rate=None) -> int:
+        """Report a new playback position to the stream and return the response
+        status.
+        """
+        self.rate = self.rate if rate is None else rate
+        self._reference = (asyncio.get_running_loop().time(), position)
+        self._measuring = False
+        statuses = []
+
+        async def receive():
+            body = f'position={int(position)}&rate={self.rate}'.encode()
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        scope = {'type': 'http', 'method': 'POST', 'path': f'{self.path}{self.stream_id}/',
+                 'headers': [], 'query_string': b''}
+        await self.app(scope, receive, send)
+        return statuses[0]
+
+    async def _send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            return
+        self._buffer += message.get('body', b'')
+        *events, self._buffer = self._buffer.split(b'\n\n')
+        for event in events:
+            self._receive(event.decode('utf-8'))
+
+    def _receive(self, event):
+        name, data = 'message', None
+        for field in event.split('\n'):
+            if field.startswith('event: '):
+                name = field[len('event: '):]
+            elif field.startswith('data: '):
+                data = field[len('data: '):]
+        if data is None:
+            # Keepalive comment.
+            return
+        self.events.append(name)
+        if name == 'stream':
+            self.stream_id = data
+            started, position = self._reference
+            now = asyncio.get_running_loop().time()
+            self.connect_time = now - started
+            self._reference = (now, position)
+        elif name == 'reset':
+            self._measuring = True
+        elif name == 'message':
+            # Only the timestamp is decoded to keep the simulated viewers from
+            # taking time away from the streams.
+            timestamp = int(data[1:data.index(',')])
+            self.lines.append(data)
+            started, position = self._reference
+            # Lines from before the position are sent at once as a backlog.
+            if self._measuring and self.rate > 0 and timestamp >= position:
+                due = started + (timestamp - position) / 1000 / self.rate
+                self.lateness.append(max(asyncio.get_running_loop().time() - due, 0))
+
+
+def create_video(duration=3600, lines_per_second=5):
+    """Create a video with `duration` seconds of synthetic chat."""
+    interval = 1000 // lines_per_second
+    lines = [f'{CHAT_EPOCH + i * interval}\tck\tuser{i % 997}\tmessage {i} :kek:\n'
+             for i in range(duration * lines_per_second)]
+    chat = factories.ChatFactory(file__data=''.join(lines).encode('utf-8'))
+    video = factories.VideoFactory(tournament__league=factories.LeagueFactory(),
+                                   chat=chat, chat_start=CHAT_EPOCH, duration=duration)
+    factories.EmoteFactory(league=video.tournament.league, name='kek')
+    video.refresh_from_db()
+    video.update_chat_slice()
+    return video
+
+
+@contextmanager
+def keep_connections():
+    """Keep the database connection of the calling thread open while streams
+    look up their videos, as the test client does, so that rows of an open
+    transaction stay visible.
+    """
+    signals.request_started.disconnect(close_old_connections)
+    signals.request_finished.disconnect(close_old_connections)
+    try:
+        yield
+    finally:
+        signals.request_started.connect(close_old_connections)
+        signals.request_finished.connect(close_old_connections)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(video, viewers=500, seconds=10.0, rate=1.0, ramp_up=2.0, seed=0):
+    """Stream the chat of `video` to `viewers` concurrent viewers for `seconds`
+    each and return a `LoadTestResult`. Viewers join at random times during the
+    first `ramp_up` seconds and every fourth viewer seeks a minute ahead while
+    watching.
+    """
+    rng = random.Random(seed)
+    app = stream.ChatStreamRouter(ASGIHandler())
+    path = reverse('video_chat_stream', kwargs={
+        'slug': video.tournament.slug, 'date': video.date.isoformat(), 'order': video.order,
+    })
+    last_start = video.duration * 1000 - (seconds * rate * 1000 + 60000)
+    simulated = [StreamViewer(app, path, rng.uniform(stream.BACKLOG, last_start), rate)
+                 for _ in range(viewers)]
+    seeks = []
+    loop_lag = []
+
+    async def watch(viewer, seeks_at=None):
+        await asyncio.sleep(rng.uniform(0, ramp_up))
+        watching = asyncio.ensure_future(viewer.watch(seconds))
+        if seeks_at is not None:
+            await asyncio.sleep(seeks_at)
+            if viewer.stream_id is not None:
+                seeks.append(await viewer.seek(viewer.position() + 60000))
+        await watching
+
+    async def measure_lag(interval=0.05):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            loop_lag.append(loop.time() - start - interval)
+
+    async def main():
+        monitor = asyncio.ensure_future(measure_lag())
+        await asyncio.gather(*[
+            watch(viewer, rng.uniform(seconds / 4, seconds * 3 / 4) if i % 4 == 0 else None)
+            for i, viewer in enumerate(simulated)
+        ])
+        monitor.cancel()
+
+    with keep_connections():
+        async_to_sync(main)()
+
+    lateness = [value for viewer in simulated for value in viewer.lateness]
+    return LoadTestResult(
+        viewers=viewers,
+        failed=sum(1 for viewer in simulated if viewer.status != 200) +
+        sum(1 for status in seeks if status != 204),
+        seconds=seconds,
+        lines=sum(len(viewer.lines) for viewer in simulated),
+        seeks=len(seeks),
+        connect_p99=_percentile([viewer.connect_time for viewer in simulated
+                                 if viewer.connect_time is not None], 0.99),
+        lateness_median=_percentile(lateness, 0.5),
+        lateness_p99=_percentile(lateness, 0.99),
+        loop_lag=max(loop_lag, default=0.0),
+        # Linux reports the maximum resident set size in kilobytes.
+        peak_memory=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    )
@@ -0,0 +1,104 @@
+"""Local mirror of the team logos on the wiki.
+
+Logos are downloaded with the fetcher named by the `TEAM_LOGO_FETCHER` setting
+and stored as card-sized renditions, so pages never link to the wiki directly.
+Mirrored logos are revalidated against the wiki with their ETag once they are
+older than the maximum age given to `mirror_logos`.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import datetime
+import hashlib
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+import urllib.request
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from daiseihai.archive import images
+
+TEAM_LOGO_SIZE = (200, 200)
+FETCH_TIMEOUT = 30
+
+FetchResult = namedtuple('FetchResult', ('content', 'etag'))
+
+
+class FetchError(Exception):
+    pass
+
+
+def logo_url(team) -> str:
+    """Returns the URL of the team's current logo on the wiki."""
+    name = team.name.replace('/', '')
+    return f'{settings.TEAM_LOGO_URL}{quote(name)}_logo.png'
+
+
+class HTTPFetcher():
+    """Fetches logos over HTTP, following the wiki's redirects."""
+
+    user_agent = 'daiseihai logo mirror'
+
+    def fetch(self, url: str, etag=None):
+        """Return a `FetchResult` for `url`, or None if it still matches
+        `etag`.
+        """
+        request = urllib.request.Request(url, headers={'User-Agent': self.user_agent})
+        if etag:
+            request.add_header('If-None-Match', etag)
+        try:
+            with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+                return FetchResult(response.read(), response.headers.get('ETag'))
+        except HTTPError as e:
+            if e.code == 304:
+                return None
+            raise FetchError(f'{url} returned {e.code}')
+        except (URLError, OSError) as e:
+            raise FetchError(f'Unable to fetch {url}: {e}')
+
+
+def get_fetcher():
+    """Return an instance of the configured logo fetcher."""
+    return import_string(settings.TEAM_LOGO_FETCHER)()
+
+
+def _mirror(fetcher, team):
+    result = fetcher.fetch(logo_url(team), etag=team.logo_etag if team.logo else None)
+    if result is None:
+        return None
+    digest = hashlib.sha1(result.content).hexdigest()
+    if team.logo and digest == team.logo_hash:
+        return None, result
+    try:
+        return images.render(result.content, TEAM_LOGO_SIZE), result
+    except images.RenditionError as e:
+        raise FetchError(str(e))
+
+
+def mirror_logos(teams, max_age=datetime.timedelta(days=7), workers=4, fetcher=None):
+    """Download the logos of `teams` that have never been mirrored or were last
+    checked more than `max_age` ago, using `workers` threads.
+
+    Yields `(team, error)` pairs for every checked team, where `error` is a
+    `FetchError` if the logo could not be downloaded.
+    """
+    fetcher = fetcher or get_fetcher()
+    now = timezone.now()
+    teams = teams.filter(Q(logo_checked__isnull=True) | Q(logo_checked__lt=now - max_age))
+    with ThreadPoolExecutor(workers) as executor:
+        futures = {executor.submit(_mirror, fetcher, team): team for team in teams}
+        for future in as_completed(futures):
+            team = futures[future]
+            try:
+                mirrored = future.result()
+            except FetchError as e:
+                yield team, e
+                continue
+            if mirrored is None:
+                team.set_logo_checked(now)
+            else:
+                rendition, result = mirrored
+                team.set_logo(rendition, result.content, result.etag, now)
+            yield team, None
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from daiseihai.archive import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Measure query counts and response times of the archive views on a '
+            'synthetic archive. All created rows are rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tournaments', type=int, default=200)
+        parser.add_argument('--videos', type=int, default=20,
+                            help='Videos per tournament.')
+        parser.add_argument('--teams', type=int, default=100)
+        parser.add_argument('--explain', action='store_true',
+                            help='Also print the query plans of the main view queries.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            benchmark.populate(options['tournaments'], options['videos'], options['teams'])
+            measurements = benchmark.measure()
+            plans = benchmark.explain() if options['explain'] else []
+            transaction.set_rollback(True)
+
+        for plan in plans:
+            self.stdout.write(f'{plan.name} ({plan.seconds * 1000:.2f} ms)')
+            self.stdout.write(plan.plan)
+            self.stdout.write('')
+
+        over_budget = []
+        for m in measurements:
+            self.stdout.write(f'{m.name:<14} {m.queries:>3} queries (budget {m.budget.queries}) '
+                              f'{m.seconds * 1000:>8.1f} ms (budget {m.budget.seconds * 1000:.0f})'
+                              f'  {m.path}')
+            if m.queries > m.budget.queries or m.seconds > m.budget.seconds:
+                over_budget.append(m.name)
+        if over_budget:
+            raise CommandError(f'Over budget: {", ".join(over_budget)}')
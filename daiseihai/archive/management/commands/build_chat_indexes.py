@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from daiseihai.archive import chat, models
+
+
+class Command(BaseCommand):
+    help = 'Build offset indexes for chat logs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild indexes that are up to date.')
+
+    def handle(self, *args, **options):
+        for chat_object in models.Chat.objects.all():
+            path = chat_object.file.path
+            if options['force'] or chat.is_index_stale(path):
+                chat.build_index(path)
+                self.stdout.write(f'Indexed {chat_object}')
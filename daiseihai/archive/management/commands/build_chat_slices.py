@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from daiseihai.archive import models
+
+
+class Command(BaseCommand):
+    help = 'Build chat slices for videos with chat.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild chat slices that are up to date.')
+
+    def handle(self, *args, **options):
+        videos = models.Video.objects.select_related('chat', 'tournament__league')\
+                                     .filter(Q(chat__isnull=False) | Q(chat_slice__gt=''))
+        for video in videos:
+            if video.update_chat_slice(force=options['force']):
+                self.stdout.write(f'Updated chat slice for {video}')
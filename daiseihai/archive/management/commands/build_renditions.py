@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from daiseihai.archive import images, models
+
+
+class Command(BaseCommand):
+    help = 'Render small tournament logos and video posters whose source has changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of images rendered at the same time.')
+        parser.add_argument('--force', action='store_true',
+                            help='Render images whose source has not changed.')
+
+    def handle(self, *args, **options):
+        tournaments = models.Tournament.objects.exclude(logo='')
+        videos = models.Video.objects.select_related('tournament')\
+                                     .prefetch_related('bookmarks')\
+                                     .filter(filename__gt='', media_size__isnull=False)
+        failed = 0
+        results = images.build_renditions(tournaments, videos, options['workers'],
+                                          options['force'])
+        for obj, error in results:
+            if error:
+                self.stderr.write(f'Unable to render images for {obj}: {error}')
+                failed += 1
+            else:
+                self.stdout.write(f'Rendered images for {obj}')
+        if failed:
+            raise CommandError(f'Unable to render images for {failed} object(s).')
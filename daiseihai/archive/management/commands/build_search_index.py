@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from daiseihai.archive import models, search
+
+
+class Command(BaseCommand):
+    help = 'Add chat logs to the chat search index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Reindex chat logs that are indexed already.')
+
+    def handle(self, *args, **options):
+        chats = models.Chat.objects.all()
+        if not options['rebuild']:
+            chats = chats.filter(search_indexed=False)
+        for chat_object in chats:
+            search.index_chat(chat_object)
+            self.stdout.write(f'Indexed {chat_object}')
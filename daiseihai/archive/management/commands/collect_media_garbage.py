@@ -0,0 +1,56 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from daiseihai.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = ('Remove content-addressed media blobs that are no longer used by any '
+            'model.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--adopt', action='store_true',
+                            help='Move files saved under their own names into blobs first.')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Seconds for which new blobs are always kept.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only list what would be removed.')
+        parser.add_argument('--force', action='store_true',
+                            help='Collect even with a minimum age of 0 or when no model '
+                                 'uses any file, which removes every blob.')
+
+    def handle(self, *args, **options):
+        if options['min_age'] <= 0 and not options['force']:
+            raise CommandError('A minimum age of 0 removes files that are being saved; '
+                               'use --force to collect anyway.')
+        # Storages in the same location share a manifest.
+        storages = {}
+        live_names = {}
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if not isinstance(field, models.FileField) or \
+                        not isinstance(field.storage, ContentAddressedStorage):
+                    continue
+                names = model.objects.exclude(**{field.name: ''})\
+                                     .exclude(**{f'{field.name}__isnull': True})\
+                                     .values_list(field.name, flat=True)
+                storages.setdefault(field.storage.location, field.storage)
+                live_names.setdefault(field.storage.location, set()).update(names)
+
+        for location, names in live_names.items():
+            storage = storages[location]
+            if not names and storage.load_manifest() and not options['force']:
+                raise CommandError(f'No model uses any file in {location}, which would remove '
+                                   f'every blob there; use --force to collect anyway.')
+            if options['adopt'] and not options['dry_run']:
+                for name in names:
+                    if storage.adopt(name):
+                        self.stdout.write(f'Adopted {name}')
+            removed_names, removed_files = storage.collect_garbage(
+                names, min_age=options['min_age'], dry_run=options['dry_run'],
+            )
+            for name in removed_names:
+                self.stdout.write(f'Unmapped {name}')
+            for file in removed_files:
+                self.stdout.write(f'Removed {file}')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.backends.jinja2 import Jinja2
+
+
+class Command(BaseCommand):
+    help = 'Compile all Jinja2 templates into the bytecode cache.'
+
+    def handle(self, *args, **options):
+        for engine in engines.all():
+            if not isinstance(engine, Jinja2):
+                continue
+            if engine.env.bytecode_cache is None:
+                self.stderr.write(f'{engine.name}: no bytecode cache configured')
+            for name in engine.env.list_templates(extensions=['html']):
+                engine.env.get_template(name)
+                self.stdout.write(f'Compiled {name}')
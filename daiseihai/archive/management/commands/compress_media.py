@@ -0,0 +1,32 @@
+import glob
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from daiseihai import compression
+from daiseihai.archive import models
+
+
+class Command(BaseCommand):
+    help = ('Write gzip and brotli compressed variants of chat logs, chat slices and '
+            'league metadata files whose content has changed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help='Number of processes compressing files.')
+        parser.add_argument('--force', action='store_true',
+                            help='Compress files whose content has not changed.')
+
+    def handle(self, *args, **options):
+        paths = {chat.file.path for chat in models.Chat.objects.exclude(file='')}
+        paths.update(video.chat_slice.path for video in
+                     models.Video.objects.exclude(chat_slice='').exclude(chat_slice__isnull=True))
+        paths.update(league.metadata.path for league in
+                     models.League.objects.exclude(metadata='').exclude(metadata__isnull=True))
+        paths.update(glob.glob(os.path.join(settings.MEDIA_ROOT, 'metadata', '*.json')))
+        paths = [path for path in sorted(paths) if os.path.exists(path)]
+        written = compression.compress_files(paths, options['processes'], options['force'])
+        for path in written:
+            self.stdout.write(f'Compressed {path}')
+        self.stdout.write(f'Compressed {len(written)} of {len(paths)} file(s).')
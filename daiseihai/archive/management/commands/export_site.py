@@ -0,0 +1,29 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from daiseihai.archive import export
+
+
+class Command(BaseCommand):
+    help = ('Export the archive as static HTML files. Chat and search are '
+            'still served by the site.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', help='Directory to export the archive into.')
+        parser.add_argument('--host', default=(settings.ALLOWED_HOSTS or ['localhost'])[0],
+                            help='Host name used for absolute URLs.')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help='Number of processes rendering pages.')
+        parser.add_argument('--full', action='store_true',
+                            help='Render every page, including unchanged ones.')
+
+    def handle(self, *args, **options):
+        rendered, removed, failed = export.export(
+            options['target'], options['host'],
+            processes=options['processes'], full=options['full'],
+        )
+        self.stdout.write(f'Rendered {len(rendered)} page(s), removed {len(removed)}.')
+        if failed:
+            raise CommandError(f'Unable to render: {", ".join(failed)}')
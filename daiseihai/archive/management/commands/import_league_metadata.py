@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from daiseihai.archive import metadata, models, signals
+
+
+class Command(BaseCommand):
+    help = ('Load the emotes and team icons of the hand-maintained league '
+            'metadata files in media/metadata/ into the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('leagues', nargs='*', metavar='slug',
+                            help='Leagues to import; all leagues by default.')
+        parser.add_argument('--replace', action='store_true',
+                            help='Replace existing images of emotes and team icons.')
+
+    def handle(self, *args, **options):
+        leagues = models.League.objects.all()
+        if options['leagues']:
+            leagues = leagues.filter(slug__in=options['leagues'])
+        failed = 0
+        # The chat of every league is updated once after all of its images.
+        with signals.league_chat_updates():
+            for league in leagues:
+                for kind, name, error in metadata.import_legacy(league, options['replace']):
+                    label = f':{name}:' if kind == 'emote' else name
+                    if error:
+                        self.stderr.write(f'{league}: {kind} {label}: {error}')
+                        failed += 1
+                    else:
+                        self.stdout.write(f'{league}: {kind} {label}')
+        self.stdout.write(f'Imported metadata of {len(leagues)} league(s), '
+                          f'{failed} image(s) failed.')
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.files.base import File
+from django.core.management.base import BaseCommand, CommandError
+
+from daiseihai.archive import chat, models
+
+
+class Command(BaseCommand):
+    help = 'Validate and normalize chat logs and record their statistics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Ingest chat logs that have been ingested already.')
+
+    def handle(self, *args, **options):
+        chats = models.Chat.objects.all()
+        if not options['force']:
+            chats = chats.filter(line_count__isnull=True)
+        for chat_object in chats:
+            try:
+                with chat_object.file.open('rb') as chat_file:
+                    content, stats = chat.ingest(chat_file, settings.CHAT_BLOCKED_USERS)
+            except chat.ChatFormatError as e:
+                raise CommandError(f'{chat_object}: {e}')
+            chat_object.set_stats(stats)
+            with content:
+                chat_object.file.save(chat_object.file.name, File(content))
+            self.stdout.write(f'Ingested {chat_object}: {stats.line_count} lines')
@@ -0,0 +1,49 @@
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from daiseihai.archive import load_test
+
+
+class Command(BaseCommand):
+    help = ('Stream a synthetic chat to many concurrent viewers through the ASGI '
+            'application in this process and report how well the streams keep pace. '
+            'All created rows and files are removed afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--viewers', type=int, default=500)
+        parser.add_argument('--seconds', type=float, default=10.0,
+                            help='How long every viewer watches.')
+        parser.add_argument('--ramp-up', type=float, default=2.0,
+                            help='Seconds over which the viewers join; 0 opens every '
+                                 'stream at once.')
+        parser.add_argument('--rate', type=float, default=1.0,
+                            help='Playback rate of the viewers.')
+        parser.add_argument('--lines-per-second', type=int, default=5,
+                            help='Chat lines per second of video.')
+        parser.add_argument('--max-lateness', type=float, default=0.25,
+                            help='Allowed 99th percentile lateness of lines in seconds.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root), transaction.atomic():
+            video = load_test.create_video(lines_per_second=options['lines_per_second'])
+            result = load_test.run(video, options['viewers'], options['seconds'],
+                                   options['rate'], options['ramp_up'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{result.viewers} viewers for {result.seconds:.0f} s, '
+                          f'{result.seeks} seeks, {result.failed} failed requests')
+        self.stdout.write(f'{result.lines} lines ({result.lines / result.seconds:.0f}/s)')
+        self.stdout.write(f'Streams opened within {result.connect_p99 * 1000:.1f} ms '
+                          f'(99th percentile)')
+        self.stdout.write(f'Lateness: median {result.lateness_median * 1000:.1f} ms, '
+                          f'99th percentile {result.lateness_p99 * 1000:.1f} ms')
+        self.stdout.write(f'Longest event loop stall: {result.loop_lag * 1000:.1f} ms')
+        self.stdout.write(f'Peak memory: {result.peak_memory / 2 ** 20:.0f} MiB')
+        if result.failed:
+            raise CommandError(f'{result.failed} request(s) failed')
+        if result.lateness_p99 > options['max_lateness']:
+            raise CommandError('Lines arrived later than allowed')
@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from daiseihai.archive import logos, models
+
+
+class Command(BaseCommand):
+    help = ('Download team logos from the wiki and revalidate mirrored logos that were '
+            'last checked before the maximum age.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=float, default=7,
+                            help='Days after which mirrored logos are revalidated.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of logos downloaded at the same time.')
+
+    def handle(self, *args, **options):
+        max_age = datetime.timedelta(days=options['max_age'])
+        failed = 0
+        for team, error in logos.mirror_logos(models.Team.objects.all(), max_age,
+                                              options['workers']):
+            if error:
+                self.stderr.write(f'Unable to mirror the logo of {team}: {error}')
+                failed += 1
+            else:
+                self.stdout.write(f'Checked the logo of {team}')
+        if failed:
+            raise CommandError(f'Unable to mirror {failed} logo(s).')
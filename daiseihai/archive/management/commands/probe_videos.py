@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from daiseihai.archive import models, probe
+
+
+class Command(BaseCommand):
+    help = 'Read the duration and other metadata of local video files with ffprobe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of files probed at the same time.')
+        parser.add_argument('--force', action='store_true',
+                            help='Probe files that have not changed since they were probed.')
+
+    def handle(self, *args, **options):
+        if not settings.VIDEO_ROOT:
+            raise CommandError('VIDEO_ROOT is not set.')
+        videos = models.Video.objects.select_related('chat', 'tournament')\
+                                     .filter(filename__gt='')
+        failed = 0
+        for video, error in probe.probe_videos(videos, options['workers'], options['force']):
+            if error:
+                self.stderr.write(f'Unable to probe {video}: {error}')
+                failed += 1
+            else:
+                self.stdout.write(f'Probed {video}')
+        if failed:
+            raise CommandError(f'Unable to probe {failed} video(s).')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from daiseihai.archive import metadata, models
+
+
+class Command(BaseCommand):
+    help = ('Generate the chat metadata bundles of leagues and publish the ones whose '
+            'teams or emotes have changed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('leagues', nargs='*', metavar='slug',
+                            help='Leagues to publish; all leagues by default.')
+        parser.add_argument('--force', action='store_true',
+                            help='Publish bundles that have not changed.')
+
+    def handle(self, *args, **options):
+        leagues = models.League.objects.prefetch_related('emotes')
+        if options['leagues']:
+            leagues = leagues.filter(slug__in=options['leagues'])
+        published = 0
+        for league in metadata.publish_bundles(leagues, force=options['force']):
+            self.stdout.write(f'Published metadata of {league}')
+            published += 1
+        self.stdout.write(f'Published {published} of {len(leagues)} bundle(s).')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from daiseihai.archive import stats
+
+
+class Command(BaseCommand):
+    help = ('Recount the video and game statistics of every tournament and team and '
+            'renumber the matchday parts of every video.')
+
+    def handle(self, *args, **options):
+        stats.rebuild()
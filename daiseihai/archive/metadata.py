@@ -0,0 +1,166 @@
+"""League metadata bundles for the chat player.
+
+A bundle maps the team codes seen in chat to team icons and the league's emote
+names to emote images. Bundles are generated from the database, minified and
+stored under content-addressed names, so the video page can link them with a
+URL that never changes content.
+
+Team codes that are not teams in the archive, such as `NULL` for chat users
+without a team, get their icons from the league's team icons.
+
+Leagues used to have hand-maintained metadata files with the same maps at
+`metadata/<slug>.json` in the media directory, from which `import_legacy`
+loads the emotes and team icons into the database.
+"""
+import hashlib
+import io
+import json
+import os
+import posixpath
+from urllib.parse import unquote, urljoin, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.templatetags.static import static
+from PIL import Image
+
+from daiseihai.archive import logos, models
+
+# Icon of chat users without a team.
+DEFAULT_TEAM_ICON = 'favicon.png'
+NO_TEAM = 'NULL'
+
+
+def league_teams(league):
+    """Return the teams that have played in the league's tournaments."""
+    matchups = models.Matchup.objects.filter(video__tournament__league=league)
+    return models.Team.objects.filter(Q(pk__in=matchups.values('home')) |
+                                      Q(pk__in=matchups.values('away')))
+
+
+def build_bundle(league) -> bytes:
+    """Return the minified metadata bundle of the league."""
+    teams = {team.slug: team.logo_image for team in league_teams(league)}
+    teams[NO_TEAM] = static(DEFAULT_TEAM_ICON)
+    teams.update((icon.code, icon.image.url) for icon in league.team_icons.all())
+    emotes = {emote.name: emote.image.url for emote in league.emotes.all()}
+    bundle = {'league': league.slug, 'teams': teams, 'emotes': emotes}
+    return json.dumps(bundle, ensure_ascii=False, separators=(',', ':'),
+                      sort_keys=True).encode('utf-8')
+
+
+def publish_bundle(league, force=False) -> bool:
+    """Generate the metadata bundle of the league and store it if its content
+    differs from the published bundle, or always with `force`. Returns whether
+    the bundle was published.
+    """
+    content = build_bundle(league)
+    digest = hashlib.sha256(content).hexdigest()
+    if not force and league.metadata and digest == league.metadata_hash:
+        return False
+    league.set_metadata(ContentFile(content, name=f'{league.slug}.json'), digest)
+    return True
+
+
+def publish_bundles(leagues, force=False):
+    """Publish the changed metadata bundles of `leagues`. Yields every league
+    whose bundle was published.
+    """
+    for league in leagues:
+        if publish_bundle(league, force=force):
+            yield league
+
+
+class LegacyImageError(Exception):
+    pass
+
+
+def legacy_path(league) -> str:
+    """Return the path of the league's hand-maintained metadata file."""
+    return os.path.join(settings.MEDIA_ROOT, 'metadata', f'{league.slug}.json')
+
+
+def read_legacy_image(src: str, fetcher=None):
+    """Return the file name and content of an image linked from a legacy
+    metadata file. Media and static URLs are read from disk and other URLs are
+    downloaded with `fetcher`.
+    """
+    url = urljoin(urljoin(settings.MEDIA_URL, 'metadata/'), src)
+    parts = urlsplit(url)
+    name = posixpath.basename(unquote(parts.path))
+    path = None
+    if not parts.netloc and parts.path.startswith(settings.MEDIA_URL):
+        path = os.path.join(settings.MEDIA_ROOT, unquote(parts.path[len(settings.MEDIA_URL):]))
+    elif not parts.netloc and parts.path.startswith(settings.STATIC_URL):
+        path = finders.find(unquote(parts.path[len(settings.STATIC_URL):]))
+    if path is not None:
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            raise LegacyImageError(f'Unable to read {src}: {e}')
+    elif parts.scheme in ('http', 'https'):
+        try:
+            content = (fetcher or logos.HTTPFetcher()).fetch(url).content
+        except logos.FetchError as e:
+            raise LegacyImageError(str(e))
+    else:
+        raise LegacyImageError(f'Unable to find {src}')
+    try:
+        Image.open(io.BytesIO(content)).verify()
+    except Exception:
+        raise LegacyImageError(f'{src} is not an image')
+    return name, content
+
+
+def _import_images(images, existing, create, replace, fetcher):
+    for name, src in sorted(images.items()):
+        instance = existing.get(name)
+        if instance is not None and not replace:
+            yield name, None
+            continue
+        try:
+            filename, content = read_legacy_image(src, fetcher)
+        except LegacyImageError as e:
+            yield name, str(e)
+            continue
+        if instance is None:
+            instance = create(name)
+            try:
+                instance.clean_fields(exclude=['image'])
+            except ValidationError as e:
+                yield name, ' '.join(e.messages)
+                continue
+        instance.image.save(filename, ContentFile(content))
+        yield name, None
+
+
+def import_legacy(league, replace=False, fetcher=None):
+    """Load the emotes and team icons of the league's hand-maintained metadata
+    file into the database, replacing existing images only with `replace`.
+    Team codes of teams in the archive keep their team logos.
+
+    Yields `(kind, name, error)` for every emote and team icon in the file,
+    where kind is `'emote'` or `'team'` and the error is None if the image was
+    imported or already existed.
+    """
+    try:
+        with open(legacy_path(league), 'rb') as f:
+            legacy = json.load(f)
+    except FileNotFoundError:
+        return
+    slugs = set(league_teams(league).values_list('slug', flat=True))
+    teams = {code: src for code, src in legacy.get('teams', {}).items() if code not in slugs}
+    existing = {icon.code: icon for icon in league.team_icons.all()}
+    for code, error in _import_images(teams, existing,
+                                      lambda code: models.TeamIcon(league=league, code=code),
+                                      replace, fetcher):
+        yield 'team', code, error
+    existing = {emote.name: emote for emote in league.emotes.all()}
+    for name, error in _import_images(legacy.get('emotes', {}), existing,
+                                      lambda name: models.Emote(league=league, name=name),
+                                      replace, fetcher):
+        yield 'emote', name, error
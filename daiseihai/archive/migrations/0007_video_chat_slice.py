@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:15
+
+import daiseihai.archive.models
+import daiseihai.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0006_auto_20190112_1930'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='chat_slice',
+            field=models.FileField(blank=True, editable=False, null=True, storage=daiseihai.storage.OverwriteStorage(), upload_to=daiseihai.archive.models._get_chat_slice_path),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='chat_slice_key',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True),
+        ),
+    ]
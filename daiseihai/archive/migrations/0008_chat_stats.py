@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0007_video_chat_slice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='first_timestamp',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_timestamp',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='line_count',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='size',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0008_chat_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.BigIntegerField()),
+                ('team', models.CharField(max_length=50)),
+                ('user', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+            ],
+            options={
+                'ordering': ('timestamp',),
+            },
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='search_indexed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ChatTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='archive.chatmessage')),
+                ('timestamp', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='chatterm',
+            index=models.Index(fields=['term', 'timestamp', 'message'], name='archive_chatterm_term_idx'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='chat',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='archive.chat'),
+        ),
+    ]
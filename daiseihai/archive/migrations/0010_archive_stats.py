@@ -0,0 +1,44 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+def count_stats(apps, schema_editor):
+    Matchup = apps.get_model('archive', 'Matchup')
+    Team = apps.get_model('archive', 'Team')
+    Tournament = apps.get_model('archive', 'Tournament')
+    for tournament in Tournament.objects.all():
+        tournament.video_count = tournament.videos.filter(is_visible=True).count()
+        tournament.save(update_fields=['video_count'])
+    for team in Team.objects.all():
+        matchups = Matchup.objects.filter(models.Q(home=team) | models.Q(away=team))
+        team.game_count = matchups.count()
+        team.video_count = matchups.filter(video__is_visible=True)\
+                                   .values('video').distinct().count()
+        team.save(update_fields=['game_count', 'video_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0009_chat_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='game_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='video_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='video_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(count_stats, migrations.RunPython.noop),
+    ]
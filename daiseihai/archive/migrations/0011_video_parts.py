@@ -0,0 +1,37 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:28
+
+import itertools
+
+from django.db import migrations, models
+
+
+def number_parts(apps, schema_editor):
+    Video = apps.get_model('archive', 'Video')
+    videos = Video.objects.filter(is_visible=True).order_by('tournament', 'date', 'order')
+    for _, day_videos in itertools.groupby(videos, lambda video: (video.tournament_id,
+                                                                   video.date)):
+        day_videos = list(day_videos)
+        for part, video in enumerate(day_videos, start=1):
+            video.part, video.part_count = part, len(day_videos)
+            video.save(update_fields=['part', 'part_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0010_archive_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='part',
+            field=models.PositiveSmallIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='part_count',
+            field=models.PositiveSmallIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(number_parts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0011_video_parts'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='video',
+            unique_together={('tournament', 'date', 'order')},
+        ),
+    ]
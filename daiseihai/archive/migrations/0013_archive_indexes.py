@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0012_video_tournament_order'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='matchup',
+            index=models.Index(fields=['home', 'video'], name='archive_matchup_home_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchup',
+            index=models.Index(fields=['away', 'video'], name='archive_matchup_away_idx'),
+        ),
+    ]
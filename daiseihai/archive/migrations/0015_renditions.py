@@ -0,0 +1,39 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:33
+
+import daiseihai.archive.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0014_video_media_info'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='logo_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=daiseihai.archive.models._get_rendition_path),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='rendition_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='poster',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=daiseihai.archive.models._get_rendition_path),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='rendition_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=daiseihai.archive.models._get_rendition_path),
+        ),
+    ]
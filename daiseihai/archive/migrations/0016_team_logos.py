@@ -0,0 +1,39 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:35
+
+import daiseihai.archive.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0015_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='logo',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=daiseihai.archive.models._get_rendition_path),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='logo_checked',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='logo_etag',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='logo_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='logo_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
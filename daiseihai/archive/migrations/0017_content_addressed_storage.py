@@ -0,0 +1,30 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:37
+
+import daiseihai.archive.models
+import daiseihai.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0016_team_logos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chat',
+            name='file',
+            field=models.FileField(storage=daiseihai.storage.ContentAddressedStorage(), upload_to=daiseihai.archive.models._get_chat_file_path),
+        ),
+        migrations.AlterField(
+            model_name='tournament',
+            name='logo',
+            field=models.ImageField(storage=daiseihai.storage.ContentAddressedStorage(), upload_to=daiseihai.archive.models._get_tournament_logo_path),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='chat_slice',
+            field=models.FileField(blank=True, editable=False, null=True, storage=daiseihai.storage.ContentAddressedStorage(), upload_to=daiseihai.archive.models._get_chat_slice_path),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:45
+
+import daiseihai.archive.models
+import daiseihai.storage
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0017_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='league',
+            name='emote_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=16),
+        ),
+        migrations.CreateModel(
+            name='Emote',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, validators=[django.core.validators.RegexValidator('^[A-Za-z0-9]+$', 'Emote names may only contain letters and digits.')])),
+                ('image', models.ImageField(storage=daiseihai.storage.ContentAddressedStorage(), upload_to=daiseihai.archive.models._get_emote_path)),
+                ('league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emotes', to='archive.league')),
+            ],
+            options={
+                'ordering': ('name',),
+                'unique_together': {('league', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:47
+
+import daiseihai.archive.models
+import daiseihai.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0018_emotes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='league',
+            name='metadata',
+            field=models.FileField(blank=True, editable=False, null=True, storage=daiseihai.storage.ContentAddressedStorage(), upload_to=daiseihai.archive.models._get_league_metadata_path),
+        ),
+        migrations.AddField(
+            model_name='league',
+            name='metadata_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:20
+
+import daiseihai.archive.models
+import daiseihai.storage
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0019_league_metadata_bundles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamIcon',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, validators=[django.core.validators.RegexValidator('^[A-Za-z0-9_-]+$', 'Team codes may only contain letters, digits, hyphens and underscores.')])),
+                ('image', models.ImageField(storage=daiseihai.storage.ContentAddressedStorage(), upload_to=daiseihai.archive.models._get_team_icon_path)),
+                ('league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='team_icons', to='archive.league')),
+            ],
+            options={
+                'ordering': ('code',),
+                'unique_together': {('league', 'code')},
+            },
+        ),
+    ]
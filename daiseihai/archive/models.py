@@ -1,13 +1,16 @@
 from urllib.parse import urljoin
+import hashlib
 import os.path
 import uuid
 
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.validators import RegexValidator
 from django.db import models
 
-from daiseihai.archive import constants
+from daiseihai.archive import chat as chat_logs, constants, images, logos
 from daiseihai.fields import ColorField
-from daiseihai.storage import OverwriteStorage
+from daiseihai.storage import ContentAddressedStorage
 
 
 def _get_chat_file_path(instance, filename):
@@ -16,17 +19,73 @@ def _get_chat_file_path(instance, filename):
     return f'chats/{instance.id}{extension}'
 
 
+def _get_chat_slice_path(instance, filename):
+    """Save video chat slices in `MEDIA_ROOT/chats/slices/PK.txt`."""
+    return f'chats/slices/{instance.pk}.txt'
+
+
+def _get_emote_path(instance, filename):
+    """Save emotes in `MEDIA_ROOT/emotes/league/name.ext`."""
+    _, extension = os.path.splitext(filename)
+    return f'emotes/{instance.league.slug}/{instance.name}{extension}'
+
+
+def _get_team_icon_path(instance, filename):
+    """Save team icons in `MEDIA_ROOT/team-icons/league/code.ext`."""
+    _, extension = os.path.splitext(filename)
+    return f'team-icons/{instance.league.slug}/{instance.code}{extension}'
+
+
+def _get_league_metadata_path(instance, filename):
+    """Save league metadata bundles in `MEDIA_ROOT/metadata/bundles/slug.json`."""
+    return f'metadata/bundles/{instance.slug}.json'
+
+
 def _get_tournament_logo_path(instance, filename):
     """Save tournament logos in `MEDIA_ROOT/logos/slug.ext`."""
     _, extension = os.path.splitext(filename)
     return f'logos/{instance.slug}{extension}'
 
 
+def _get_rendition_path(instance, filename):
+    """Save image renditions in `MEDIA_ROOT/renditions/model/filename`."""
+    return f'renditions/{instance._meta.model_name}/{filename}'
+
+
+def _set_renditions(instance, renditions, **fields):
+    """Replace the rendition files of `instance` with the rendered images in
+    `renditions`, a dict of field names and image data, and save them with the
+    other `fields`.
+    """
+    for field, content in renditions.items():
+        file = getattr(instance, field)
+        previous = file.name
+        rendition = images.rendition_file(f'{instance.pk}-{field}', content)
+        name = file.field.generate_filename(instance, rendition.name)
+        if name != previous:
+            # Renditions are named after their content, so an existing file
+            # with the same name already has the same content.
+            if file.storage.exists(name):
+                file.name = name
+            else:
+                file.save(rendition.name, rendition, save=False)
+            if previous:
+                file.storage.delete(previous)
+    for field, value in fields.items():
+        setattr(instance, field, value)
+    instance.save(update_fields=[*renditions, *fields])
+
+
 class Chat(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     date = models.DateField()
-    file = models.FileField(storage=OverwriteStorage(),
+    file = models.FileField(storage=ContentAddressedStorage(),
                             upload_to=_get_chat_file_path)
+    line_count = models.PositiveIntegerField(null=True, editable=False)
+    first_timestamp = models.BigIntegerField(null=True, editable=False)
+    last_timestamp = models.BigIntegerField(null=True, editable=False)
+    size = models.PositiveIntegerField(null=True, editable=False)
+    search_indexed = models.BooleanField(default=False, editable=False)
 
     def __str__(self):
         return f'{self.date} ({self.id})'
@@ -35,6 +94,29 @@ class Chat(models.Model):
     def url(self):
         return self.file.url
 
+    @property
+    def blob(self) -> str:
+        """Name of the file holding the chat log, which changes whenever its
+        content does.
+        """
+        return os.path.basename(self.file.storage.blob_name(self.file.name))
+
+    def overlaps(self, start: int, end=None) -> bool:
+        """Check whether the chat may have lines in the `[start, end)` range.
+        Chats that have not been ingested are assumed to overlap everything.
+        """
+        if self.line_count is None:
+            return True
+        if self.line_count == 0:
+            return False
+        return self.last_timestamp >= start and (end is None or self.first_timestamp < end)
+
+    def set_stats(self, stats: chat_logs.ChatStats):
+        """Store the statistics of an ingested chat log."""
+        for field, value in stats._asdict().items():
+            setattr(self, field, value)
+        self.search_indexed = False
+
     class Meta:
         ordering = ('-date', )
 
@@ -42,28 +124,108 @@ class Chat(models.Model):
 class League(models.Model):
     name = models.CharField(max_length=200, unique=True)
     slug = models.SlugField(unique=True)
+    emote_key = models.CharField(max_length=16, blank=True, default='', editable=False)
+    metadata = models.FileField(storage=ContentAddressedStorage(),
+                                upload_to=_get_league_metadata_path,
+                                null=True, blank=True, editable=False)
+    metadata_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
 
     @property
     def metadata_url(self):
+        """Returns the URL of the generated metadata bundle, or of the
+        hand-maintained metadata file until one has been generated.
+        """
+        if self.metadata:
+            return self.metadata.url
         return urljoin(settings.MEDIA_URL, f'metadata/{self.slug}.json')
 
     def __str__(self):
         return self.name
 
+    @property
+    def emote_names(self) -> frozenset:
+        return frozenset(self.emotes.values_list('name', flat=True))
+
+    def update_emote_key(self) -> bool:
+        """Store the key of the league's current emote set. Returns whether it
+        changed.
+        """
+        key = chat_logs.emote_key(self.emote_names)
+        if key == self.emote_key:
+            return False
+        self.emote_key = key
+        League.objects.filter(pk=self.pk).update(emote_key=key)
+        return True
+
+    def set_metadata(self, bundle, digest):
+        """Publish a generated metadata `bundle` file with the SHA-256 `digest`
+        of its content.
+        """
+        self.metadata.save(bundle.name, bundle, save=False)
+        self.metadata_hash = digest
+        self.save(update_fields=['metadata', 'metadata_hash'])
+
+
+class Emote(models.Model):
+    league = models.ForeignKey(League, related_name='emotes', on_delete=models.CASCADE)
+    name = models.CharField(max_length=50, validators=[
+        RegexValidator(r'^[A-Za-z0-9]+$', 'Emote names may only contain letters and digits.')
+    ])
+    image = models.ImageField(storage=ContentAddressedStorage(), upload_to=_get_emote_path)
+
+    def __str__(self):
+        return f':{self.name}:'
+
+    class Meta:
+        ordering = ('name', )
+        unique_together = ('league', 'name')
+
+
+class TeamIcon(models.Model):
+    """Chat icon of a team code that is not the slug of a team in the archive,
+    or of chat users without a team with the code `NULL`.
+    """
+    league = models.ForeignKey(League, related_name='team_icons', on_delete=models.CASCADE)
+    code = models.CharField(max_length=50, validators=[
+        RegexValidator(r'^[A-Za-z0-9_-]+$', 'Team codes may only contain letters, digits, '
+                                            'hyphens and underscores.')
+    ])
+    image = models.ImageField(storage=ContentAddressedStorage(), upload_to=_get_team_icon_path)
+
+    def __str__(self):
+        return self.code
+
+    class Meta:
+        ordering = ('code', )
+        unique_together = ('league', 'code')
+
 
 class Tournament(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     start_date = models.DateField()
     end_date = models.DateField()
-    logo = models.ImageField(storage=OverwriteStorage(),
+    logo = models.ImageField(storage=ContentAddressedStorage(),
                              upload_to=_get_tournament_logo_path)
+    logo_thumbnail = models.ImageField(upload_to=_get_rendition_path, null=True, blank=True,
+                                       editable=False)
+    rendition_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
     league = models.ForeignKey(League, related_name='tournaments',
                                on_delete=models.PROTECT, null=True)
+    video_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
 
     def __str__(self):
         return f'{self.name} ({self.slug})'
 
+    @property
+    def logo_thumbnail_url(self) -> str:
+        """Returns the URL of the small logo, or the original until one exists."""
+        return (self.logo_thumbnail or self.logo).url
+
+    def set_renditions(self, renditions, key):
+        """Store rendered logo images made from the logo identified by `key`."""
+        _set_renditions(self, renditions, rendition_key=key)
+
     class Meta:
         ordering = ('-start_date', )
 
@@ -74,21 +236,71 @@ class Team(models.Model):
     main_color = ColorField(default='#000000')
     secondary_color = ColorField(default='#ffffff')
     long_name = models.BooleanField(default=False)
+    game_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    video_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    logo = models.ImageField(upload_to=_get_rendition_path, null=True, blank=True,
+                             editable=False)
+    logo_hash = models.CharField(max_length=40, null=True, blank=True, editable=False)
+    logo_etag = models.CharField(max_length=200, null=True, blank=True, editable=False)
+    logo_size = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    logo_checked = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
     @property
     def logo_image(self) -> str:
-        """Returns the URL for the team's current logo on the wiki."""
-        name = self.name.replace('/', '')
-        return f'https://implyingrigged.info/wiki/Special:Redirect/file/{name}_logo.png'
+        """Returns the URL for the team's mirrored logo, or for the current logo
+        on the wiki if it has not been mirrored yet.
+        """
+        if self.logo:
+            return self.logo.url
+        return logos.logo_url(self)
+
+    def set_logo(self, rendition, content: bytes, etag, checked):
+        """Store a logo downloaded from the wiki and its card-sized
+        `rendition`. Without a rendition, the logo is unchanged and only its
+        ETag and check time are updated.
+        """
+        if rendition is None:
+            self._update_logo(logo_etag=etag, logo_checked=checked)
+            return
+        _set_renditions(self, {'logo': rendition}, logo_hash=hashlib.sha1(content).hexdigest(),
+                        logo_size=len(content), logo_etag=etag, logo_checked=checked)
+
+    def set_logo_checked(self, checked):
+        """Record that the mirrored logo still matches the wiki."""
+        self._update_logo(logo_checked=checked)
+
+    def _update_logo(self, **fields):
+        # Nothing shown on the pages changes, so the save signals are skipped.
+        Team.objects.filter(pk=self.pk).update(**fields)
+        for field, value in fields.items():
+            setattr(self, field, value)
 
     @property
     def style(self) -> str:
         """Returns the team colors as CSS style string."""
         return f'background-color: {self.main_color}; color: {self.secondary_color};'
 
+    @property
+    def video_filter(self) -> models.Q:
+        """Returns a filter for the videos the team has played in.
+
+        The home and away games are looked up from the matchup team indexes
+        and combined with a union, so that the videos are fetched by primary
+        key and the cost follows the team's own history rather than the size
+        of the video table.
+        """
+        home = Matchup.objects.filter(home=self).order_by().values('video')
+        away = Matchup.objects.filter(away=self).order_by().values('video')
+        return models.Q(pk__in=home.union(away))
+
+    @property
+    def videos(self):
+        """Returns the videos the team has played in."""
+        return Video.objects.filter(self.video_filter)
+
     class Meta:
         ordering = ('slug', )
 
@@ -104,15 +316,136 @@ class Video(models.Model):
     url = models.CharField(null=True, blank=True, max_length=200)
     intro_url = models.CharField(null=True, blank=True, max_length=200)
     duration = models.PositiveIntegerField(null=True, blank=True)
+    bitrate = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    width = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    video_codec = models.CharField(null=True, blank=True, max_length=50, editable=False)
+    audio_codec = models.CharField(null=True, blank=True, max_length=50, editable=False)
+    media_size = models.BigIntegerField(null=True, blank=True, editable=False)
+    media_mtime = models.BigIntegerField(null=True, blank=True, editable=False)
+    poster = models.ImageField(upload_to=_get_rendition_path, null=True, blank=True,
+                               editable=False)
+    thumbnail = models.ImageField(upload_to=_get_rendition_path, null=True, blank=True,
+                                  editable=False)
+    rendition_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
     is_visible = models.BooleanField(default=True)
+    part = models.PositiveSmallIntegerField(default=1, editable=False)
+    part_count = models.PositiveSmallIntegerField(default=1, editable=False)
 
     chat = models.ForeignKey(Chat, related_name='+', on_delete=models.PROTECT,
                              null=True, blank=True)
     chat_start = models.BigIntegerField(null=True, blank=True)
+    chat_slice = models.FileField(storage=ContentAddressedStorage(),
+                                  upload_to=_get_chat_slice_path,
+                                  null=True, blank=True, editable=False)
+    chat_slice_key = models.CharField(max_length=200, null=True, blank=True,
+                                      editable=False)
 
     def __str__(self):
         return f'{self.tournament.slug}, {self.date} ({self.order})'
 
+    @property
+    def chat_slice_source(self) -> str:
+        """Key identifying the chat and its content, timing and emote set the
+        chat slice is built from.
+        """
+        league = self.tournament.league
+        emote_key = league.emote_key if league else ''
+        chat_blob = self.chat.blob if self.chat else ''
+        return f'{self.chat_id}:{chat_blob}:{self.chat_start}:{self.duration}:{emote_key}'
+
+    def chat_source(self):
+        """Return the path of the chat log to read the video's chat from, the
+        chat timestamp of the start of the video in it and the emotes to
+        tokenize its messages against, or None if they are already tokenized.
+        """
+        if self.has_chat_slice:
+            # Chat slices are already relative to the start of the video and
+            # tokenized.
+            return self.chat_slice.path, 0, None
+        return self.chat.file.path, self.chat_start, self.emote_names
+
+    @property
+    def emote_names(self) -> frozenset:
+        """Names of the emotes in the video's chat."""
+        league = self.tournament.league
+        return league.emote_names if league else frozenset()
+
+    @property
+    def has_chat_slice(self) -> bool:
+        """Video has an up-to-date chat slice."""
+        return bool(self.chat_slice) and self.chat_slice_key == self.chat_slice_source
+
+    @property
+    def media_stat(self):
+        """Size and modification time of the video file when it was probed."""
+        return (self.media_size, self.media_mtime)
+
+    def set_media_info(self, info, stat):
+        """Store the probed `MediaInfo` of the video file with the size and
+        modification time of the file, rebuilding the chat slice if the
+        duration changed.
+        """
+        duration_changed = info.duration != self.duration
+        self.duration = info.duration
+        self.bitrate = info.bitrate
+        self.width = info.width
+        self.height = info.height
+        self.video_codec = info.video_codec
+        self.audio_codec = info.audio_codec
+        self.media_size, self.media_mtime = stat
+        self.save(update_fields=['duration', 'bitrate', 'width', 'height', 'video_codec',
+                                 'audio_codec', 'media_size', 'media_mtime'])
+        if duration_changed:
+            self.update_chat_slice()
+
+    def set_renditions(self, renditions, key):
+        """Store the poster and thumbnail made from the frame identified by
+        `key`.
+        """
+        _set_renditions(self, renditions, rendition_key=key)
+
+    def suggest_chat_start(self):
+        """Suggest a chat start timestamp by matching the video's bookmarks to
+        bursts of chat activity. Time already covered by other videos using
+        the same chat is skipped.
+        """
+        if not self.chat:
+            return None
+        anchors = [bookmark.position.total_seconds() for bookmark in self.bookmarks.all()]
+        other_videos = Video.objects.filter(chat=self.chat, chat_start__isnull=False,
+                                            duration__isnull=False)\
+                                    .exclude(pk=self.pk)
+        exclude = [(video.chat_start, video.chat_start + video.duration * 1000)
+                   for video in other_videos]
+        return chat_logs.suggest_offset(self.chat.file.path, anchors, exclude=exclude)
+
+    def update_chat_slice(self, force=False) -> bool:
+        """Write the part of the chat shown during the video into its own file
+        with timestamps relative to the start of the video and messages
+        tokenized against the league's emotes.
+
+        Returns whether the chat slice was changed.
+        """
+        if not self.has_chat:
+            if not self.chat_slice:
+                return False
+            self.chat_slice.delete(save=False)
+            self.chat_slice_key = None
+        elif force or not self.has_chat_slice:
+            end = self.chat_start + self.duration * 1000 if self.duration else None
+            if self.chat.overlaps(self.chat_start, end):
+                content = chat_logs.slice_lines(self.chat.file.path, self.chat_start, end,
+                                                emotes=self.emote_names)
+            else:
+                content = b''
+            self.chat_slice.save('chat.txt', ContentFile(content), save=False)
+            self.chat_slice_key = self.chat_slice_source
+        else:
+            return False
+        self.save(update_fields=['chat_slice', 'chat_slice_key'])
+        return True
+
     @property
     def has_chat(self) -> bool:
         """Video has an usable chat attached to it."""
@@ -127,7 +460,9 @@ class Video(models.Model):
 
     class Meta:
         ordering = ('date', 'order')
-        unique_together = ('date', 'order')
+        # The unique index also serves tournament pages, which list the
+        # visible videos of a tournament in order.
+        unique_together = ('tournament', 'date', 'order')
 
 
 class Matchup(models.Model):
@@ -140,6 +475,11 @@ class Matchup(models.Model):
     class Meta:
         ordering = ('order', )
         unique_together = ('video', 'order')
+        indexes = [
+            # Team pages look up the videos of a team from either side.
+            models.Index(fields=('home', 'video'), name='archive_matchup_home_idx'),
+            models.Index(fields=('away', 'video'), name='archive_matchup_away_idx'),
+        ]
 
 
 class VideoBookmark(models.Model):
@@ -149,3 +489,30 @@ class VideoBookmark(models.Model):
 
     class Meta:
         ordering = ('position', )
+
+
+class ChatMessage(models.Model):
+    """A chat line stored for full-text search."""
+    chat = models.ForeignKey(Chat, related_name='messages', on_delete=models.CASCADE)
+    timestamp = models.BigIntegerField()
+    team = models.CharField(max_length=50)
+    user = models.CharField(max_length=200)
+    message = models.TextField()
+
+    class Meta:
+        ordering = ('timestamp', )
+
+
+class ChatTerm(models.Model):
+    """Inverted index entry mapping a search term to a chat message."""
+    term = models.CharField(max_length=100)
+    message = models.ForeignKey(ChatMessage, related_name='terms',
+                                on_delete=models.CASCADE)
+    # Copy of the message timestamp so that the latest messages with a term
+    # are read in index order.
+    timestamp = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('term', 'timestamp', 'message'), name='archive_chatterm_term_idx'),
+        ]
@@ -0,0 +1,104 @@
+"""Container metadata of local video files, read with ffprobe."""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import math
+import os
+import subprocess
+
+from django.conf import settings
+
+MediaInfo = namedtuple('MediaInfo', ('duration', 'bitrate', 'width', 'height', 'video_codec',
+                                     'audio_codec'))
+
+PROBE_TIMEOUT = 60
+
+
+class ProbeError(Exception):
+    pass
+
+
+def video_path(video):
+    """Return the path of the local file of `video`, or None if the video is
+    not stored locally.
+    """
+    if not settings.VIDEO_ROOT or not video.filename:
+        return None
+    return os.path.join(settings.VIDEO_ROOT, video.filename)
+
+
+def _int(value):
+    return int(value) if value not in (None, 'N/A') else None
+
+
+def parse(data: dict) -> MediaInfo:
+    """Return the `MediaInfo` in ffprobe JSON output with format and stream
+    information.
+    """
+    container = data.get('format', {})
+    streams = data.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), {})
+    duration = container.get('duration')
+    return MediaInfo(
+        # Round up so that the chat of the last second is not cut off.
+        duration=math.ceil(float(duration)) if duration not in (None, 'N/A') else None,
+        bitrate=_int(container.get('bit_rate')),
+        width=_int(video.get('width')),
+        height=_int(video.get('height')),
+        video_codec=video.get('codec_name'),
+        audio_codec=audio.get('codec_name'),
+    )
+
+
+def probe(path: str) -> MediaInfo:
+    """Read the container metadata of the video file at `path`."""
+    command = [settings.FFPROBE_PATH, '-v', 'error', '-print_format', 'json',
+               '-show_format', '-show_streams', path]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise ProbeError(str(e))
+    if result.returncode != 0:
+        raise ProbeError(result.stderr.decode('utf-8', 'replace').strip())
+    try:
+        return parse(json.loads(result.stdout))
+    except ValueError as e:
+        raise ProbeError(f'Invalid ffprobe output: {e}')
+
+
+def probe_videos(videos, workers=4, force=False):
+    """Probe the local files of `videos` in `workers` threads and store the
+    results on the videos. Files that have not changed since they were last
+    probed are skipped unless `force` is set.
+
+    Yields `(video, error)` pairs for every probed video, where `error` is a
+    `ProbeError` if the file could not be probed.
+    """
+    pending = []
+    for video in videos:
+        path = video_path(video)
+        if path is None:
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            yield video, ProbeError(str(e))
+            continue
+        if not force and video.media_stat == (stat.st_size, stat.st_mtime_ns):
+            continue
+        pending.append((video, path, stat))
+
+    with ThreadPoolExecutor(workers) as executor:
+        futures = {executor.submit(probe, path): (video, stat) for video, path, stat in pending}
+        # Results are saved from this thread so that the workers only wait for
+        # ffprobe and never touch the database.
+        for future in as_completed(futures):
+            video, stat = futures[future]
+            try:
+                info = future.result()
+            except ProbeError as e:
+                yield video, e
+                continue
+            video.set_media_info(info, (stat.st_size, stat.st_mtime_ns))
+            yield video, None
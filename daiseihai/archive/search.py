@@ -0,0 +1,87 @@
+"""Full-text search over chat logs.
+
+Every chat line is stored as a `ChatMessage` with one `ChatTerm` per distinct
+term in the message, so a query only touches the index rows of its terms.
+"""
+import html
+import re
+
+from django.db import transaction
+
+from daiseihai.archive import chat, models
+
+MAX_TERM_LENGTH = 100
+_TERM_RE = re.compile(r'\w+')
+
+
+def terms(text: str):
+    """Return the distinct search terms in `text`."""
+    return {term for term in _TERM_RE.findall(html.unescape(text).lower())
+            if len(term) <= MAX_TERM_LENGTH}
+
+
+@transaction.atomic
+def index_chat(chat_object, batch_size=1000):
+    """Replace the search index entries of a chat with its current lines."""
+    models.ChatMessage.objects.filter(chat=chat_object).delete()
+    with chat_object.file.open('rb') as chat_file:
+        models.ChatMessage.objects.bulk_create(
+            (models.ChatMessage(chat=chat_object, timestamp=line.timestamp,
+                                team=line.team, user=line.user, message=line.message)
+             for _, line in chat.iter_lines(chat_file)),
+            batch_size=batch_size,
+        )
+    messages = models.ChatMessage.objects.filter(chat=chat_object)\
+                                         .values_list('pk', 'timestamp', 'message')
+    models.ChatTerm.objects.bulk_create(
+        (models.ChatTerm(term=term, message_id=pk, timestamp=timestamp)
+         for pk, timestamp, message in messages.iterator() for term in terms(message)),
+        batch_size=batch_size,
+    )
+    chat_object.search_indexed = True
+    chat_object.save(update_fields=['search_indexed'])
+
+
+def _find_video(videos, timestamp):
+    """Return the video in `videos`, ordered by chat start, showing the chat at
+    `timestamp`.
+    """
+    found = None
+    for video in videos:
+        if video.chat_start > timestamp:
+            break
+        if video.duration is None or timestamp < video.chat_start + video.duration * 1000:
+            found = video
+    return found
+
+
+def search(query: str, limit=100):
+    """Return `(message, video)` pairs for the latest chat messages containing
+    every term in `query`. `video` is the video whose chat covers the message,
+    or `None` if there is no such video.
+    """
+    query_terms = sorted(terms(query))
+    if not query_terms:
+        return []
+    # The entries of the first term are read backwards from the (term,
+    # timestamp) index until `limit` of them match the other terms.
+    matches = models.ChatTerm.objects.filter(term=query_terms[0])
+    for term in query_terms[1:]:
+        term_messages = models.ChatTerm.objects.filter(term=term).values('message')
+        matches = matches.filter(message__in=term_messages)
+    message_ids = list(matches.order_by('-timestamp', '-message_id')
+                              .values_list('message', flat=True)[:limit])
+    found = models.ChatMessage.objects.in_bulk(message_ids)
+    messages = [found[pk] for pk in message_ids]
+
+    videos = {}
+    chat_videos = models.Video.objects.select_related('tournament')\
+                                      .filter(chat__in={message.chat_id for message in messages},
+                                              chat_start__isnull=False, is_visible=True)\
+                                      .order_by('chat_start')
+    for video in chat_videos:
+        videos.setdefault(video.chat_id, []).append(video)
+    return [
+        (message, _find_video(videos.get(message.chat_id, []), message.timestamp))
+        for message in messages
+    ]
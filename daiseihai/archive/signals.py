@@ -0,0 +1,224 @@
+from contextlib import contextmanager
+import threading
+
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from daiseihai import compression
+from daiseihai.archive import metadata, models, stats, versions
+
+
+def _video_scopes(videos) -> set:
+    """Return the version scopes of `videos` and every page listing them."""
+    scopes = {'archive'}
+    for pk, tournament_slug in videos.values_list('pk', 'tournament__slug'):
+        scopes.update((f'video:{pk}', f'tournament:{tournament_slug}'))
+    teams = models.Matchup.objects.filter(video__in=videos)\
+                                  .values_list('home__slug', 'away__slug')
+    for home, away in teams:
+        scopes.update((f'team:{home}', f'team:{away}'))
+    return scopes
+
+
+def _team_scopes(*pks) -> set:
+    slugs = models.Team.objects.filter(pk__in=pks).values_list('slug', flat=True)
+    return {f'team:{slug}' for slug in slugs}
+
+
+# Video fields the statistics and part numbers depend on.
+_VIDEO_COUNTED_FIELDS = frozenset(('tournament', 'tournament_id', 'date', 'order', 'is_visible'))
+# Video fields that are not shown on any page.
+_VIDEO_UNSHOWN_FIELDS = frozenset(('chat_slice', 'chat_slice_key'))
+
+
+def _counts_changed(update_fields) -> bool:
+    return update_fields is None or not _VIDEO_COUNTED_FIELDS.isdisjoint(update_fields)
+
+
+@receiver(pre_save, sender=models.Video)
+def video_changing(sender, instance, update_fields=None, **kwargs):
+    """Remember the tournament and date of a video before it is moved."""
+    if instance.pk is None or not _counts_changed(update_fields):
+        instance._previous_tournament = instance._previous_date = None
+        return
+    instance._previous_tournament = models.Tournament.objects.filter(videos=instance.pk)\
+                                                             .first()
+    instance._previous_date = models.Video.objects.filter(pk=instance.pk)\
+                                                  .values_list('date', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=models.Video)
+def video_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and _VIDEO_UNSHOWN_FIELDS.issuperset(update_fields):
+        return
+    if not _counts_changed(update_fields):
+        versions.bump_versions(*_video_scopes(models.Video.objects.filter(pk=instance.pk)))
+        return
+    tournaments = {instance.tournament}
+    days = {(instance.tournament_id, instance.date)}
+    previous_tournament = getattr(instance, '_previous_tournament', None)
+    if previous_tournament:
+        tournaments.add(previous_tournament)
+        days.add((previous_tournament.pk, instance._previous_date))
+    stats.update_tournament_counts(
+        models.Tournament.objects.filter(pk__in=[tournament.pk for tournament in tournaments])
+    )
+    stats.update_team_counts(models.Team.objects.filter(
+        Q(home_games__video=instance.pk) | Q(away_games__video=instance.pk)
+    ))
+    renumbered = stats.update_video_parts(days)
+    if instance.pk in renumbered:
+        instance.part, instance.part_count = models.Video.objects.filter(pk=instance.pk)\
+            .values_list('part', 'part_count').get()
+
+    scopes = _video_scopes(models.Video.objects.filter(pk__in=[instance.pk, *renumbered]))
+    scopes.add(f'video:{instance.pk}')
+    scopes.update(f'tournament:{tournament.slug}' for tournament in tournaments)
+    versions.bump_versions(*scopes)
+
+
+@receiver(pre_save, sender=models.Matchup)
+def matchup_changing(sender, instance, **kwargs):
+    """Remember the teams of a matchup before they are replaced."""
+    previous = models.Matchup.objects.filter(pk=instance.pk)\
+                                     .values_list('home_id', 'away_id').first()
+    instance._previous_teams = previous or ()
+
+
+@receiver([post_save, post_delete], sender=models.Matchup)
+def matchup_changed(sender, instance, **kwargs):
+    team_pks = (instance.home_id, instance.away_id, *getattr(instance, '_previous_teams', ()))
+    stats.update_team_counts(models.Team.objects.filter(pk__in=team_pks))
+
+    scopes = _video_scopes(models.Video.objects.filter(pk=instance.video_id))
+    scopes.update(_team_scopes(*team_pks))
+    versions.bump_versions(*scopes)
+
+
+def _compress(file, fast=False):
+    """Update the compressed variants of a saved file."""
+    if not file:
+        return
+    try:
+        compression.compress_file(file.path, fast=fast)
+    except FileNotFoundError:
+        pass
+
+
+@receiver(post_save, sender=models.Chat)
+def chat_saved(sender, instance, **kwargs):
+    # Chat logs are large, so the full compression is left to compress_media.
+    _compress(instance.file, fast=True)
+    # Chat slices are keyed by the content of the chat, so replacing the chat
+    # log makes the slices of its videos stale.
+    videos = models.Video.objects.select_related('chat', 'tournament__league')\
+                                 .filter(chat=instance)
+    for video in videos:
+        video.update_chat_slice()
+
+
+@receiver(post_save, sender=models.Video)
+def video_saved(sender, instance, update_fields=None, **kwargs):
+    # Chat slices are only written by update_chat_slice.
+    if update_fields is not None and 'chat_slice' in update_fields:
+        _compress(instance.chat_slice, fast=True)
+
+
+@receiver(post_save, sender=models.League)
+def league_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and 'metadata' in update_fields:
+        _compress(instance.metadata)
+    elif not created and update_fields is None and instance.metadata:
+        # The published bundle holds the league's slug. Leagues without one
+        # keep using their hand-maintained metadata file.
+        _league_chat_changed(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=models.VideoBookmark)
+def bookmark_changed(sender, instance, **kwargs):
+    versions.bump_versions(f'video:{instance.video_id}')
+
+
+@receiver(post_save, sender=models.Team)
+@receiver(post_save, sender=models.Tournament)
+def counted_object_saved(sender, instance, **kwargs):
+    """Recount the statistics of a saved team or tournament in case they were
+    saved from an instance with outdated counts.
+    """
+    if sender is models.Team:
+        stats.update_team_counts(models.Team.objects.filter(pk=instance.pk))
+    else:
+        stats.update_tournament_counts(models.Tournament.objects.filter(pk=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=models.Team)
+def team_changed(sender, instance, **kwargs):
+    versions.bump_versions(f'team:{instance.slug}', *_video_scopes(instance.videos))
+
+
+@receiver([post_save, post_delete], sender=models.Tournament)
+def tournament_changed(sender, instance, **kwargs):
+    videos = models.Video.objects.filter(tournament=instance)
+    versions.bump_versions(f'tournament:{instance.slug}', *_video_scopes(videos))
+
+
+_pending = threading.local()
+
+
+def update_league_chat(league_pk):
+    """Publish the league's metadata bundle and tokenize the chat slices of its
+    videos again if its emote set changed.
+    """
+    league = models.League.objects.filter(pk=league_pk).first()
+    if league is None:
+        return
+    metadata.publish_bundle(league)
+    if not league.update_emote_key():
+        return
+    videos = models.Video.objects.select_related('chat', 'tournament__league')\
+                                 .filter(tournament__league=league)
+    for video in videos.exclude(chat=None):
+        video.update_chat_slice()
+    versions.bump_versions(*_video_scopes(videos))
+
+
+@contextmanager
+def league_chat_updates():
+    """Collect the leagues that change, or whose emotes or team icons change,
+    within the block and update the chat of each of them once when the block
+    exits.
+    """
+    if getattr(_pending, 'leagues', None) is not None:
+        yield
+        return
+    _pending.leagues = set()
+    try:
+        yield
+        leagues = _pending.leagues
+    finally:
+        _pending.leagues = None
+    for league_pk in sorted(leagues):
+        update_league_chat(league_pk)
+
+
+@receiver([post_save, post_delete], sender=models.Emote)
+@receiver([post_save, post_delete], sender=models.TeamIcon)
+def league_chat_changed(sender, instance, **kwargs):
+    _league_chat_changed(instance.league_id)
+
+
+def _league_chat_changed(league_pk):
+    """Update the chat of the league now, or when the enclosing
+    `league_chat_updates` block exits.
+    """
+    leagues = getattr(_pending, 'leagues', None)
+    if leagues is not None:
+        leagues.add(league_pk)
+    else:
+        update_league_chat(league_pk)
+
+
+@receiver([post_save, post_delete], sender=models.League)
+def league_changed(sender, instance, **kwargs):
+    versions.bump_versions(*_video_scopes(models.Video.objects.filter(tournament__league=instance)))
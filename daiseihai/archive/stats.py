@@ -0,0 +1,83 @@
+"""Denormalized archive statistics.
+
+`Tournament.video_count` counts the tournament's visible videos.
+`Team.game_count` counts the matchups the team has played and
+`Team.video_count` the visible videos it appears in. `Video.part` and
+`Video.part_count` number the visible videos of a tournament's matchday; hidden
+videos are numbered on their own.
+"""
+import itertools
+
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from daiseihai.archive import models
+
+
+def _count(queryset, field='pk'):
+    """Return a subquery counting the distinct values of `field` in `queryset`."""
+    counts = queryset.order_by().annotate(group=Value(1)).values('group')\
+                     .annotate(count=Count(field, distinct=True)).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+def update_tournament_counts(tournaments):
+    """Recount the videos of `tournaments`."""
+    videos = models.Video.objects.filter(tournament=OuterRef('pk'), is_visible=True)
+    tournaments.update(video_count=_count(videos))
+
+
+def update_team_counts(teams):
+    """Recount the games and videos of `teams`."""
+    matchups = models.Matchup.objects.filter(Q(home=OuterRef('pk')) | Q(away=OuterRef('pk')))
+    teams.update(
+        game_count=_count(matchups),
+        video_count=_count(matchups.filter(video__is_visible=True), 'video'),
+    )
+
+
+def _number_parts(videos) -> list:
+    """Set the parts of `videos`, which must be ordered by tournament, date and
+    order. Returns the videos whose parts changed.
+    """
+    changed = []
+    days = itertools.groupby(videos, lambda video: (video.tournament_id, video.date))
+    for _, day_videos in days:
+        day_videos = list(day_videos)
+        visible = [video for video in day_videos if video.is_visible]
+        parts = {video.pk: (part, len(visible)) for part, video in enumerate(visible, start=1)}
+        for video in day_videos:
+            part, part_count = parts.get(video.pk, (1, 1))
+            if (video.part, video.part_count) != (part, part_count):
+                video.part, video.part_count = part, part_count
+                changed.append(video)
+    return changed
+
+
+def update_video_parts(days):
+    """Renumber the videos of the `(tournament_pk, date)` matchdays in `days`.
+    Returns the primary keys of the videos whose parts changed.
+    """
+    day_filter = Q(pk__in=[])
+    for tournament_pk, date in days:
+        day_filter |= Q(tournament=tournament_pk, date=date)
+    videos = models.Video.objects.filter(day_filter)\
+                                 .only('tournament', 'date', 'order', 'is_visible', 'part',
+                                       'part_count')\
+                                 .order_by('tournament', 'date', 'order')
+    changed = _number_parts(videos)
+    models.Video.objects.bulk_update(changed, ['part', 'part_count'])
+    return [video.pk for video in changed]
+
+
+def rebuild():
+    """Recount the statistics of every tournament and team and renumber the
+    parts of every video.
+    """
+    update_tournament_counts(models.Tournament.objects.all())
+    update_team_counts(models.Team.objects.all())
+    videos = models.Video.objects.only('tournament', 'date', 'order', 'is_visible', 'part',
+                                       'part_count')\
+                                 .order_by('tournament', 'date', 'order')
+    models.Video.objects.bulk_update(_number_parts(videos.iterator()), ['part', 'part_count'],
+                                     batch_size=500)
@@ -0,0 +1,364 @@
+"""Server-Sent Events stream of a video's chat paced to the viewer's playback.
+
+Streams are served by the ASGI application directly, so that every viewer
+holds a coroutine instead of a worker. A stream is opened with
+
+    GET /video/<slug>/<date>/<order>/chat/stream/?position=<ms>&rate=<rate>
+
+and first sends a `stream` event with the ID of the stream. Chat lines are then
+sent as JSON `[timestamp, team, user, tokens]` messages when the playback
+position reaches them, and an `end` event is sent after the last line. The
+viewer reports seeks, pauses (rate 0) and playback rate changes with
+
+    POST /video/<slug>/<date>/<order>/chat/stream/<id>/
+
+and a form body with `position` and `rate`. After a seek the stream sends a
+`reset` event followed by the lines from shortly before the new position.
+
+Lines are read from the chat log in small chunks using the offset index, so
+repositioning a stream costs an index lookup and at most one index interval of
+skipped lines. Position updates are only seen by the process serving the
+stream; viewers getting a 404 reopen the stream at their position instead.
+"""
+import asyncio
+from collections import deque
+import datetime
+import json
+import time
+from urllib.parse import parse_qs
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core import signals
+from django.urls import Resolver404, resolve
+
+from daiseihai.archive import chat, models
+
+# Chat read ahead of the playback position, in milliseconds of video. More is
+# read once playback is within half of it from the end of the read chat.
+READ_AHEAD = 5000
+READ_LIMIT = 500
+# Chat sent from before the position a stream is opened or sought to.
+BACKLOG = 15000
+# Seeking forward further than this rereads the chat from the new position
+# instead of sending every line in between.
+SEEK_THRESHOLD = 10000
+# Lines due within this many milliseconds of playback are sent together.
+BATCH_WINDOW = 50
+KEEPALIVE_INTERVAL = 15
+# Seconds for which the viewers of a video share the lookup of its chat, so
+# that a crowd opening the same stream only makes one.
+SOURCE_CACHE_TIMEOUT = 10
+
+_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    # Keep nginx from buffering the stream.
+    (b'x-accel-buffering', b'no'),
+]
+
+_streams = {}
+_sources = {}
+_pending_sources = {}
+
+
+class InvalidPosition(Exception):
+    pass
+
+
+def parse_position(params: dict):
+    """Return the playback position and rate in the query or form `params`."""
+    try:
+        position = max(int(params.get('position', ['0'])[0]), 0)
+        rate = float(params.get('rate', ['1'])[0])
+    except ValueError:
+        raise InvalidPosition()
+    if not 0 <= rate <= 16:
+        raise InvalidPosition()
+    return position, rate
+
+
+def format_message(timestamp, line, emotes) -> str:
+    """Return the chat line as an event message of a JSON
+    `[timestamp, team, user, tokens]` list.
+    """
+    tokens = chat.message_tokens_json(line.message, emotes)
+    return f'data: [{timestamp},{json.dumps(line.team)},{json.dumps(line.user)},{tokens}]\n\n'
+
+
+class PlaybackClock():
+    """Estimate of the viewer's playback position from the last reported one."""
+
+    def __init__(self, position, rate):
+        self.set(position, rate)
+
+    def set(self, position, rate):
+        self.reported_position = position
+        self.reported_time = time.monotonic()
+        self.rate = rate
+
+    def position(self) -> float:
+        elapsed = time.monotonic() - self.reported_time
+        return self.reported_position + elapsed * 1000 * self.rate
+
+    def delay(self, position) -> float:
+        """Return the seconds until playback reaches `position`, or None if
+        playback is paused.
+        """
+        if self.rate == 0:
+            return None
+        return max((position - self.position()) / 1000 / self.rate, 0)
+
+
+class ChatStream():
+    """Chat lines of a video read incrementally from a playback position."""
+
+    def __init__(self, path, offset, emotes, end, position, rate):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.offset = offset
+        self.emotes = emotes
+        self.end = end
+        self.clock = PlaybackClock(position, rate)
+        self.wakeup = None
+        self.sought = True
+        self.file_offset = 0
+        self.start = 0
+        self.read_until = None
+        self.exhausted = False
+        self.buffer = deque()
+
+    def update(self, position, rate):
+        """Apply a position update reported by the viewer."""
+        current = self.clock.position()
+        if position < current - 1000 or position > current + SEEK_THRESHOLD:
+            self.sought = True
+        self.clock.set(position, rate)
+        if self.wakeup is not None:
+            _wake(self.wakeup)
+
+    def _seek(self, position):
+        start = max(position - BACKLOG, 0)
+        self.file_offset = chat.seek_offset(self.path, self.offset + start)
+        self.start = self.offset + start
+        self.read_until = start - 1
+        self.exhausted = False
+        self.buffer.clear()
+
+    def _read(self, until):
+        lines, self.file_offset, exhausted = chat.read_chunk(
+            self.path, self.file_offset, self.start, self.offset + until, READ_LIMIT,
+        )
+        for line in lines:
+            timestamp = line.timestamp - self.offset
+            if self.end is not None and timestamp >= self.end:
+                exhausted = True
+                break
+            # Messages are formatted here rather than in the event loop.
+            self.buffer.append((timestamp, format_message(timestamp, line, self.emotes)))
+        if lines and not exhausted:
+            # A full chunk may stop before `until`.
+            until = min(until, lines[-1].timestamp - self.offset)
+        # Only the first chunk after a seek can have lines from before it.
+        self.start = 0
+        self.read_until = until
+        self.exhausted = exhausted
+
+    async def run(self, send):
+        """Send the chat lines as playback reaches them until the chat ends."""
+        loop = asyncio.get_running_loop()
+        await send_event(send, str(self.id), event='stream')
+        last_sent = time.monotonic()
+        while True:
+            if self.sought:
+                self.sought = False
+                await loop.run_in_executor(None, self._seek, self.clock.position())
+                await send_event(send, '', event='reset')
+            position = self.clock.position()
+            if not self.exhausted and self.read_until < position + READ_AHEAD / 2:
+                await loop.run_in_executor(None, self._read, position + READ_AHEAD)
+
+            messages = []
+            while self.buffer and self.buffer[0][0] <= position + BATCH_WINDOW * self.clock.rate:
+                messages.append(self.buffer.popleft()[1])
+            if messages:
+                await send_body(send, ''.join(messages).encode('utf-8'))
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+                await send_body(send, b': keepalive\n\n')
+                last_sent = time.monotonic()
+            if self.exhausted and not self.buffer:
+                await send_event(send, '', event='end')
+                return
+
+            delays = [KEEPALIVE_INTERVAL]
+            if self.buffer:
+                delays.append(self.clock.delay(self.buffer[0][0]))
+            if not self.exhausted:
+                delays.append(self.clock.delay(self.read_until - READ_AHEAD / 2))
+            delay = min(delay for delay in delays if delay is not None)
+            # Wait for the delay or a position update, whichever comes first.
+            self.wakeup = loop.create_future()
+            timer = loop.call_later(delay, _wake, self.wakeup)
+            try:
+                await self.wakeup
+            finally:
+                timer.cancel()
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+async def send_body(send, body: bytes):
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def send_event(send, data: str, event=None):
+    message = f'event: {event}\n' if event else ''
+    await send_body(send, f'{message}data: {data}\n\n'.encode('utf-8'))
+
+
+async def respond(send, status: int, body=b''):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_body(receive) -> bytes:
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return body
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def get_chat_source(slug, date, order):
+    """Return the chat source and duration in milliseconds of a video, or None
+    if the video has no chat.
+    """
+    try:
+        date = datetime.date.fromisoformat(date)
+    except ValueError:
+        return None
+    signals.request_started.send(sender=ChatStreamRouter)
+    try:
+        video = models.Video.objects.select_related('tournament__league', 'chat')\
+                                    .filter(tournament__slug=slug, date=date, order=order)\
+                                    .first()
+        if video is None or not video.has_chat:
+            return None
+        path, offset, emotes = video.chat_source()
+        # Build a missing index before concurrent readers need it.
+        chat.load_index(path)
+        return (path, offset, emotes), video.duration * 1000 if video.duration else None
+    finally:
+        signals.request_finished.send(sender=ChatStreamRouter)
+
+
+async def get_shared_chat_source(slug, date, order):
+    """Return `get_chat_source` for the video, sharing the result with other
+    viewers of the video for `SOURCE_CACHE_TIMEOUT` seconds.
+    """
+    loop = asyncio.get_running_loop()
+    key = (slug, date, order)
+    cached = _sources.get(key)
+    if cached is not None and cached[0] > loop.time():
+        return cached[1]
+    pending = _pending_sources.get(key)
+    if pending is None or pending.get_loop() is not loop:
+        pending = asyncio.ensure_future(sync_to_async(get_chat_source)(slug, date, order))
+        _pending_sources[key] = pending
+        try:
+            source = await pending
+        finally:
+            del _pending_sources[key]
+        for expired in [key for key, (expires, _) in _sources.items() if expires <= loop.time()]:
+            del _sources[expired]
+        _sources[key] = (loop.time() + SOURCE_CACHE_TIMEOUT, source)
+        return source
+    return await asyncio.shield(pending)
+
+
+async def stream_chat(scope, receive, send, slug, date, order):
+    if scope['method'] not in ('GET', 'HEAD'):
+        return await respond(send, 405)
+    try:
+        position, rate = parse_position(parse_qs(scope['query_string'].decode('latin-1')))
+    except InvalidPosition:
+        return await respond(send, 400, b'Invalid position')
+    found = await get_shared_chat_source(slug, date, int(order))
+    if found is None:
+        return await respond(send, 404, b'Video has no chat')
+    (path, offset, emotes), end = found
+
+    stream = ChatStream(path, offset, emotes, end, position, rate)
+    _streams[stream.id] = stream
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': _HEADERS})
+        if scope['method'] == 'HEAD':
+            return await send({'type': 'http.response.body', 'body': b''})
+        streaming = asyncio.ensure_future(stream.run(send))
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        done, pending = await asyncio.wait([streaming, disconnected],
+                                           return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        if streaming in done:
+            streaming.result()
+            await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        # The viewer went away while the stream was being written.
+        pass
+    finally:
+        del _streams[stream.id]
+
+
+async def update_position(scope, receive, send, stream, **kwargs):
+    if scope['method'] != 'POST':
+        return await respond(send, 405)
+    body = await read_body(receive)
+    if stream not in _streams:
+        return await respond(send, 404, b'No such stream')
+    try:
+        position, rate = parse_position(parse_qs(body.decode('latin-1')))
+    except InvalidPosition:
+        return await respond(send, 400, b'Invalid position')
+    _streams[stream].update(position, rate)
+    await respond(send, 204)
+
+
+class ChatStreamRouter():
+    """ASGI application serving chat streams itself and everything else with
+    `application`.
+    """
+
+    handlers = {
+        'video_chat_stream': stream_chat,
+        'video_chat_stream_position': update_position,
+    }
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            try:
+                match = resolve(scope['path'])
+            except Resolver404:
+                match = None
+            if match is not None and match.url_name in self.handlers:
+                return await self.handlers[match.url_name](scope, receive, send,
+                                                           **match.kwargs)
+        return await self.application(scope, receive, send)
@@ -1,9 +1,36 @@
 from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from unittest import mock, skipUnless
 
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, transaction
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from jinja2 import DictLoader
+from PIL import Image
 
-from daiseihai.archive import constants, factories, models
+from daiseihai import compression
+from daiseihai.jinja2 import environment
+from daiseihai.storage import ContentAddressedStorage
+
+from daiseihai.archive import (benchmark, chat, constants, factories, images, load_test,
+                               logos, metadata, models, probe, search, signals, stats,
+                               stream, versions)
 
 
 class TournamentTestCase(TestCase):
@@ -35,14 +62,32 @@ class TournamentTestCase(TestCase):
         self.assertContains(response, 'July 27, 2018')
         self.assertContains(response, 'July 28, 2018')
         self.assertNotContains(response, 'July 29, 2018')
+        self.assertContains(response, '<h3>2 videos</h3>', html=True)
+
+    def test_team_detail_repeated(self):
+        """Test that a video is listed once on a team page even if the team
+        plays several games in it on both sides.
+        """
+        team1 = factories.TeamFactory()
+        team2 = factories.TeamFactory()
+        video = factories.VideoFactory(date=date(2018, 7, 27))
+        factories.MatchupFactory(video=video, home=team1, away=team2)
+        factories.MatchupFactory(video=video, home=team2, away=team1)
+        factories.MatchupFactory(video=video, home=team1, away=team2)
+
+        self.assertEqual(list(team1.videos), [video])
+        response = self.client.get('/team/%s/' % team1.slug)
+        self.assertContains(response, 'July 27, 2018', 1)
 
     def test_team_list(self):
         """Test that only teams with videos are visible in the team listing."""
         team1 = factories.TeamFactory(name='/a/', slug='a')
         team2 = factories.TeamFactory(name='/u/', slug='u')
         team3 = factories.TeamFactory(name='/gd/', slug='gd')
+        team4 = factories.TeamFactory(name='/vg/', slug='vg')
         factories.MatchupFactory(home=team1)
         factories.MatchupFactory(away=team2)
+        factories.MatchupFactory(home=team4, video__is_visible=False)
 
         response = self.client.get('/teams/')
         self.assertEqual(response.status_code, 200)
@@ -50,6 +95,7 @@ class TournamentTestCase(TestCase):
         self.assertContains(response, team1.name)
         self.assertContains(response, team2.name)
         self.assertNotContains(response, team3.name)
+        self.assertNotContains(response, team4.name)
 
     def test_tournament_detail(self):
         """Test that tournament detail pages load and contain properly formatted dates."""
@@ -92,6 +138,40 @@ class TournamentTestCase(TestCase):
         self.assertContains(response, '/drg/ – /feg/')
         self.assertContains(response, 'implyingrigged', 4)
 
+    @mock.patch.object(constants, 'MATCHDAY_LAYOUT_MIN_VIDEOS', 3)
+    def test_tournament_detail_matchdays(self):
+        """Test that large tournament pages render the first matchday and link
+        the rest to their matchday fragments.
+        """
+        tournament = factories.TournamentFactory()
+        factories.VideoFactory(tournament=tournament, date=date(2018, 7, 27), order=1)
+        factories.VideoFactory(tournament=tournament, date=date(2018, 7, 28), order=1)
+        factories.VideoFactory(tournament=tournament, date=date(2018, 7, 28), order=2)
+        factories.VideoFactory(tournament=tournament, date=date(2018, 7, 29),
+                               order=1, is_visible=False)
+
+        response = self.client.get('/%s/' % tournament.slug)
+        self.assertContains(response, 'href="#day-2"')
+        self.assertNotContains(response, 'href="#day-3"')
+        self.assertContains(response, 'id="day-2"')
+        self.assertContains(response, 'July 27, 2018', html=True)
+        self.assertNotContains(response, 'July 28, 2018 (1/2)', html=True)
+        fragment_url = reverse('tournament_matchday',
+                               kwargs={'slug': tournament.slug, 'date': '2018-07-28'})
+        self.assertContains(response, f'data-src="{fragment_url}"')
+
+        response = self.client.get(fragment_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertContains(response, 'July 28, 2018 (1/2)', html=True)
+        self.assertContains(response, 'July 28, 2018 (2/2)', html=True)
+        self.assertNotContains(response, 'July 27, 2018', html=True)
+
+        response = self.client.get(f'/{tournament.slug}/2018-07-29/')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f'/{tournament.slug}/2018-13-45/')
+        self.assertEqual(response.status_code, 404)
+
     def test_tournament_list(self):
         """Test that only tournaments with visible videos are shown in the listing."""
         tournament1 = factories.TournamentFactory()
@@ -113,6 +193,430 @@ class TournamentTestCase(TestCase):
         self.assertNotContains(response, tournament4.name)
 
 
+class VideoCardCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.team = factories.TeamFactory(name='/alpha/', slug='a')
+        self.tournament = factories.TournamentFactory(slug='cup')
+        video = factories.VideoFactory(tournament=self.tournament)
+        factories.MatchupFactory(video=video, home=self.team)
+
+    def test_cached(self):
+        self.assertContains(self.client.get('/cup/'), '/alpha/')
+        models.Team.objects.filter(pk=self.team.pk).update(name='/beta/')
+        self.assertContains(self.client.get('/cup/'), '/alpha/')
+
+    def test_invalidation(self):
+        self.assertContains(self.client.get('/cup/'), '/alpha/')
+        self.team.name = '/beta/'
+        self.team.save()
+        response = self.client.get('/cup/')
+        self.assertContains(response, '/beta/')
+        self.assertNotContains(response, '/alpha/')
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            caches = {'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': cache_dir,
+            }}
+            with self.settings(CACHES=caches):
+                self.assertContains(self.client.get('/cup/'), '/alpha/')
+                factories.MatchupFactory(video=self.tournament.videos.get(),
+                                         home=factories.TeamFactory(name='/c/'))
+                self.assertContains(self.client.get('/cup/'), '/c/')
+
+
+class PageCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.team = factories.TeamFactory(name='/alpha/', slug='a')
+        self.tournament = factories.TournamentFactory(name='Cup', slug='cup')
+        video = factories.VideoFactory(tournament=self.tournament)
+        factories.MatchupFactory(video=video, home=self.team)
+
+    def test_conditional_get(self):
+        for url in ('/', '/teams/', '/cup/', '/team/a/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_cached(self):
+        self.client.get('/team/a/')
+        models.Tournament.objects.filter(pk=self.tournament.pk).update(name='Other Cup')
+        # Only the team is looked up.
+        with self.assertNumQueries(1):
+            response = self.client.get('/team/a/')
+        self.assertContains(response, 'Cup')
+        self.assertNotContains(response, 'Other Cup')
+
+    def test_last_modified(self):
+        response = self.client.get('/cup/')
+        response = self.client.get('/cup/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_query_string(self):
+        """Test that query parameters the page does not read share its cache entry."""
+        self.client.get('/cup/')
+        models.Tournament.objects.filter(pk=self.tournament.pk).update(name='Other Cup')
+        for url in ('/cup/?x=1', '/cup/?x=2'):
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'Other Cup')
+
+    def test_renamed(self):
+        etag = self.client.get('/team/a/')['ETag']
+        self.team.slug = 'b'
+        self.team.save()
+        self.assertEqual(self.client.get('/team/a/', HTTP_IF_NONE_MATCH=etag).status_code, 404)
+        self.assertEqual(self.client.get('/team/b/').status_code, 200)
+
+    def test_missing(self):
+        for url in ('/team/missing/', '/missing/', '/api/v1/teams/missing/',
+                    '/api/v1/tournaments/missing/', '/api/v1/videos/0/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(cache.get_many([
+            'archive:version:team:missing', 'archive:version:tournament:missing',
+            'archive:version:video:0',
+        ]), {})
+
+    def test_invalidation(self):
+        etags = {url: self.client.get(url)['ETag'] for url in ('/', '/cup/', '/team/a/')}
+        self.tournament.name = 'Other Cup'
+        self.tournament.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, 'Other Cup')
+
+    def test_unrelated_change(self):
+        etag = self.client.get('/cup/')['ETag']
+        factories.VideoFactory()
+        response = self.client.get('/cup/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_version_cache(self):
+        caches = {
+            alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': alias}
+            for alias in ('default', 'versions')
+        }
+        with self.settings(CACHES=caches, VERSION_CACHE='versions'):
+            etag = self.client.get('/cup/')['ETag']
+            cache.clear()
+            response = self.client.get('/cup/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_moved_matchup(self):
+        etag = self.client.get('/team/a/')['ETag']
+        matchup = models.Matchup.objects.get()
+        matchup.home = factories.TeamFactory()
+        matchup.save()
+        response = self.client.get('/team/a/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.target = tempfile.TemporaryDirectory()
+        team = factories.TeamFactory(name='/alpha/', slug='a')
+        self.tournament = factories.TournamentFactory(name='Cup', slug='cup')
+        self.video1 = factories.VideoFactory(tournament=self.tournament,
+                                             date=date(2020, 1, 1), order=1)
+        self.video2 = factories.VideoFactory(tournament=self.tournament,
+                                             date=date(2020, 1, 2), order=2)
+        factories.MatchupFactory(video=self.video1, home=team)
+
+    def tearDown(self):
+        self.target.cleanup()
+
+    def export(self, **kwargs):
+        stdout = io.StringIO()
+        call_command('export_site', self.target.name, processes=1, host='testserver',
+                     stdout=stdout, **kwargs)
+        return stdout.getvalue()
+
+    def read(self, path):
+        with open(os.path.join(self.target.name, path, 'index.html')) as f:
+            return f.read()
+
+    def test_export(self):
+        self.export()
+        self.assertIn('Cup', self.read(''))
+        self.assertIn('/alpha/', self.read('teams'))
+        self.assertIn('/alpha/', self.read('cup'))
+        self.assertIn('Cup', self.read('team/a'))
+        self.assertIn('<video', self.read('video/cup/2020-01-01'))
+        self.assertIn('<video', self.read('video/cup/2020-01-01/1'))
+        self.assertIn('<video', self.read('video/cup/2020-01-02/2'))
+        self.assertIn('url=/video/cup/2020-01-01/"', self.read(f'video/{self.video1.pk}'))
+        self.assertIn('url=/video/cup/2020-01-02/2/"', self.read(f'video/{self.video2.pk}'))
+
+    def test_incremental(self):
+        self.assertIn('Rendered 8 page(s), removed 0.', self.export())
+        self.assertIn('Rendered 0 page(s), removed 0.', self.export())
+
+        self.video2.delete()
+        self.assertIn('Rendered 3 page(s), removed 2.', self.export())
+        self.assertFalse(os.path.exists(
+            os.path.join(self.target.name, 'video/cup/2020-01-02/2/index.html')
+        ))
+        self.assertIn('Rendered 7 page(s), removed 0.', self.export(full=True))
+
+    def test_hidden_video(self):
+        self.video2.is_visible = False
+        self.video2.save()
+        self.export()
+        self.assertFalse(os.path.exists(os.path.join(self.target.name, 'video/cup/2020-01-02')))
+        self.assertFalse(os.path.exists(os.path.join(self.target.name, f'video/{self.video2.pk}')))
+
+
+class QueryBudgetTestCase(TestCase):
+    def test_budgets(self):
+        """Test that no view makes more queries than its budget and that the
+        number of queries does not grow with the size of the archive.
+        """
+        queries = []
+        for size in (1, 4):
+            with transaction.atomic():
+                benchmark.populate(tournaments=5 * size, videos_per_tournament=4 * size,
+                                   teams=8 * size)
+                measurements = benchmark.measure()
+                transaction.set_rollback(True)
+            queries.append({measurement.name: measurement.queries for measurement in measurements})
+            for measurement in measurements:
+                with self.subTest(view=measurement.name, size=size):
+                    self.assertLessEqual(measurement.queries, measurement.budget.queries)
+        self.assertEqual(queries[0], queries[1])
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'versions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }, VERSION_CACHE='versions')
+    def test_production_caches(self):
+        """Test that the benchmark runs with version stamps in their own cache."""
+        benchmark.populate(tournaments=2, videos_per_tournament=4, teams=4)
+        measurements = benchmark.measure()
+        self.assertEqual([measurement.name for measurement in measurements],
+                         list(benchmark.VIEW_BUDGETS))
+
+    def test_explain(self):
+        benchmark.populate(tournaments=2, videos_per_tournament=4, teams=4)
+        plans = benchmark.explain(repeat=1)
+        self.assertEqual([plan.name for plan in plans], list(benchmark.VIEW_BUDGETS))
+        self.assertTrue(all(plan.plan for plan in plans))
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tournament = factories.TournamentFactory(slug='cup')
+        self.team1 = factories.TeamFactory(name='/a/', slug='a')
+        self.team2 = factories.TeamFactory(name='/u/', slug='u')
+        self.videos = []
+        for day, order in ((6, 1), (6, 2), (7, 1), (8, 1), (8, 2)):
+            video = factories.VideoFactory(tournament=self.tournament, order=order,
+                                           date=date(2019, 12, day))
+            factories.MatchupFactory(video=video, home=self.team1, away=self.team2)
+            self.videos.append(video)
+        factories.VideoFactory(tournament=self.tournament, is_visible=False)
+
+    def _pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.append([video['id'] for video in data['videos']])
+            url = data['next'] and f'{url.split("&cursor=")[0]}&cursor={data["next"]}'
+        return ids
+
+    def test_videos(self):
+        pks = [video.pk for video in self.videos]
+        self.assertEqual(self._pages('/api/v1/videos/?limit=2'),
+                         [pks[0:2], pks[2:4], pks[4:]])
+        self.assertEqual(self._pages('/api/v1/videos/latest/?limit=3'),
+                         [pks[:1:-1], pks[1::-1]])
+        self.assertEqual(self._pages('/api/v1/videos/?team=u&limit=10'), [pks])
+        self.assertEqual(self.client.get('/api/v1/videos/?cursor=x').status_code, 400)
+
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/v1/videos/?tournament=cup&limit=1').json()
+        self.assertEqual(data['videos'][0], {
+            'id': pks[0],
+            'type': constants.VIDEO_TYPE_NORMAL,
+            'tournament': 'cup',
+            'date': '2019-12-06',
+            'order': 1,
+            'part': 1,
+            'part_count': 2,
+            'page': '/video/cup/2019-12-06/1/',
+            'link': self.videos[0].link,
+            'duration': None,
+            'chat': None,
+            'matchups': [{'home': 'a', 'away': 'u', 'spoiler': False}],
+        })
+
+    def test_video(self):
+        video = self.videos[0]
+        factories.VideoBookmarkFactory(video=video, name='Kickoff',
+                                       position=timedelta(minutes=1))
+        response = self.client.get(f'/api/v1/videos/{video.pk}/')
+        self.assertEqual(response.json()['video']['bookmarks'],
+                         [{'name': 'Kickoff', 'position': 60.0}])
+
+        response = self.client.get(f'/api/v1/videos/{video.pk}/',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        factories.VideoBookmarkFactory(video=video)
+        response = self.client.get(f'/api/v1/videos/{video.pk}/',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_tournaments_and_teams(self):
+        data = self.client.get('/api/v1/tournaments/').json()
+        self.assertEqual([row['slug'] for row in data['tournaments']], ['cup'])
+        self.assertEqual(data['tournaments'][0]['video_count'], 5)
+        self.assertEqual(self.client.get('/api/v1/tournaments/cup/').json()['tournament']['name'],
+                         self.tournament.name)
+        data = self.client.get('/api/v1/teams/').json()
+        self.assertEqual([row['slug'] for row in data['teams']], ['a', 'u'])
+        self.assertEqual(self.client.get('/api/v1/teams/a/').json()['team']['game_count'], 5)
+        self.assertEqual(self.client.get('/api/v1/teams/x/').status_code, 404)
+
+
+class ArchiveStatsTestCase(TestCase):
+    def test_counts(self):
+        team1 = factories.TeamFactory()
+        team2 = factories.TeamFactory()
+        tournament = factories.TournamentFactory()
+        video = factories.VideoFactory(tournament=tournament)
+        factories.MatchupFactory(video=video, home=team1, away=team2)
+        factories.MatchupFactory(video=video, home=team2, away=team1)
+        matchup = factories.MatchupFactory(home=team1)
+        factories.VideoFactory(tournament=tournament, is_visible=False)
+
+        self.assertEqual(
+            models.Tournament.objects.values_list('video_count', flat=True).get(pk=tournament.pk), 1
+        )
+        team1.refresh_from_db()
+        self.assertEqual((team1.game_count, team1.video_count), (3, 2))
+        team2.refresh_from_db()
+        self.assertEqual((team2.game_count, team2.video_count), (2, 1))
+
+        video.is_visible = False
+        video.save()
+        matchup.home = team2
+        matchup.save()
+        team1.refresh_from_db()
+        self.assertEqual((team1.game_count, team1.video_count), (2, 0))
+        team2.refresh_from_db()
+        self.assertEqual((team2.game_count, team2.video_count), (3, 1))
+        tournament.refresh_from_db()
+        self.assertEqual(tournament.video_count, 0)
+
+    def test_rebuild(self):
+        team = factories.TeamFactory()
+        matchup = factories.MatchupFactory(home=team)
+        models.Team.objects.update(game_count=0, video_count=0)
+        models.Tournament.objects.update(video_count=5)
+        call_command('rebuild_archive_stats')
+        team.refresh_from_db()
+        self.assertEqual((team.game_count, team.video_count), (1, 1))
+        self.assertEqual(
+            list(models.Tournament.objects.values_list('video_count', flat=True)), [1]
+        )
+
+    def test_video_parts(self):
+        tournament = factories.TournamentFactory()
+        day = date(2019, 12, 6)
+        first = factories.VideoFactory(tournament=tournament, date=day, order=1)
+        self.assertEqual((first.part, first.part_count), (1, 1))
+        second = factories.VideoFactory(tournament=tournament, date=day, order=3)
+        third = factories.VideoFactory(tournament=tournament, date=day, order=2)
+        parts = models.Video.objects.filter(tournament=tournament)\
+                                    .values_list('order', 'part', 'part_count')
+        self.assertEqual(list(parts.all()), [(1, 1, 3), (2, 2, 3), (3, 3, 3)])
+
+        third.is_visible = False
+        third.save()
+        self.assertEqual(list(parts.all()), [(1, 1, 2), (2, 1, 1), (3, 2, 2)])
+
+        second.date = date(2019, 12, 7)
+        second.save()
+        self.assertEqual(list(parts.all()), [(1, 1, 1), (2, 1, 1), (3, 1, 1)])
+
+        third.delete()
+        second.date = day
+        second.save()
+        models.Video.objects.update(part=5, part_count=5)
+        call_command('rebuild_archive_stats')
+        self.assertEqual(list(parts.all()), [(1, 1, 2), (3, 2, 2)])
+
+        response = self.client.get(f'/{tournament.slug}/')
+        self.assertContains(response, '(2/2)')
+
+    def test_new_video(self):
+        """Test that adding a video only recounts and invalidates its own
+        tournament.
+        """
+        factories.TournamentFactory(slug='empty')
+        tournament = factories.TournamentFactory(slug='cup')
+        with mock.patch.object(versions, 'bump_versions') as bump_versions:
+            factories.VideoFactory(tournament=tournament)
+        scopes = set(bump_versions.call_args[0])
+        self.assertIn('tournament:cup', scopes)
+        self.assertNotIn('tournament:empty', scopes)
+
+    def test_derived_fields(self):
+        video = factories.VideoFactory()
+        with mock.patch.object(versions, 'bump_versions') as bump_versions, \
+                self.assertNumQueries(1):
+            video.save(update_fields=['chat_slice', 'chat_slice_key'])
+        bump_versions.assert_not_called()
+        with mock.patch.object(stats, 'update_video_parts') as update_video_parts:
+            video.save(update_fields=['duration'])
+        update_video_parts.assert_not_called()
+
+    def test_legacy_redirect_queries(self):
+        tournament = factories.TournamentFactory(slug='tourney')
+        factories.VideoFactory(tournament=tournament, date=date(2019, 12, 6), order=1)
+        video = factories.VideoFactory(tournament=tournament, date=date(2019, 12, 6), order=2)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/video/{video.pk}/')
+        self.assertRedirects(response, '/video/tourney/2019-12-06/2/')
+
+    def test_list_queries(self):
+        factories.MatchupFactory()
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.client.get('/')
+        with self.assertNumQueries(1):
+            self.client.get('/teams/')
+
+
+class TemplateCacheTestCase(TestCase):
+    def test_bytecode_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with self.settings(JINJA2_BYTECODE_CACHE_DIR=cache_dir):
+                env = environment(loader=DictLoader({'a.html': '{{ 1 + 1 }}'}))
+            self.assertFalse(env.auto_reload)
+            self.assertEqual(env.get_template('a.html').render(), '2')
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    def test_no_bytecode_cache(self):
+        env = environment(loader=DictLoader({}))
+        self.assertIsNone(env.bytecode_cache)
+
+    def test_compile_templates(self):
+        stdout = io.StringIO()
+        call_command('compile_templates', stdout=stdout, stderr=io.StringIO())
+        self.assertIn('Compiled archive/videos.html', stdout.getvalue())
+
+
 class LegacyVideoURLRedirectTestCase(TestCase):
     def test_only(self):
         video = factories.VideoFactory(
@@ -152,6 +656,15 @@ class LegacyVideoURLRedirectTestCase(TestCase):
 
 
 class VideoTestCase(TestCase):
+    def test_same_day_in_tournaments(self):
+        """Test that different tournaments can have videos on the same day but
+        a tournament cannot have two videos with the same order on a day.
+        """
+        video = factories.VideoFactory(date=date(2019, 12, 6), order=1)
+        factories.VideoFactory(date=date(2019, 12, 6), order=1)
+        with self.assertRaises(IntegrityError):
+            factories.VideoFactory(tournament=video.tournament, date=date(2019, 12, 6), order=1)
+
     def test_video(self):
         factories.VideoFactory(
             tournament__slug="xxx", date=date(2018, 11, 21), order=2
@@ -196,7 +709,7 @@ class VideoTestCase(TestCase):
         self.assertContains(response, "chatContainer")
         self.assertContains(response, 'data-league="y-league"')
         self.assertContains(response, 'data-start="1574442201656"')
-        self.assertContains(response, f'data-src="/media/chats/{chat.pk}.txt"')
+        self.assertContains(response, 'data-src="/video/xyz/2019-11-22/1/chat/"')
         self.assertContains(response, 'data-metadata="/media/metadata/y-league.json"')
 
     def test_video_with_bookmarks(self):
@@ -243,10 +756,984 @@ class VideoTestCase(TestCase):
         self.assertContains(response, "chatContainer")
         self.assertContains(response, 'data-league="x-league"')
         self.assertContains(response, 'data-start="1574448973245"')
-        self.assertContains(response, f'data-src="/media/chats/{chat.pk}.txt"')
+        self.assertContains(response, 'data-src="/video/x/2000-01-31/15/chat/"')
         self.assertContains(response, 'data-metadata="/media/metadata/x-league.json"')
 
 
+TEXT = constants.CHAT_TOKEN_TEXT
+GREENTEXT = constants.CHAT_TOKEN_GREENTEXT
+EMOTE = constants.CHAT_TOKEN_EMOTE
+
+
+class VideoChatTestCase(TestCase):
+    def setUp(self):
+        lines = [
+            f'{1000 + i * 500}\tck\tuser{i}\tmessage {i}\n' for i in range(1000)
+        ]
+        chat = factories.ChatFactory(file__data=''.join(lines).encode('utf-8'))
+        self.video = factories.VideoFactory(
+            tournament__slug="chat", date=date(2019, 12, 6), order=1,
+            chat=chat, chat_start=2000,
+        )
+
+    def test_window(self):
+        response = self.client.get("/video/chat/2019-12-06/1/chat/?from=200000&to=201000")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "from": 200000,
+            "to": 201000,
+            "lines": [
+                [200000, "ck", "user402", [[TEXT, "message 402"]]],
+                [200500, "ck", "user403", [[TEXT, "message 403"]]],
+            ],
+        })
+
+    def test_window_start(self):
+        response = self.client.get("/video/chat/2019-12-06/1/chat/?from=0&to=1000")
+        self.assertEqual(
+            response.json()["lines"],
+            [[0, "ck", "user2", [[TEXT, "message 2"]]],
+             [500, "ck", "user3", [[TEXT, "message 3"]]]],
+        )
+
+    def test_window_duration(self):
+        self.video.duration = 10
+        self.video.save()
+        response = self.client.get("/video/chat/2019-12-06/1/chat/?from=9000")
+        self.assertEqual(response.json()["to"], 10000)
+        self.assertEqual(len(response.json()["lines"]), 2)
+
+    def test_invalid_window(self):
+        response = self.client.get("/video/chat/2019-12-06/1/chat/?from=abc")
+        self.assertEqual(response.status_code, 400)
+
+    def test_no_chat(self):
+        factories.VideoFactory(tournament__slug="none", date=date(2019, 12, 6), order=2)
+        response = self.client.get("/video/none/2019-12-06/2/chat/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_chat_slice(self):
+        self.video.duration = 2
+        self.video.save()
+        self.assertTrue(self.video.update_chat_slice())
+        self.assertFalse(self.video.update_chat_slice())
+        with self.video.chat_slice.open('rb') as chat_slice:
+            self.assertEqual(chat_slice.read().decode('utf-8'), (
+                '0\tck\tuser2\t[[1,"message 2"]]\n'
+                '500\tck\tuser3\t[[1,"message 3"]]\n'
+                '1000\tck\tuser4\t[[1,"message 4"]]\n'
+                '1500\tck\tuser5\t[[1,"message 5"]]\n'
+            ))
+
+        response = self.client.get("/video/chat/2019-12-06/1/chat/?from=1000")
+        self.assertEqual(
+            response.json()["lines"],
+            [[1000, "ck", "user4", [[TEXT, "message 4"]]],
+             [1500, "ck", "user5", [[TEXT, "message 5"]]]],
+        )
+
+    def test_chat_slice_invalidation(self):
+        self.video.update_chat_slice()
+        self.video.chat_start = 3000
+        self.assertFalse(self.video.has_chat_slice)
+        self.assertTrue(self.video.update_chat_slice())
+        with self.video.chat_slice.open('rb') as chat_slice:
+            self.assertTrue(chat_slice.readline().startswith(b'0\tck\tuser4\t'))
+
+        self.video.chat = None
+        self.assertTrue(self.video.update_chat_slice())
+        self.assertFalse(self.video.chat_slice)
+
+    def test_chat_slice_chat_replaced(self):
+        self.video.duration = 1
+        self.video.save()
+        self.video.update_chat_slice()
+        self.video.chat.file.save(self.video.chat.file.name, ContentFile(
+            b'2000\tck\tuser1\treplaced\n'
+        ))
+        self.video.refresh_from_db()
+        self.assertTrue(self.video.has_chat_slice)
+        response = self.client.get("/video/chat/2019-12-06/1/chat/")
+        self.assertEqual(response.json()["lines"], [[0, "ck", "user1", [[TEXT, "replaced"]]]])
+
+    def test_index_replaced(self):
+        """Test that a failed index build leaves the previous index in place."""
+        path = self.video.chat.file.path
+        chat.build_index(path)
+        with open(chat.index_path(path), 'rb') as f:
+            index = f.read()
+        with mock.patch.object(chat, 'iter_lines', side_effect=OSError), \
+                self.assertRaises(OSError):
+            chat.build_index(path)
+        with open(chat.index_path(path), 'rb') as f:
+            self.assertEqual(f.read(), index)
+        directory = os.path.dirname(path)
+        self.assertFalse([name for name in os.listdir(directory) if name.endswith('.tmp')])
+
+    def test_tokenize(self):
+        emotes = {'kek', 'ck'}
+        self.assertEqual(chat.tokenize('hello :kek: world', emotes),
+                         [[TEXT, 'hello '], [EMOTE, 'kek'], [TEXT, ' world']])
+        self.assertEqual(chat.tokenize(':kek::ck: :ck:', emotes),
+                         [[TEXT, ':kek::ck: '], [EMOTE, 'ck']])
+        self.assertEqual(chat.tokenize(':unknown: &lt;b&gt;', emotes),
+                         [[TEXT, ':unknown: <b>']])
+        self.assertEqual(chat.tokenize('&gt;implying :kek:', emotes),
+                         [[GREENTEXT, '>implying '], [EMOTE, 'kek']])
+        self.assertEqual(chat.tokenize('', emotes), [[TEXT, '']])
+
+    def test_emote_changes(self):
+        """Test that chat slices are tokenized again when the emotes of the
+        league change.
+        """
+        league = factories.LeagueFactory()
+        self.video.tournament.league = league
+        self.video.tournament.save()
+        self.video.duration = 1
+        self.video.save()
+        self.video.chat.file.save('chat.txt', ContentFile(
+            b'2000\tck\tuser1\t:kek:\n'
+            b'2500\tck\tuser2\t&gt;be me :kek:\n'
+        ))
+        self.video.update_chat_slice()
+
+        emote = factories.EmoteFactory(league=league, name='kek')
+        self.video.refresh_from_db()
+        self.assertTrue(self.video.has_chat_slice)
+        response = self.client.get("/video/chat/2019-12-06/1/chat/")
+        self.assertEqual(response.json()["lines"], [
+            [0, "ck", "user1", [[EMOTE, "kek"]]],
+            [500, "ck", "user2", [[GREENTEXT, ">be me "], [EMOTE, "kek"]]],
+        ])
+
+        emote.delete()
+        self.video.refresh_from_db()
+        self.assertTrue(self.video.has_chat_slice)
+        response = self.client.get("/video/chat/2019-12-06/1/chat/")
+        self.assertEqual(response.json()["lines"][0], [0, "ck", "user1", [[TEXT, ":kek:"]]])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ChatStreamTestCase(TestCase):
+    path = '/video/chat/2019-12-06/1/chat/stream/'
+
+    def setUp(self):
+        stream._sources.clear()
+        lines = [
+            f'{1000 + i * 500}\tck\tuser{i}\tmessage {i} :kek:\n' for i in range(1000)
+        ]
+        chat = factories.ChatFactory(file__data=''.join(lines).encode('utf-8'))
+        self.video = factories.VideoFactory(
+            tournament__slug="chat", date=date(2019, 12, 6), order=1,
+            chat=chat, chat_start=2000, duration=5,
+        )
+        factories.EmoteFactory(league=self.video.tournament.league, name='kek')
+        self.app = stream.ChatStreamRouter(None)
+
+    def request(self, method, path, query=b'', body=b''):
+        """Make a request that is not streamed and return its status and body."""
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'headers': [],
+                 'query_string': query}
+        with load_test.keep_connections():
+            async_to_sync(self.app)(scope, receive, send)
+        return messages[0]['status'], b''.join(message.get('body', b'')
+                                               for message in messages[1:])
+
+    def watch(self, viewer, seconds, seek=None):
+        async def main():
+            watching = asyncio.ensure_future(viewer.watch(seconds))
+            if seek is not None:
+                await asyncio.sleep(seconds / 2)
+                self.assertEqual(await viewer.seek(*seek), 204)
+            await watching
+
+        with load_test.keep_connections():
+            async_to_sync(main)()
+
+    def test_stream(self):
+        viewer = load_test.StreamViewer(self.app, self.path, rate=16)
+        self.watch(viewer, 2)
+        self.assertEqual(viewer.status, 200)
+        self.assertEqual(viewer.events[:2], ['stream', 'reset'])
+        self.assertEqual(viewer.events[-1], 'end')
+        self.assertEqual(viewer.lines[0], '[0,"ck","user2",[[1,"message 2 "],[3,"kek"]]]')
+        self.assertEqual(len(viewer.lines), 10)
+
+    def test_seek(self):
+        self.video.duration = None
+        self.video.save()
+        viewer = load_test.StreamViewer(self.app, self.path, position=1000, rate=0)
+        self.watch(viewer, 0.4, seek=(100000, 0))
+        self.assertEqual(viewer.events.count('reset'), 2)
+        timestamps = [json.loads(line)[0] for line in viewer.lines]
+        self.assertEqual(timestamps[:3], [0, 500, 1000])
+        self.assertEqual(timestamps[3], 100000 - stream.BACKLOG)
+        self.assertEqual(timestamps[-1], 100000)
+        self.assertNotIn('end', viewer.events)
+
+    def test_position(self):
+        status, _ = self.request('POST', f'{self.path}{"0" * 32}/', body=b'position=0')
+        self.assertEqual(status, 404)
+        self.assertEqual(self.request('GET', f'{self.path}{"0" * 32}/')[0], 405)
+        self.assertEqual(self.request('GET', self.path, b'position=abc')[0], 400)
+        self.assertEqual(self.request('GET', self.path, b'rate=-1')[0], 400)
+
+        stream_id = 'a' * 32
+        stream._streams[stream_id] = stream.ChatStream('', 0, None, None, 0, 1)
+        try:
+            path = f'{self.path}{stream_id}/'
+            self.assertEqual(self.request('POST', path, body=b'position=abc')[0], 400)
+            self.assertEqual(self.request('POST', path, body=b'position=60000&rate=0')[0], 204)
+            self.assertEqual(stream._streams[stream_id].clock.position(), 60000)
+            self.assertTrue(stream._streams[stream_id].sought)
+        finally:
+            del stream._streams[stream_id]
+
+    def test_no_chat(self):
+        factories.VideoFactory(tournament__slug="none", date=date(2019, 12, 6), order=2)
+        status, body = self.request('GET', '/video/none/2019-12-06/2/chat/stream/')
+        self.assertEqual((status, body), (404, b'Video has no chat'))
+        self.assertEqual(self.request('GET', '/video/chat/2019-13-06/1/chat/stream/')[0], 404)
+
+    def test_wsgi(self):
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 404)
+
+    def test_load(self):
+        video = load_test.create_video(duration=120)
+        result = load_test.run(video, viewers=20, seconds=1, ramp_up=0.2)
+        self.assertEqual(result.failed, 0)
+        self.assertEqual(result.seeks, 5)
+        self.assertGreater(result.lines, 0)
+
+
+class ChatIngestTestCase(TestCase):
+    def test_ingest(self):
+        source = io.BytesIO(
+            b'3000\tck\tuser1\tthird\n'
+            b'1000\ta\tuser2\tfirst\n'
+            b'\n'
+            b'2000\tNULL\tBlinkyy\tblocked\n'
+            b'2000\ta\tuser3\t&gt;second\r\n'
+        )
+        content, stats = chat.ingest(source, blocked_users=('Blinkyy', ))
+        with content:
+            data = content.read()
+        self.assertEqual(data, (
+            b'1000\ta\tuser2\tfirst\n'
+            b'2000\ta\tuser3\t&gt;second\n'
+            b'3000\tck\tuser1\tthird\n'
+        ))
+        self.assertEqual(stats, chat.ChatStats(3, 1000, 3000, len(data)))
+
+    def test_ingest_chunks(self):
+        """Test that Django files are read in chunks that split lines."""
+        data = b'1000\ta\tuser1\tfirst\n2000\ta\tuser2\tcarriage\rreturn\n3000\ta\tuser3\tlast'
+        upload = File(io.BytesIO(data))
+        upload.DEFAULT_CHUNK_SIZE = 7
+        content, stats = chat.ingest(upload)
+        with content:
+            self.assertEqual(content.read(), data + b'\n')
+        self.assertEqual(stats, chat.ChatStats(3, 1000, 3000, len(data) + 1))
+
+    def test_ingest_invalid(self):
+        for source in (b'1000\tck\tuser1\n', b'abc\tck\tuser1\tmessage\n', b'\xff\n'):
+            with self.subTest(source=source), self.assertRaises(chat.ChatFormatError):
+                chat.ingest(io.BytesIO(b'1000\ta\tuser\tfine\n' + source))
+
+    def test_overlaps(self):
+        chat_object = models.Chat(line_count=2, first_timestamp=1000, last_timestamp=2000)
+        self.assertTrue(chat_object.overlaps(0, 1001))
+        self.assertTrue(chat_object.overlaps(2000))
+        self.assertFalse(chat_object.overlaps(0, 1000))
+        self.assertFalse(chat_object.overlaps(2001, 3000))
+        self.assertTrue(models.Chat().overlaps(2001, 3000))
+        self.assertFalse(models.Chat(line_count=0).overlaps(0))
+
+
+class ChatSyncTestCase(TestCase):
+    def setUp(self):
+        base = 1600000000000
+        timestamps = [base + i * 10000 for i in range(720)]
+        for burst in (600, 3600):
+            timestamps += [base + (burst + i // 5) * 1000 + i for i in range(150)]
+        lines = [f'{timestamp}\tck\tuser\tgoal\n' for timestamp in sorted(timestamps)]
+        chat = factories.ChatFactory(file__data=''.join(lines).encode('utf-8'))
+        self.video = factories.VideoFactory(chat=chat)
+        factories.VideoBookmarkFactory(video=self.video, position=timedelta(seconds=120))
+        factories.VideoBookmarkFactory(video=self.video, position=timedelta(seconds=3120))
+
+    def test_suggest_chat_start(self):
+        self.assertEqual(self.video.suggest_chat_start(), 1600000480000)
+
+    def test_suggest_chat_start_without_bookmarks(self):
+        self.video.bookmarks.all().delete()
+        self.assertIsNone(self.video.suggest_chat_start())
+
+    def test_density(self):
+        chat_object = factories.ChatFactory(file__data=(
+            b'5000\tck\tuser\tlate\n'
+            b'1000\tck\tuser\tfirst\n'
+            b'1999\tck\tuser\tsecond\n'
+            b'\n'
+            b'4000\tck\tuser\tthird\n'
+        ))
+        first, counts = chat.load_density(chat_object.file.path)
+        self.assertEqual((first, list(counts)), (1, [2, 0, 0, 1, 1]))
+
+    def test_density_stale(self):
+        path = self.video.chat.file.path
+        # Chats with the same content share a blob and its histogram.
+        if os.path.exists(chat.density_path(path)):
+            os.remove(chat.density_path(path))
+        self.assertTrue(chat.is_density_stale(path))
+        chat.build_density(path)
+        self.assertFalse(chat.is_density_stale(path))
+        stat = os.stat(path)
+        with open(chat.density_path(path), 'wb') as f:
+            # Header of an offset index, which is a prefix of the density header.
+            f.write(chat._INDEX_HEADER.pack(stat.st_size, stat.st_mtime_ns))
+        self.assertTrue(chat.is_density_stale(path))
+        self.assertEqual(self.video.suggest_chat_start(), 1600000480000)
+
+    def test_suggest_chat_start_action(self):
+        user = factories.UserFactory(is_superuser=True, is_staff=True)
+        self.client.force_login(user=user)
+        response = self.client.post(reverse('admin:archive_video_changelist'), {
+            'action': 'suggest_chat_start',
+            '_selected_action': [self.video.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.chat_start, 1600000480000)
+        self.assertTrue(self.video.has_chat_slice)
+
+
+class ChatAdminTestCase(TestCase):
+    def setUp(self):
+        self.user = factories.UserFactory(is_superuser=True, is_staff=True)
+        self.client.force_login(user=self.user)
+
+    @override_settings(CHAT_BLOCKED_USERS=('spammer', ))
+    def test_upload(self):
+        upload = SimpleUploadedFile('chat.txt', (
+            b'2000\tck\tuser1\tsecond\n'
+            b'1500\tck\tspammer\tspam\n'
+            b'1000\ta\tuser2\tfirst\n'
+        ))
+        response = self.client.post(reverse('admin:archive_chat_add'),
+                                    {'date': '2019-12-21', 'file': upload})
+        self.assertRedirects(response, reverse('admin:archive_chat_changelist'))
+
+        chat_object = models.Chat.objects.get()
+        self.assertEqual(chat_object.line_count, 2)
+        self.assertEqual(chat_object.first_timestamp, 1000)
+        self.assertEqual(chat_object.last_timestamp, 2000)
+        self.assertEqual(chat_object.size, 40)
+        with chat_object.file.open('rb') as chat_file:
+            self.assertEqual(chat_file.read(), b'1000\ta\tuser2\tfirst\n2000\tck\tuser1\tsecond\n')
+
+        response = self.client.get(reverse('admin:archive_chat_changelist'))
+        self.assertContains(response, '1970-01-01 00:00:01 – 1970-01-01 00:00:02')
+
+    def test_upload_invalid(self):
+        upload = SimpleUploadedFile('chat.txt', b'1000\ta\tuser2\n')
+        response = self.client.post(reverse('admin:archive_chat_add'),
+                                    {'date': '2019-12-21', 'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Line 1 is not a valid chat line')
+        self.assertFalse(models.Chat.objects.exists())
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        chat1 = factories.ChatFactory(file__data=(
+            b'1000\tck\tuser1\tWhat a GOAL\n'
+            b'2000\ta\tuser2\t&gt;goalkeeper\n'
+            b'3000\ta\tuser3\tgoal by /a/\n'
+            b'9000\ta\tuser4\tlate goal\n'
+        ))
+        chat2 = factories.ChatFactory(file__data=b'5000\tck\tuser5\tAnother goal\n')
+        self.video1 = factories.VideoFactory(
+            tournament__slug='cup', date=date(2020, 1, 1), order=1,
+            chat=chat1, chat_start=500, duration=5,
+        )
+        factories.VideoFactory(chat=chat2, chat_start=5000, is_visible=False)
+        call_command('build_search_index', stdout=io.StringIO())
+
+    def test_search(self):
+        results = search.search('goal')
+        self.assertEqual(
+            [(message.user, video) for message, video in results],
+            [('user4', None), ('user5', None), ('user3', self.video1), ('user1', self.video1)],
+        )
+        self.assertEqual([message.user for message, _ in search.search('goal BY')], ['user3'])
+        self.assertEqual([message.user for message, _ in search.search('goal', limit=2)],
+                         ['user4', 'user5'])
+        self.assertEqual(search.search('!!'), [])
+
+    def test_incremental(self):
+        self.assertFalse(models.Chat.objects.filter(search_indexed=False).exists())
+        self.assertEqual(models.ChatMessage.objects.count(), 5)
+        call_command('build_search_index', stdout=io.StringIO())
+        self.assertEqual(models.ChatMessage.objects.count(), 5)
+
+    def test_search_view(self):
+        response = self.client.get('/search/?q=goalkeeper')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '&gt;goalkeeper')
+        self.assertContains(response, 'href="/video/cup/2020-01-01/1/?t=1.500"')
+        self.assertNotContains(response, 'user1')
+
+    def test_search_view_tokens(self):
+        """Test that messages are escaped and emotes are rendered as images."""
+        emote = factories.EmoteFactory(league=factories.LeagueFactory(), name='kek')
+        self.video1.tournament.league = emote.league
+        self.video1.tournament.save()
+        chat_object = factories.ChatFactory(file__data=(
+            b'1000\tck\tuser6\t<script>alert(1)</script> :kek: script\n'
+        ))
+        factories.VideoFactory(tournament=self.video1.tournament, chat=chat_object,
+                               chat_start=0, date=date(2020, 1, 2))
+        call_command('build_search_index', stdout=io.StringIO())
+        response = self.client.get('/search/?q=script')
+        self.assertNotContains(response, '<script>')
+        self.assertContains(response, '&lt;script&gt;alert(1)&lt;/script&gt; ')
+        self.assertContains(response, f'<img class="emote" src="{emote.image.url}" alt=":kek:">')
+
+
+class ProbeTestCase(TestCase):
+    FFPROBE_OUTPUT = {
+        'streams': [
+            {'codec_type': 'audio', 'codec_name': 'aac'},
+            {'codec_type': 'video', 'codec_name': 'h264', 'width': 1280, 'height': 720},
+        ],
+        'format': {'duration': '5400.120000', 'bit_rate': '2500000'},
+    }
+
+    def setUp(self):
+        self.video_root = tempfile.mkdtemp()
+        with open(os.path.join(self.video_root, 'a.mp4'), 'wb') as f:
+            f.write(b'video')
+
+    def test_parse(self):
+        self.assertEqual(probe.parse(self.FFPROBE_OUTPUT),
+                         probe.MediaInfo(5401, 2500000, 1280, 720, 'h264', 'aac'))
+        self.assertEqual(probe.parse({'format': {'duration': 'N/A'}}),
+                         probe.MediaInfo(None, None, None, None, None, None))
+
+    @override_settings(FFPROBE_PATH='/nonexistent/ffprobe')
+    def test_missing_ffprobe(self):
+        with self.assertRaises(probe.ProbeError):
+            probe.probe(os.path.join(self.video_root, 'a.mp4'))
+
+    def test_probe_videos(self):
+        video = factories.VideoFactory(filename='a.mp4')
+        missing = factories.VideoFactory(filename='b.mp4')
+        factories.VideoFactory(filename=None, url='https://example.com/c.mp4')
+        info = probe.parse(self.FFPROBE_OUTPUT)
+        with override_settings(VIDEO_ROOT=self.video_root), \
+                mock.patch('daiseihai.archive.probe.probe', return_value=info) as probe_file:
+            results = list(probe.probe_videos(models.Video.objects.all()))
+            self.assertEqual(results[0], (missing, mock.ANY))
+            self.assertEqual(results[1], (video, None))
+            self.assertEqual(len(results), 2)
+            probe_file.assert_called_once_with(os.path.join(self.video_root, 'a.mp4'))
+
+            video.refresh_from_db()
+            self.assertEqual((video.duration, video.width, video.video_codec), (5401, 1280, 'h264'))
+            self.assertEqual(video.media_size, 5)
+
+            # Unchanged files are not probed again.
+            probe_file.reset_mock()
+            list(probe.probe_videos(models.Video.objects.filter(pk=video.pk)))
+            probe_file.assert_not_called()
+            list(probe.probe_videos(models.Video.objects.filter(pk=video.pk), force=True))
+            probe_file.assert_called_once()
+
+        response = self.client.get(f'/video/{video.tournament.slug}/{video.date}/{video.order}/')
+        self.assertContains(response, '<meta property="og:video:width" content="1280" />')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RenditionTestCase(TestCase):
+    def _image(self, size, color='red', format='PNG'):
+        output = io.BytesIO()
+        Image.new('RGB', size, color).save(output, format)
+        return output.getvalue()
+
+    def test_render(self):
+        rendition = Image.open(io.BytesIO(images.render(self._image((1000, 500)), (256, 256))))
+        self.assertEqual((rendition.format, rendition.size), ('WEBP', (256, 128)))
+        with self.assertRaises(images.RenditionError):
+            images.render(b'not an image', (256, 256))
+
+    def test_logo_renditions(self):
+        tournament = factories.TournamentFactory(
+            logo__from_file=io.BytesIO(self._image((1000, 1000)))
+        )
+        factories.VideoFactory(tournament=tournament)
+        self.assertEqual(tournament.logo_thumbnail_url, tournament.logo.url)
+        results = list(images.build_renditions(models.Tournament.objects.all(), []))
+        self.assertEqual(results, [(tournament, None)])
+        tournament.refresh_from_db()
+        name = tournament.logo_thumbnail.name
+        self.assertRegex(name, rf'^renditions/tournament/{tournament.pk}-logo_thumbnail'
+                               r'\.[0-9a-f]{16}\.webp$')
+        self.assertEqual(Image.open(tournament.logo_thumbnail.path).size, (256, 256))
+        response = self.client.get('/')
+        self.assertContains(response, tournament.logo_thumbnail.url)
+
+        # Unchanged logos are skipped.
+        self.assertEqual(list(images.build_renditions(models.Tournament.objects.all(), [])), [])
+
+        tournament.logo.save('logo.png', ContentFile(self._image((1000, 1000), 'blue')))
+        list(images.build_renditions(models.Tournament.objects.all(), []))
+        tournament.refresh_from_db()
+        self.assertNotEqual(tournament.logo_thumbnail.name, name)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, name)))
+
+    def test_poster_renditions(self):
+        video_root = tempfile.mkdtemp()
+        with open(os.path.join(video_root, 'a.mp4'), 'wb') as f:
+            f.write(b'video')
+        video = factories.VideoFactory(filename='a.mp4', duration=600, media_size=5,
+                                       media_mtime=1)
+        factories.VideoFactory(filename='b.mp4')
+        frame = self._image((1920, 1080))
+        with override_settings(VIDEO_ROOT=video_root), \
+                mock.patch('daiseihai.archive.images.extract_frame',
+                           return_value=frame) as extract_frame:
+            results = list(images.build_renditions([], models.Video.objects.all()))
+            extract_frame.assert_called_once_with(os.path.join(video_root, 'a.mp4'), 60.0)
+        self.assertEqual(results, [(video, None)])
+        video.refresh_from_db()
+        self.assertEqual(Image.open(video.poster.path).size, (1280, 720))
+        self.assertEqual(Image.open(video.thumbnail.path).size, (320, 180))
+        response = self.client.get(f'/video/{video.tournament.slug}/{video.date}/{video.order}/')
+        self.assertContains(response, f'poster="{video.poster.url}"')
+
+
+class _LogoHandler(BaseHTTPRequestHandler):
+    """Stand-in for the wiki serving one logo per team name."""
+
+    logos = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('If-None-Match')))
+        name = self.path.rsplit('/', 1)[-1]
+        if name not in self.logos:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.sha1(self.logos[name]).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(self.logos[name])
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class LeagueMetadataTestCase(TestCase):
+    def setUp(self):
+        self.league = factories.LeagueFactory(slug='4cc')
+        self.video = factories.VideoFactory(tournament__league=self.league,
+                                            chat=factories.ChatFactory(), chat_start=1000)
+        factories.MatchupFactory(video=self.video, home=factories.TeamFactory(slug='ck'),
+                                 away=factories.TeamFactory(slug='jp'))
+        factories.TeamFactory(slug='other')
+
+    def publish(self, **kwargs):
+        stdout = io.StringIO()
+        call_command('publish_league_metadata', stdout=stdout, **kwargs)
+        return stdout.getvalue()
+
+    def test_bundle(self):
+        bundle = json.loads(metadata.build_bundle(self.league))
+        self.assertEqual(bundle['league'], '4cc')
+        self.assertEqual(set(bundle['teams']), {'ck', 'jp', 'NULL'})
+        self.assertEqual(bundle['emotes'], {})
+        self.assertNotIn(b' ', metadata.build_bundle(self.league))
+
+    def test_publish(self):
+        self.assertTrue(self.league.metadata_url.endswith('/metadata/4cc.json'))
+        self.assertIn('Published 1 of 1 bundle(s).', self.publish())
+        self.assertIn('Published 0 of 1 bundle(s).', self.publish())
+
+        self.league.refresh_from_db()
+        with self.league.metadata.open('rb') as f:
+            content = f.read()
+        self.assertEqual(self.league.metadata_hash, hashlib.sha256(content).hexdigest())
+        self.assertIn(self.league.metadata_hash, self.league.metadata_url)
+        response = self.client.get(reverse('video_detail_order', kwargs={
+            'slug': self.video.tournament.slug, 'date': self.video.date.isoformat(),
+            'order': self.video.order,
+        }))
+        self.assertContains(response, f'data-metadata="{self.league.metadata_url}"')
+
+        # Adding an emote publishes a new bundle by itself.
+        previous_url = self.league.metadata_url
+        emote = factories.EmoteFactory(league=self.league, name='kek')
+        self.league.refresh_from_db()
+        self.assertNotEqual(self.league.metadata_url, previous_url)
+        with self.league.metadata.open('rb') as f:
+            self.assertEqual(json.load(f)['emotes'], {'kek': emote.image.url})
+        self.assertIn('Published 0 of 1 bundle(s).', self.publish())
+        self.assertIn('Published 1 of 1 bundle(s).', self.publish(force=True))
+
+    def test_league_changed(self):
+        """Test that renaming a league republishes only its own bundle."""
+        other = factories.LeagueFactory()
+        metadata.publish_bundle(other)
+        self.league.name = 'Renamed'
+        self.league.save()
+        self.assertFalse(self.league.metadata)
+
+        metadata.publish_bundle(self.league)
+        with mock.patch.object(metadata, 'publish_bundle',
+                               wraps=metadata.publish_bundle) as publish_bundle:
+            self.league.slug = '4cc-renamed'
+            self.league.save()
+        publish_bundle.assert_called_once()
+        self.assertEqual(publish_bundle.call_args[0][0].pk, self.league.pk)
+        self.league.refresh_from_db()
+        with self.league.metadata.open('rb') as f:
+            self.assertEqual(json.load(f)['league'], '4cc-renamed')
+
+    def test_admin_emotes(self):
+        """Test that saving several emotes in the admin updates the league's
+        chat once.
+        """
+        self.client.force_login(factories.UserFactory(is_superuser=True, is_staff=True))
+        data = {
+            'name': self.league.name, 'slug': self.league.slug,
+            'emotes-TOTAL_FORMS': 3, 'emotes-INITIAL_FORMS': 0,
+            'emotes-MIN_NUM_FORMS': 0, 'emotes-MAX_NUM_FORMS': 1000,
+            'team_icons-TOTAL_FORMS': 0, 'team_icons-INITIAL_FORMS': 0,
+            'team_icons-MIN_NUM_FORMS': 0, 'team_icons-MAX_NUM_FORMS': 1000,
+        }
+        for i, name in enumerate(('kek', 'lol', 'hmm')):
+            image = io.BytesIO()
+            Image.new('RGB', (16, 16)).save(image, 'PNG')
+            data[f'emotes-{i}-name'] = name
+            data[f'emotes-{i}-image'] = SimpleUploadedFile(f'{name}.png', image.getvalue())
+        with mock.patch.object(metadata, 'publish_bundle',
+                               wraps=metadata.publish_bundle) as publish_bundle, \
+                mock.patch.object(models.Video, 'update_chat_slice') as update_chat_slice:
+            response = self.client.post(
+                reverse('admin:archive_league_change', args=[self.league.pk]), data,
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.league.emotes.count(), 3)
+        publish_bundle.assert_called_once()
+        update_chat_slice.assert_called_once()
+        self.league.refresh_from_db()
+        self.assertEqual(self.league.emote_key, chat.emote_key({'kek', 'lol', 'hmm'}))
+
+    def test_import_legacy(self):
+        image = io.BytesIO()
+        Image.new('RGB', (16, 16)).save(image, 'PNG')
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'legacy'), exist_ok=True)
+        with open(os.path.join(settings.MEDIA_ROOT, 'legacy', 'kek.png'), 'wb') as f:
+            f.write(image.getvalue())
+        os.makedirs(os.path.dirname(metadata.legacy_path(self.league)), exist_ok=True)
+        with open(metadata.legacy_path(self.league), 'w') as f:
+            json.dump({'teams': {
+                'ck': '/media/legacy/kek.png',
+                'vg': '../legacy/kek.png',
+                'NULL': '/media/legacy/kek.png',
+                'bad code': '/media/legacy/kek.png',
+            }, 'emotes': {
+                'kek': '/media/legacy/kek.png',
+                'lol': '../legacy/kek.png',
+                'remote': 'https://example.com/remote.png',
+                'missing': '/media/legacy/missing.png',
+                'bad-name': '/media/legacy/kek.png',
+            }}, f)
+
+        class Fetcher():
+            def fetch(self, url, etag=None):
+                return logos.FetchResult(image.getvalue(), None)
+
+        with signals.league_chat_updates():
+            results = list(metadata.import_legacy(self.league, fetcher=Fetcher()))
+        self.assertEqual({(kind, name) for kind, name, error in results if error},
+                         {('emote', 'missing'), ('emote', 'bad-name'), ('team', 'bad code')})
+        self.assertEqual(self.league.emote_names, {'kek', 'lol', 'remote'})
+        icons = {icon.code: icon.image.url for icon in self.league.team_icons.all()}
+        self.assertEqual(set(icons), {'vg', 'NULL'})
+        self.league.refresh_from_db()
+        self.assertEqual(self.league.emote_key, chat.emote_key({'kek', 'lol', 'remote'}))
+        with self.league.metadata.open('rb') as f:
+            bundle = json.load(f)
+        self.assertEqual(set(bundle['emotes']), {'kek', 'lol', 'remote'})
+        self.assertEqual(set(bundle['teams']), {'ck', 'jp', 'vg', 'NULL'})
+        self.assertEqual(bundle['teams']['NULL'], icons['NULL'])
+        self.assertNotEqual(bundle['teams']['ck'], icons['NULL'])
+
+        stdout = io.StringIO()
+        call_command('import_league_metadata', '4cc', stdout=stdout, stderr=io.StringIO())
+        self.assertIn('3 image(s) failed', stdout.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TeamLogoTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = HTTPServer(('127.0.0.1', 0), _LogoHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _LogoHandler.logos = {}
+        _LogoHandler.requests = []
+        url = f'http://127.0.0.1:{self.server.server_port}/file/'
+        self.settings_override = override_settings(TEAM_LOGO_URL=url)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def _logo(self, color):
+        output = io.BytesIO()
+        Image.new('RGB', (400, 400), color).save(output, 'PNG')
+        return output.getvalue()
+
+    def test_mirror(self):
+        team = factories.TeamFactory(name='/a/')
+        missing = factories.TeamFactory(name='/u/')
+        _LogoHandler.logos['a_logo.png'] = self._logo('red')
+        self.assertTrue(team.logo_image.endswith('/file/a_logo.png'))
+
+        results = dict(logos.mirror_logos(models.Team.objects.all()))
+        self.assertIsNone(results[team])
+        self.assertIsInstance(results[missing], logos.FetchError)
+        team.refresh_from_db()
+        self.assertEqual(team.logo_image, team.logo.url)
+        self.assertRegex(team.logo.name, rf'^renditions/team/{team.pk}-logo\.[0-9a-f]{{16}}\.webp$')
+        self.assertEqual(Image.open(team.logo.path).size, (200, 200))
+        self.assertEqual(team.logo_hash, hashlib.sha1(_LogoHandler.logos['a_logo.png']).hexdigest())
+        self.assertEqual(team.logo_size, len(_LogoHandler.logos['a_logo.png']))
+        self.assertEqual(team.logo_etag, f'"{team.logo_hash}"')
+
+        # Recently checked logos are not requested again.
+        _LogoHandler.requests = []
+        list(logos.mirror_logos(models.Team.objects.filter(pk=team.pk)))
+        self.assertEqual(_LogoHandler.requests, [])
+
+        # Older logos are revalidated with their ETag.
+        name = team.logo.name
+        list(logos.mirror_logos(models.Team.objects.filter(pk=team.pk), max_age=timedelta(0)))
+        self.assertEqual(_LogoHandler.requests, [('/file/a_logo.png', team.logo_etag)])
+        team.refresh_from_db()
+        self.assertEqual(team.logo.name, name)
+
+        _LogoHandler.logos['a_logo.png'] = self._logo('blue')
+        list(logos.mirror_logos(models.Team.objects.filter(pk=team.pk), max_age=timedelta(0)))
+        team.refresh_from_db()
+        self.assertNotEqual(team.logo.name, name)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, name)))
+
+    def test_command(self):
+        team = factories.TeamFactory(name='/a/')
+        _LogoHandler.logos['a_logo.png'] = self._logo('red')
+        call_command('mirror_team_logos', stdout=io.StringIO())
+        team.refresh_from_db()
+        self.assertTrue(team.logo)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTestCase(TestCase):
+    def setUp(self):
+        self.storage = ContentAddressedStorage(location=tempfile.mkdtemp(), base_url='/media/')
+
+    def test_save(self):
+        self.storage.save('logos/a.png', ContentFile(b'logo'))
+        self.storage.save('logos/b.png', ContentFile(b'logo'))
+        digest = hashlib.sha256(b'logo').hexdigest()
+        self.assertEqual(self.storage.url('logos/a.png'), f'/media/blobs/{digest[:2]}/{digest}.png')
+        self.assertEqual(self.storage.path('logos/a.png'), self.storage.path('logos/b.png'))
+        with self.storage.open('logos/b.png') as f:
+            self.assertEqual(f.read(), b'logo')
+
+        self.assertEqual(self.storage.save('logos/a.png', ContentFile(b'new logo')), 'logos/a.png')
+        self.assertNotEqual(self.storage.url('logos/a.png'), self.storage.url('logos/b.png'))
+        with self.storage.open('logos/a.png') as f:
+            self.assertEqual(f.read(), b'new logo')
+
+    def test_manifest_shards(self):
+        names = [f'logos/{i}.png' for i in range(20)]
+        for name in names:
+            self.storage.save(name, ContentFile(b'logo'))
+        shards = os.listdir(os.path.join(self.storage.location, 'blobs', 'manifest'))
+        self.assertGreater(len([shard for shard in shards if shard.endswith('.json')]), 1)
+        self.assertEqual(set(self.storage.load_manifest()), set(names))
+        self.assertEqual(ContentAddressedStorage(location=self.storage.location).path(names[0]),
+                         self.storage.path(names[-1]))
+
+    def test_shared_blob(self):
+        """Test that saving a shared blob again does not touch it and that the
+        new name is kept by garbage collection.
+        """
+        self.storage.save('logos/a.png', ContentFile(b'logo'))
+        path = self.storage.path('logos/a.png')
+        os.utime(path, (0, 0))
+        self.storage.save('logos/b.png', ContentFile(b'logo'))
+        self.assertEqual(os.stat(path).st_mtime, 0)
+        self.assertEqual(self.storage.collect_garbage(['logos/a.png']), ([], []))
+        self.assertEqual(self.storage.path('logos/b.png'), path)
+
+    def test_concurrent_blob(self):
+        """Test that a blob stored by another save after the existence check
+        is used as is.
+        """
+        self.storage.save('logos/a.png', ContentFile(b'logo'))
+        path = self.storage.path('logos/a.png')
+        with mock.patch.object(FileSystemStorage, 'exists', return_value=False):
+            self.storage.save('logos/b.png', ContentFile(b'logo'))
+        self.assertEqual(self.storage.path('logos/b.png'), path)
+        self.assertEqual(os.listdir(os.path.dirname(path)), [os.path.basename(path)])
+
+    def test_collect_garbage(self):
+        self.storage.save('logos/a.png', ContentFile(b'logo'))
+        old_path = self.storage.path('logos/a.png')
+        with open(f'{old_path}.idx', 'wb'):
+            pass
+        self.storage.save('logos/a.png', ContentFile(b'new logo'))
+        self.storage.save('logos/b.png', ContentFile(b'other logo'))
+        self.storage.delete('logos/b.png')
+        self.assertFalse(self.storage.exists('logos/b.png'))
+
+        names, files = self.storage.collect_garbage(['logos/a.png'], dry_run=True)
+        self.assertEqual((names, files), ([], []))
+        names, files = self.storage.collect_garbage(['logos/a.png'], min_age=0)
+        self.assertEqual(len(files), 3)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertFalse(os.path.exists(f'{old_path}.idx'))
+        self.assertTrue(os.path.exists(self.storage.path('logos/a.png')))
+
+    def test_command(self):
+        tournament = factories.TournamentFactory()
+        tournament.logo.save('logo.png', ContentFile(b'new logo'))
+        with self.assertRaises(CommandError):
+            call_command('collect_media_garbage', '--min-age', '0', stdout=io.StringIO())
+        call_command('collect_media_garbage', '--adopt', '--min-age', '0', '--force',
+                     stdout=io.StringIO())
+        with tournament.logo.open('rb') as f:
+            self.assertEqual(f.read(), b'new logo')
+
+    def test_command_without_live_names(self):
+        tournament = factories.TournamentFactory()
+        tournament.logo.save('logo.png', ContentFile(b'logo'))
+        models.Tournament.objects.update(logo='')
+        with self.assertRaises(CommandError):
+            call_command('collect_media_garbage', stdout=io.StringIO())
+        self.assertTrue(tournament.logo.storage.exists(tournament.logo.name))
+
+    def test_adopt(self):
+        legacy = ContentAddressedStorage(location=self.storage.location)
+        FileSystemStorage(location=self.storage.location).save('logos/a.png', ContentFile(b'a'))
+        self.assertEqual(legacy.url('logos/a.png'), '/media/logos/a.png')
+        self.assertTrue(self.storage.adopt('logos/a.png'))
+        self.assertFalse(self.storage.adopt('logos/a.png'))
+        self.assertIn('/blobs/', self.storage.url('logos/a.png'))
+        with self.storage.open('logos/a.png') as f:
+            self.assertEqual(f.read(), b'a')
+        self.assertFalse(os.path.exists(os.path.join(self.storage.location, 'logos/a.png')))
+
+
+class CompressionTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'chat.txt')
+        with open(self.path, 'wb') as f:
+            f.write(b'1\tck\tuser\tmessage\n' * 100)
+        self.factory = RequestFactory()
+
+    def _get(self, accept_encoding):
+        request = self.factory.get('/media/chat.txt', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return compression.serve(request, 'chat.txt', document_root=self.root)
+
+    def test_compress_file(self):
+        self.assertTrue(compression.compress_file(self.path))
+        with gzip.open(f'{self.path}.gz') as f:
+            self.assertEqual(f.read(), b'1\tck\tuser\tmessage\n' * 100)
+        self.assertFalse(compression.compress_file(self.path))
+        with open(self.path, 'ab') as f:
+            f.write(b'2\tck\tuser\tmessage\n')
+        self.assertTrue(compression.compress_file(self.path))
+
+    def test_serve(self):
+        response = self._get('gzip, deflate')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        compression.compress_file(self.path)
+        response = self._get('gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)),
+                         b'1\tck\tuser\tmessage\n' * 100)
+        self.assertNotIn('Content-Encoding', self._get('gzip;q=0, identity'))
+        self.assertNotIn('Content-Encoding', self._get(''))
+
+        # Variants older than the file are not served.
+        os.utime(self.path, (0, 0))
+        os.utime(f'{self.path}.gz', (0, 0))
+        os.utime(f'{self.path}.br', (0, 0))
+        os.utime(self.path)
+        self.assertNotIn('Content-Encoding', self._get('gzip'))
+
+    @skipUnless(compression.brotli, 'brotli is not installed')
+    def test_serve_brotli(self):
+        compression.compress_file(self.path)
+        self.assertEqual(self._get('gzip, br')['Content-Encoding'], 'br')
+
+    def test_check_brotli(self):
+        with mock.patch.object(compression, 'brotli', None):
+            self.assertEqual([error.id for error in compression.check_brotli(None)],
+                             ['daiseihai.W001'])
+
+    def test_chat_saved(self):
+        chat_object = factories.ChatFactory()
+        self.assertTrue(os.path.exists(f'{chat_object.file.path}.gz'))
+        self.assertFalse(os.path.exists(f'{chat_object.file.path}.sha256'))
+        stdout = io.StringIO()
+        call_command('compress_media', '--processes', '1', stdout=stdout)
+        self.assertTrue(os.path.exists(f'{chat_object.file.path}.sha256'))
+        self.assertIn(f'Compressed {chat_object.file.path}', stdout.getvalue())
+        stdout = io.StringIO()
+        call_command('compress_media', '--processes', '1', stdout=stdout)
+        self.assertNotIn(f'Compressed {chat_object.file.path}', stdout.getvalue())
+
+    def test_video_saved(self):
+        video = factories.VideoFactory(chat=factories.ChatFactory(), chat_start=1)
+        with mock.patch.object(compression, 'compress_file') as compress_file:
+            video.save()
+            compress_file.assert_not_called()
+            video.update_chat_slice()
+            compress_file.assert_called_once_with(video.chat_slice.path, fast=True)
+
+
 class VideoAdminTestCase(TestCase):
     def setUp(self):
         self.user = factories.UserFactory(is_superuser=True, is_staff=True)
@@ -284,6 +1771,7 @@ class VideoAdminTestCase(TestCase):
         })
         video = self._create_video()
         self.assertEqual(video.chat_start, 1576861555677)
+        self.assertTrue(video.has_chat_slice)
 
     def test_chat_sync_help(self):
         self.data.update({
@@ -1,18 +1,44 @@
 from django.urls import path, re_path
 
-from daiseihai.archive import views
+from daiseihai.archive import api, views
 
 urlpatterns = [
+    path('api/v1/tournaments/',
+         api.TournamentListAPIView.as_view(), name='api_tournament_list'),
+    path('api/v1/tournaments/<slug>/',
+         api.TournamentAPIView.as_view(), name='api_tournament'),
+    path('api/v1/teams/',
+         api.TeamListAPIView.as_view(), name='api_team_list'),
+    path('api/v1/teams/<slug>/',
+         api.TeamAPIView.as_view(), name='api_team'),
+    path('api/v1/videos/',
+         api.VideoListAPIView.as_view(), name='api_video_list'),
+    path('api/v1/videos/latest/',
+         api.VideoListAPIView.as_view(latest=True), name='api_latest_videos'),
+    path('api/v1/videos/<int:pk>/',
+         api.VideoAPIView.as_view(), name='api_video'),
     path('',
          views.TournamentListView.as_view(), name='index'),
+    path('search/',
+         views.SearchView.as_view(), name='search'),
     path('team/<slug>/',
          views.TeamDetailView.as_view(), name='team_detail'),
     path('teams/',
          views.TeamListView.as_view(), name='team_list'),
     path('<slug>/',
          views.TournamentDetailView.as_view(), name='tournament'),
+    re_path(r'^(?P<slug>[\w-]+)/(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})/$',
+         views.TournamentMatchdayView.as_view(), name='tournament_matchday'),
     path('video/<int:pk>/',
          views.LegacyVideoRedirectView.as_view(), name='legacy_video_detail'),
+    re_path(r'video/(?P<slug>[\w-]+)/(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})/(?P<order>[0-9]+)/'
+            r'chat/stream/$',
+         views.VideoChatStreamView.as_view(), name='video_chat_stream'),
+    re_path(r'video/(?P<slug>[\w-]+)/(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})/(?P<order>[0-9]+)/'
+            r'chat/stream/(?P<stream>[0-9a-f]{32})/$',
+         views.VideoChatStreamView.as_view(), name='video_chat_stream_position'),
+    re_path(r'video/(?P<slug>[\w-]+)/(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})/(?P<order>[0-9]+)/chat/$',
+         views.VideoChatView.as_view(), name='video_chat'),
     re_path(r'video/(?P<slug>[\w-]+)/(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})/(?P<order>[0-9]+)/',
          views.VideoView.as_view(), name='video_detail_order'),
     re_path(r'video/(?P<slug>[\w-]+)/(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})/',
@@ -0,0 +1,39 @@
+"""Version stamps for cached archive content.
+
+The version of a scope is the time its content last changed. Scopes are
+`archive` for the whole archive and `<model>:<pk>` for single objects. Stamps
+live in the `VERSION_CACHE` cache, so a stamp that has been evicted starts over
+from the current time, which only invalidates the content cached under the old
+stamp.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _key(scope: str) -> str:
+    return f'archive:version:{scope}'
+
+
+def get_versions(*scopes) -> dict:
+    """Return the version stamps of `scopes`."""
+    cache = caches[settings.VERSION_CACHE]
+    keys = {_key(scope): scope for scope in scopes}
+    versions = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def get_version(scope: str) -> float:
+    """Return the version stamp of `scope`."""
+    return get_versions(scope)[scope]
+
+
+def bump_versions(*scopes):
+    """Mark the content in `scopes` as changed."""
+    now = time.time()
+    caches[settings.VERSION_CACHE].set_many({_key(scope): now for scope in scopes}, timeout=None)
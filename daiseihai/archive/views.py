@@ -1,14 +1,83 @@
 import datetime
+import hashlib
+import math
+from urllib.parse import urlencode
 
-from django.db.models import Count, F, Prefetch, Q, Window
-from django.db.models.functions import RowNumber
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
-from django.views.generic import DetailView, ListView, RedirectView, View
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.generic import DetailView, ListView, RedirectView, TemplateView, View
+from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.list import MultipleObjectMixin
 
-from daiseihai.archive import models
+from daiseihai.archive import chat, constants, models, search, versions
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class VersionedPageMixin():
+    """Cache whole responses and answer conditional requests using the version
+    stamps of the content shown on the page.
+    """
+
+    # Query parameters read by the view. Other parameters do not change the
+    # page, so they do not get cache entries of their own.
+    page_query_params = ()
+
+    def get_page_object(self):
+        """Return the object the page is about, raising Http404 if it does not
+        exist, or None if the page is not about a single object. It is looked
+        up before the version stamps are read, so that missing or renamed
+        objects never get stamps or cached pages.
+        """
+        if isinstance(self, SingleObjectMixin):
+            return self.get_object()
+        return None
+
+    def get_object(self, queryset=None):
+        if queryset is None and getattr(self, 'page_object', None) is not None:
+            return self.page_object
+        return super().get_object(queryset)
+
+    def get_version_scopes(self):
+        """Return the version scopes of the content on the page."""
+        return ['archive']
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        self.kwargs = kwargs
+        self.page_object = self.get_page_object()
+        version = max(versions.get_versions(*self.get_version_scopes()).values())
+        # Deploys change the static asset URLs on every page.
+        release = settings.RAVEN_CONFIG['release'] or ''
+        etag = quote_etag(hashlib.sha1(f'{release}:{version}'.encode()).hexdigest())
+        last_modified = math.ceil(version)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            query = urlencode([(name, value) for name in self.page_query_params
+                               for value in request.GET.getlist(name)])
+            page = f'{request.path}?{query}'
+            key = f'archive:page:{hashlib.sha1(page.encode()).hexdigest()}:{etag}'
+            cached = cache.get(key)
+            if cached is not None:
+                response = HttpResponse(cached[0], content_type=cached[1])
+            else:
+                response = super().dispatch(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                if hasattr(response, 'render'):
+                    response.render()
+                cache.set(key, (response.content, response['Content-Type']),
+                          PAGE_CACHE_TIMEOUT)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
 
 
 class VideoViewMixin():
@@ -26,45 +95,110 @@ class VideoViewMixin():
                                    .filter(is_visible=True)
 
 
-class TeamDetailView(VideoViewMixin, DetailView):
+class SearchView(TemplateView):
+    """Full-text search over chat logs."""
+
+    template_name = 'archive/search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '').strip()
+        results = search.search(context['query'])
+        # Messages are rendered from their tokens, like in the chat player,
+        # with the emotes of the league of the video showing them.
+        leagues = {video.tournament.league_id for _, video in results if video}
+        emotes = {}
+        for emote in models.Emote.objects.filter(league__in=leagues):
+            emotes.setdefault(emote.league_id, {})[emote.name] = emote.image.url
+        context['results'] = []
+        for message, video in results:
+            video_emotes = emotes.get(video.tournament.league_id, {}) if video else {}
+            context['results'].append((message, video, chat.tokenize(message.message, video_emotes),
+                                       video_emotes))
+        context['constants'] = constants
+        return context
+
+
+class TeamDetailView(VersionedPageMixin, VideoViewMixin, DetailView):
     model = models.Team
 
+    def get_version_scopes(self):
+        return [f'team:{self.kwargs["slug"]}']
+
     def get_videos(self):
         queryset = super().get_videos()
-        team_filter = Q(matchups__home=self.object) | Q(matchups__away=self.object)
         return queryset.select_related('tournament')\
-                       .filter(team_filter).reverse().distinct()
+                       .filter(self.object.video_filter).reverse()
 
 
-class TeamListView(ListView):
+class TeamListView(VersionedPageMixin, ListView):
     model = models.Team
 
     def get_queryset(self):
-        video_count = Count('home_games') + Count('away_games')
-        return self.model.objects.annotate(video_count=video_count)\
-                                 .filter(video_count__gt=0)
+        return self.model.objects.filter(video_count__gt=0)
 
 
-class TournamentDetailView(VideoViewMixin, DetailView):
+class TournamentDetailView(VersionedPageMixin, VideoViewMixin, DetailView):
+    """Tournament page. Large tournaments are split into matchdays, of which
+    only the first ones are rendered with the page and the rest are loaded
+    from `TournamentMatchdayView` when needed.
+    """
+
     model = models.Tournament
 
+    def get_version_scopes(self):
+        return [f'tournament:{self.kwargs["slug"]}']
+
+    def get_context_data(self, **kwargs):
+        if self.object.video_count >= constants.MATCHDAY_LAYOUT_MIN_VIDEOS:
+            self.matchdays = list(
+                models.Video.objects.filter(tournament=self.object, is_visible=True)
+                                    .order_by('date').values_list('date', flat=True).distinct()
+            )
+        else:
+            self.matchdays = []
+        context = super().get_context_data(**kwargs)
+        context['matchdays'] = self.matchdays
+        context['initial_matchdays'] = constants.INITIAL_MATCHDAYS
+        return context
+
     def get_videos(self):
         queryset = super().get_videos()
-        part = Window(expression=RowNumber(), partition_by=F('date'),
-                      order_by=('date', 'order'))
-        part_count = Window(expression=Count('*'), partition_by=F('date'))
-        return queryset.filter(tournament=self.object)\
-                       .annotate(part=part, part_count=part_count)
+        queryset = queryset.select_related('tournament').filter(tournament=self.object)
+        if self.matchdays:
+            queryset = queryset.filter(
+                date__lte=self.matchdays[:constants.INITIAL_MATCHDAYS][-1]
+            )
+        return queryset
+
+
+class TournamentMatchdayView(VersionedPageMixin, VideoViewMixin, DetailView):
+    """Video cards of a single matchday of a tournament."""
+
+    model = models.Tournament
+    template_name = 'archive/matchday.html'
+
+    def get_version_scopes(self):
+        return [f'tournament:{self.kwargs["slug"]}']
+
+    def get_videos(self):
+        try:
+            date = datetime.date.fromisoformat(self.kwargs['date'])
+        except ValueError:
+            raise Http404('No such day')
+        videos = super().get_videos().select_related('tournament')\
+                                     .filter(tournament=self.object, date=date)
+        if not videos:
+            raise Http404('No videos on this day')
+        return videos
 
 
-class TournamentListView(ListView):
+class TournamentListView(VersionedPageMixin, ListView):
     model = models.Tournament
 
     def get_queryset(self):
         """Return all visible tournaments."""
-        video_count = Count('videos', filter=Q(videos__is_visible=True))
-        return self.model.objects.annotate(video_count=video_count)\
-                                 .filter(video_count__gt=0)
+        return self.model.objects.filter(video_count__gt=0)
 
 
 class LegacyVideoRedirectView(RedirectView):
@@ -78,10 +212,7 @@ class LegacyVideoRedirectView(RedirectView):
             models.Video.objects.select_related("tournament"), pk=kwargs.pop("pk")
         )
         kwargs.update(slug=video.tournament.slug, date=video.date.isoformat())
-        same_day_videos = models.Video.objects.filter(
-            tournament=video.tournament, date=video.date
-        )
-        if video.order != 1 or same_day_videos.count() > 1:
+        if video.order != 1 or video.part_count > 1:
             kwargs["order"] = video.order
             self.pattern_name = "video_detail_order"
         return super().get_redirect_url(*args, **kwargs)
@@ -94,5 +225,51 @@ class VideoView(DetailView):
         date = datetime.date.fromisoformat(self.kwargs["date"])
         order = int(self.kwargs.get("order", 1))
         return get_object_or_404(
-            self.model, date=date, order=order, tournament__slug=self.kwargs["slug"]
+            self.model.objects.select_related("tournament__league", "chat"),
+            date=date,
+            order=order,
+            tournament__slug=self.kwargs["slug"],
         )
+
+
+class VideoChatView(VideoView):
+    """Chat lines of a video within a `[from, to)` window given in milliseconds
+    relative to the start of the video.
+    """
+
+    def get(self, request, *args, **kwargs):
+        video = self.get_object()
+        if not video.has_chat:
+            raise Http404("Video has no chat")
+        try:
+            start = max(int(request.GET.get("from", 0)), 0)
+            end = int(request.GET.get("to", start + constants.CHAT_SEGMENT_MAX_LENGTH))
+        except ValueError:
+            return HttpResponseBadRequest("Invalid chat window")
+        end = min(end, start + constants.CHAT_SEGMENT_MAX_LENGTH)
+        if video.duration:
+            end = min(end, video.duration * 1000)
+        path, offset, emotes = video.chat_source()
+        if video.chat.overlaps(video.chat_start + start, video.chat_start + end):
+            lines = chat.read_window(path, offset + start, offset + end)
+        else:
+            lines = []
+        return JsonResponse({
+            "from": start,
+            "to": end,
+            "lines": [
+                [line.timestamp - offset, line.team, line.user,
+                 chat.message_tokens(line.message, emotes)]
+                for line in lines
+            ],
+        })
+
+
+class VideoChatStreamView(View):
+    """Chat streams are served by the ASGI application in
+    `daiseihai.archive.stream`; other deployments only have the chat windows
+    of `VideoChatView`.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        raise Http404("Chat streams are only served over ASGI")
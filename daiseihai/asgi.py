@@ -0,0 +1,20 @@
+"""
+ASGI config for daiseihai project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Chat streams are served by the application directly; every other request is
+handled by Django.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "daiseihai.settings.production")
+
+django_application = get_asgi_application()
+
+# Models can only be imported once Django has been set up.
+from daiseihai.archive.stream import ChatStreamRouter  # noqa: E402
+
+application = ChatStreamRouter(django_application)
@@ -1,4 +1,5 @@
 import setupSentry from './sentry';
+import {ready as matchdaysReady} from './matchdays';
 import {ready as videoReady} from './video'
 
 
@@ -9,6 +10,7 @@ function ready() {
     if (document.getElementById('videoPage') != null) {
         videoReady();
     }
+    matchdaysReady();
 }
 
 if (document.readyState !== 'loading') {
@@ -0,0 +1,74 @@
+// Matchdays of large tournaments are loaded when they scroll into view or
+// their #day-N anchor is opened.
+const PRELOAD_MARGIN = '600px';
+
+var observer = null;
+
+
+export function ready() {
+    var placeholders = document.getElementsByClassName('matchday-placeholder');
+    if (placeholders.length == 0) {
+        return;
+    }
+    if ('IntersectionObserver' in window) {
+        observer = new IntersectionObserver(placeholderVisible, {rootMargin: PRELOAD_MARGIN});
+        for (var i = 0; i < placeholders.length; i++) {
+            observer.observe(placeholders[i]);
+        }
+    } else {
+        // Load everything at once on old browsers.
+        for (var i = placeholders.length - 1; i >= 0; i--) {
+            loadMatchday(placeholders[i]);
+        }
+    }
+    window.addEventListener('hashchange', loadFromHash);
+    loadFromHash();
+}
+
+
+function loadFromHash() {
+    let header = document.getElementById(window.location.hash.substring(1));
+    if (header == null || !header.classList.contains('year')) {
+        return;
+    }
+    let placeholder = header.nextElementSibling;
+    if (placeholder != null && placeholder.classList.contains('matchday-placeholder')) {
+        loadMatchday(placeholder).then(() => header.scrollIntoView());
+    }
+}
+
+
+function loadMatchday(placeholder) {
+    if (placeholder.loading != null) {
+        return placeholder.loading;
+    }
+    if (observer != null) {
+        observer.unobserve(placeholder);
+    }
+    placeholder.loading = fetch(placeholder.dataset.src)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Loading ${placeholder.dataset.src} failed: ${response.status}`);
+            }
+            return response.text();
+        })
+        .then(html => {
+            let template = document.createElement('template');
+            template.innerHTML = html;
+            placeholder.replaceWith(template.content);
+        })
+        .catch(error => {
+            placeholder.loading = null;
+            console.error(error);
+        });
+    return placeholder.loading;
+}
+
+
+function placeholderVisible(entries) {
+    for (var i = 0; i < entries.length; i++) {
+        if (entries[i].isIntersecting) {
+            loadMatchday(entries[i].target);
+        }
+    }
+}
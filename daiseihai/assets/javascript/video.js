@@ -1,9 +1,9 @@
-import Papa from 'papaparse';
-
-var chatData = [];
 var chatDelay = 0;
 var chatIndex = 0;
 var chatLastUpdate = 0;
+var chatSegmentIndex = 0;
+var chatSegments = {};
+var chatSrc = '';
 var chatStart = 0;
 var metadata = {};
 var previousTime = 0;
@@ -11,8 +11,12 @@ var seeking = true;
 var updatingChat = false;
 var videoLeague = '';
 
-const emoteRe = /(?:^|\s):([A-Za-z0-9]+?):(?!\S)/g;
+// Kinds of chat message tokens, see `constants.CHAT_TOKEN_*`.
+const TOKEN_TEXT = 1;
+const TOKEN_GREENTEXT = 2;
+const TOKEN_EMOTE = 3;
 const MAX_MESSAGES_NUM = 60;
+const CHAT_SEGMENT_LENGTH = 5 * 60 * 1000;
 
 export function ready() {
     global.videoElement = document.querySelector('video');
@@ -95,26 +99,35 @@ function createMessage(line) {
 
     var msg = document.createElement('span');
     msg.classList.add('msg');
-    if (line[3].startsWith('&gt;')) {
-        msg.classList.add('green');
-    }
-    var emoteMatch;
-    while((emoteMatch = emoteRe.exec(line[3])) !== null) {
-        let emoteSrc = metadata.emotes[emoteMatch[1]];
-        if (emoteSrc !== undefined) {
-            let emote = document.createElement('img');
-            emote.classList.add('emote');
-            emote.src = emoteSrc;
-            line[3] = line[3].replace(emoteMatch[0], emote.outerHTML);
+    for (const [kind, value] of line[3]) {
+        if (kind == TOKEN_EMOTE) {
+            msg.appendChild(createEmote(value));
+            continue;
         }
+        if (kind == TOKEN_GREENTEXT) {
+            msg.classList.add('green');
+        }
+        msg.appendChild(document.createTextNode(value));
     }
-    msg.innerHTML = line[3];
     container.appendChild(msg);
 
     global.chatContainer.prepend(container);
 }
 
 
+function createEmote(name) {
+    let emoteSrc = metadata.emotes[name];
+    if (emoteSrc === undefined) {
+        return document.createTextNode(`:${name}:`);
+    }
+    let emote = document.createElement('img');
+    emote.classList.add('emote');
+    emote.alt = `:${name}:`;
+    emote.src = emoteSrc;
+    return emote;
+}
+
+
 function formatSeconds(secondString) {
     var components = [];
     var time = parseFloat(secondString);
@@ -137,7 +150,7 @@ function formatSeconds(secondString) {
 
 
 
-function loadChat(chatSrc, metadataSrc) {
+function loadChat(metadataSrc) {
     if (global.videoElement == null) {
         return;
     }
@@ -151,38 +164,46 @@ function loadChat(chatSrc, metadataSrc) {
             console.info(`Loaded chat metadata.`)
         });
     });
-    Papa.parse(chatSrc, {
-        download: true,
-        delimiter: "\t",
-        complete: function(results, file) {
-            chatData = results.data;
-            var startIndex = 0;
-            var endIndex = chatData.length + 1;
-            var duration = Math.floor(window.videoElement.duration * 1000);
-            for (var i = 0; i < chatData.length; i++) {
-                chatData[i][0] = parseInt(chatData[i][0]) - chatStart;
-                if (chatData[i][0] < 0) {
-                    startIndex = i;
-                } else if (chatData[i][0] > duration) {
-                    endIndex = i;
-                    break;
-                }
-            }
-            chatData = chatData.slice(startIndex + 1, endIndex);
-            console.info(`Loaded ${chatData.length} chat messages.`)
-            metadataLoaded.then(function() {
-                global.videoElement.addEventListener('playing', function() {
-                    window.requestAnimationFrame(updateChat);
-                });
-
-                if (!global.videoElement.paused) {
-                    window.requestAnimationFrame(updateChat);
-                }
-            });
+    loadChatSegment(currentSegmentIndex());
+    metadataLoaded.then(function() {
+        global.videoElement.addEventListener('playing', function() {
+            window.requestAnimationFrame(updateChat);
+        });
+
+        if (!global.videoElement.paused) {
+            window.requestAnimationFrame(updateChat);
+        }
+    });
+}
+
+
+function loadChatSegment(index) {
+    if (index in chatSegments) {
+        return;
+    }
+    // Mark the segment as pending so that it is only requested once.
+    chatSegments[index] = null;
+    var from = index * CHAT_SEGMENT_LENGTH;
+    var to = from + CHAT_SEGMENT_LENGTH;
+    fetch(`${chatSrc}?from=${from}&to=${to}`).then(function(response) {
+        if (response.status !== 200) {
+            console.error(`Unable to fetch chat segment ${index}.`);
+            delete chatSegments[index];
+            return;
         }
+        response.json().then(function(data) {
+            chatSegments[index] = data.lines;
+            console.info(`Loaded ${data.lines.length} chat messages for segment ${index}.`)
+        });
     });
 }
 
+
+function currentSegmentIndex() {
+    var time = Math.floor(global.videoElement.currentTime * 1000) - chatDelay;
+    return Math.floor(Math.max(time, 0) / CHAT_SEGMENT_LENGTH);
+}
+
 function keydownHandler(event) {
     switch (event.code) {
         case "ArrowDown":
@@ -280,28 +301,34 @@ function updateChat() {
     var time = Math.floor(global.videoElement.currentTime * 1000);
     time -= chatDelay;
 
-    // If the video has gone back in time, find the current chat position again.
-    if (previousTime > time) {
+    var segmentIndex = currentSegmentIndex();
+    loadChatSegment(segmentIndex);
+    loadChatSegment(segmentIndex + 1);
+
+    // If the video has gone back in time or skipped past the next segment,
+    // start over from the beginning of the current segment.
+    if (previousTime > time || segmentIndex > chatSegmentIndex + 1) {
         clearChat();
+        chatSegmentIndex = segmentIndex;
         chatIndex = 0;
-        while (chatIndex < chatData.length) {
-            if (time < chatData[chatIndex][0]) {
-                break;
-            }
-            chatIndex += 1;
-        }
-        chatIndex = Math.max(chatIndex - MAX_MESSAGES_NUM, 0);
     }
 
     var messages = [];
-    while (chatIndex < chatData.length) {
-        var line = chatData[chatIndex];
-        if (line[0] <= time) {
-            messages.push(line);
+    while (chatSegmentIndex <= segmentIndex) {
+        var lines = chatSegments[chatSegmentIndex];
+        if (!lines) {
+            // Segment is still loading.
+            break;
+        }
+        while (chatIndex < lines.length && lines[chatIndex][0] <= time) {
+            messages.push(lines[chatIndex]);
             chatIndex += 1;
-        } else {
+        }
+        if (chatSegmentIndex == segmentIndex) {
             break;
         }
+        chatSegmentIndex += 1;
+        chatIndex = 0;
     }
 
     // Draw last MAX_MESSAGES_NUM captured chat messages.
@@ -326,8 +353,8 @@ function videoLoaded() {
     seekToInitial();
     if (global.chatContainer != null) {
         resizeChat();
-        var chatSrc = global.chatContainer.dataset.src;
+        chatSrc = global.chatContainer.dataset.src;
         var metadataSrc = global.chatContainer.dataset.metadata;
-        loadChat(chatSrc, metadataSrc);
+        loadChat(metadataSrc);
     }
 }
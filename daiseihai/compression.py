@@ -0,0 +1,153 @@
+"""Precompressed variants of text media files.
+
+Every compressed file gets `.gz` and, when the optional `brotli` package is
+installed, `.br` siblings. The SHA-256 of the source is kept in a `.sha256`
+sibling so that the variants are only rebuilt when the source changes.
+
+Files saved during requests only get a quickly compressed `.gz` variant and no
+`.sha256`, so the next `compress_media` run writes the full set.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+
+from django.core import checks
+from django.utils.cache import patch_vary_headers
+from django.utils._os import safe_join
+from django.views import static
+
+# Optional dependency (`pip install brotli`) for the .br variants.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred encodings first.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _compress_gzip(content: bytes, level=9) -> bytes:
+    # A fixed modification time keeps the output identical for identical input.
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def _compress_brotli(content: bytes) -> bytes:
+    return brotli.compress(content, quality=11)
+
+
+def _compressors():
+    compressors = {'.gz': _compress_gzip}
+    if brotli is not None:
+        compressors['.br'] = _compress_brotli
+    return compressors
+
+
+def _write(path: str, content: bytes):
+    with open(f'{path}.tmp', 'wb') as f:
+        f.write(content)
+    os.replace(f'{path}.tmp', path)
+
+
+def compress_file(path: str, force=False, fast=False) -> bool:
+    """Write the compressed variants of the file at `path` unless they were
+    already built from the same content. Returns whether they were written.
+
+    With `fast`, only a quickly compressed `.gz` variant is written.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if fast:
+        _write(f'{path}.gz', _compress_gzip(content, level=1))
+        try:
+            os.remove(f'{path}.sha256')
+        except FileNotFoundError:
+            pass
+        return True
+    digest = hashlib.sha256(content).hexdigest()
+    compressors = _compressors()
+    if not force:
+        try:
+            with open(f'{path}.sha256') as f:
+                up_to_date = f.read() == digest
+        except FileNotFoundError:
+            up_to_date = False
+        if up_to_date and all(os.path.exists(path + extension) for extension in compressors):
+            return False
+    for extension, compress in compressors.items():
+        _write(path + extension, compress(content))
+    _write(f'{path}.sha256', digest.encode())
+    return True
+
+
+def compress_files(paths, processes=None, force=False):
+    """Compress the files at `paths` in a pool of `processes` processes.
+    Returns the paths of the files whose variants were written.
+    """
+    paths = list(paths)
+    with ProcessPoolExecutor(processes) as executor:
+        written = executor.map(compress_file, paths, [force] * len(paths), chunksize=16)
+        return [path for path, was_written in zip(paths, written) if was_written]
+
+
+def check_brotli(app_configs, **kwargs):
+    """Warn on deployment checks when the optional brotli package is missing."""
+    if brotli is not None:
+        return []
+    return [checks.Warning(
+        'The brotli package is not installed, so only gzip variants of media files '
+        'are written.',
+        hint='Install it with `pip install brotli`.',
+        id='daiseihai.W001',
+    )]
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Return the content codings accepted by an Accept-Encoding header."""
+    accepted = set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def serve(request, path, document_root=None, show_indexes=False):
+    """Serve a file like `django.views.static.serve`, serving its
+    precompressed variant instead if the client accepts its encoding and the
+    variant is not older than the file.
+    """
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    path = posixpath.normpath(path).lstrip('/')
+    response = None
+    try:
+        source_mtime = os.stat(safe_join(document_root, path)).st_mtime
+    except (OSError, ValueError):
+        source_mtime = None
+    for encoding, extension in ENCODINGS:
+        if source_mtime is None or (encoding not in accepted and '*' not in accepted):
+            continue
+        try:
+            variant_mtime = os.stat(safe_join(document_root, path + extension)).st_mtime
+        except OSError:
+            continue
+        if variant_mtime >= source_mtime:
+            response = static.serve(request, path + extension, document_root)
+            if response.status_code == 200:
+                content_type, _ = mimetypes.guess_type(path)
+                response['Content-Type'] = content_type or 'application/octet-stream'
+                response['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = static.serve(request, path, document_root, show_indexes)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
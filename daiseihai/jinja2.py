@@ -1,8 +1,12 @@
+import os
+
 from django.conf import settings
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.urls import reverse
 from django.utils.formats import date_format
-from jinja2 import Environment
+from jinja2 import Environment, FileSystemBytecodeCache
+
+from daiseihai.archive import fragments
 
 
 def dateformat(value) -> str:
@@ -15,11 +19,20 @@ def url(viewname: str, *args, **kwargs) -> str:
 
 
 def environment(**options) -> Environment:
-    """Generate an environment for Jinja2."""
+    """Generate an environment for Jinja2.
+
+    With `JINJA2_BYTECODE_CACHE_DIR` set, compiled templates are cached in that
+    directory and templates are never reloaded from disk once loaded.
+    """
+    if settings.JINJA2_BYTECODE_CACHE_DIR:
+        os.makedirs(settings.JINJA2_BYTECODE_CACHE_DIR, exist_ok=True)
+        options['bytecode_cache'] = FileSystemBytecodeCache(settings.JINJA2_BYTECODE_CACHE_DIR)
+        options['auto_reload'] = False
     env = Environment(**options)
     env.globals.update({
         'static': staticfiles_storage.url,
         'url': url,
+        'video_card': fragments.video_card,
         'daiseihai': {
             'release': settings.RAVEN_CONFIG['release'] or ''
         }
@@ -8,5 +8,29 @@ RAVEN_CONFIG['dsn'] = secrets.RAVEN_DSN
 
 STATIC_ROOT = '/srv/www/bootleg.hamuko.moe/html/static/'
 MEDIA_ROOT = '/srv/www/bootleg.hamuko.moe/html/media/'
+JINJA2_BYTECODE_CACHE_DIR = '/srv/www/bootleg.hamuko.moe/cache/jinja2/'
+
+# The default cache holds a card fragment and a page per video and a page per
+# tournament, matchday and team, so it is sized for an archive of well over
+# 10000 videos. Version stamps get a cache of their own so that culling pages
+# never evicts them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/srv/www/bootleg.hamuko.moe/cache/django/',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/srv/www/bootleg.hamuko.moe/cache/versions/',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+}
+VERSION_CACHE = 'versions'
 
 VIDEO_URL = 'https://bootleg.hamuko.moe/videos/'
+VIDEO_ROOT = '/srv/www/bootleg.hamuko.moe/html/videos/'
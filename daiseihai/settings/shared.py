@@ -66,7 +66,15 @@ TEMPLATES = [
     },
 ]
 
+# Directory for cached compiled Jinja2 templates. Disables template reloading.
+JINJA2_BYTECODE_CACHE_DIR = None
+
+# Cache alias holding the version stamps of cached pages and fragments. A
+# separate cache keeps the stamps from being culled along with the content.
+VERSION_CACHE = 'default'
+
 WSGI_APPLICATION = 'daiseihai.wsgi.application'
+ASGI_APPLICATION = 'daiseihai.asgi.application'
 
 DATABASES = {
     'default': {
@@ -108,3 +116,16 @@ RAVEN_CONFIG = {
 }
 
 FILE_UPLOAD_PERMISSIONS = 0o644
+
+# Directory of the local video files and the ffprobe and ffmpeg used to read
+# their metadata and poster frames.
+VIDEO_ROOT = None
+FFPROBE_PATH = 'ffprobe'
+FFMPEG_PATH = 'ffmpeg'
+
+# Location of the team logos on the wiki and the class used to download them.
+TEAM_LOGO_URL = 'https://implyingrigged.info/wiki/Special:Redirect/file/'
+TEAM_LOGO_FETCHER = 'daiseihai.archive.logos.HTTPFetcher'
+
+# Users whose lines are dropped when chat logs are ingested.
+CHAT_BLOCKED_USERS = ('Blinkyy', )
@@ -1,4 +1,10 @@
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
 import os
+import time
+import uuid
 
 from django.core.files.storage import FileSystemStorage
 from django.conf import settings
@@ -8,3 +14,200 @@ class OverwriteStorage(FileSystemStorage):
     def get_available_name(self, name, max_length=None):
         self.delete(name)
         return name
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Storage that keeps files under names derived from their content.
+
+    Files are saved as blobs named after the SHA-256 hash of their content and
+    a manifest maps the names used by models to the blobs. Saving a file under
+    an existing name replaces the mapping, identical files share a blob and
+    blob URLs never change content, so they can be cached forever. Blobs that
+    are no longer mapped are removed by `collect_garbage`.
+
+    The manifest is split into shards by the hash of the name, each with its
+    own lock, so saves only wait for saves of names in the same shard. Garbage
+    collection excludes all saves. Manifest entries hold the blob and the time
+    the name was saved, which keeps new names from being collected before the
+    model using them is saved. Blob files are never touched after they are
+    written, so files kept beside them stay newer than the blob.
+
+    Names missing from the manifest refer to files stored under the name
+    itself, as saved by `OverwriteStorage`.
+    """
+
+    blob_directory = 'blobs'
+    manifest_directory = 'blobs/manifest'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._shards = {}
+
+    def _shard(self, name: str) -> str:
+        return hashlib.sha256(name.encode('utf-8')).hexdigest()[:2]
+
+    def _shard_path(self, shard: str) -> str:
+        return super().path(f'{self.manifest_directory}/{shard}.json')
+
+    def _load_shard(self, shard: str) -> dict:
+        """Return a manifest shard, reading it again only if it has changed."""
+        path = self._shard_path(shard)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        cached = self._shards.get(shard)
+        if cached is None or cached[0] != (path, mtime_ns):
+            with open(path) as f:
+                cached = self._shards[shard] = ((path, mtime_ns), json.load(f))
+        return cached[1]
+
+    def load_manifest(self) -> dict:
+        """Return the mapping of every name to its `[blob, saved time]` entry."""
+        try:
+            filenames = os.listdir(super().path(self.manifest_directory))
+        except FileNotFoundError:
+            return {}
+        manifest = {}
+        for filename in sorted(filenames):
+            if filename.endswith('.json'):
+                manifest.update(self._load_shard(filename[:-len('.json')]))
+        return manifest
+
+    @contextmanager
+    def _lock(self, operation):
+        """Hold the storage-wide lock, shared by saves and taken exclusively by
+        garbage collection.
+        """
+        path = super().path(f'{self.manifest_directory}/.lock')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as lock:
+            fcntl.flock(lock, operation)
+            yield
+
+    @contextmanager
+    def _update_shard(self, shard: str):
+        """Lock a manifest shard and yield it for changes, writing it back
+        afterwards.
+        """
+        path = self._shard_path(shard)
+        with open(f'{path}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = dict(self._load_shard(shard))
+            yield entries
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(entries, f, indent=0, sort_keys=True)
+            os.replace(f'{path}.tmp', path)
+
+    def blob_name(self, name: str) -> str:
+        """Return the name of the blob stored under `name`."""
+        entry = self._load_shard(self._shard(name)).get(name)
+        return entry[0] if entry else name
+
+    def get_available_name(self, name, max_length=None):
+        # Saving under an existing name replaces the mapping.
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        _, extension = os.path.splitext(name)
+        blob = f'{self.blob_directory}/{digest[:2]}/{digest}{extension.lower()}'
+        with self._lock(fcntl.LOCK_SH):
+            if not super().exists(blob):
+                content.seek(0)
+                self._write_blob(blob, content)
+            with self._update_shard(self._shard(name)) as entries:
+                entries[name] = [blob, int(time.time())]
+        return name
+
+    def _write_blob(self, blob, content):
+        """Write `content` to a temporary file and link it as `blob`, so that
+        blobs only appear once complete. If another save has stored the same
+        blob in the meantime, its file is kept.
+        """
+        temp_name = super()._save(f'{blob}.{uuid.uuid4().hex}.tmp', content)
+        temp_path = super().path(temp_name)
+        try:
+            os.link(temp_path, super().path(blob))
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+
+    def path(self, name):
+        return super().path(self.blob_name(name))
+
+    def url(self, name):
+        return super().url(self.blob_name(name))
+
+    def _is_mapped(self, name) -> bool:
+        return name in self._load_shard(self._shard(name))
+
+    def exists(self, name):
+        return self._is_mapped(name) or super().exists(name)
+
+    def delete(self, name):
+        if self._is_mapped(name):
+            # The blob may be shared, so it is left for garbage collection.
+            with self._lock(fcntl.LOCK_SH), self._update_shard(self._shard(name)) as entries:
+                entries.pop(name, None)
+        else:
+            super().delete(name)
+
+    def adopt(self, name) -> bool:
+        """Move a file stored under `name` itself into a blob. Returns whether
+        the file was moved.
+        """
+        if self._is_mapped(name) or not super().exists(name):
+            return False
+        legacy_path = super().path(name)
+        with self.open(name, 'rb') as f:
+            self._save(name, f)
+        os.remove(legacy_path)
+        return True
+
+    def collect_garbage(self, live_names, min_age=3600, dry_run=False):
+        """Remove manifest entries for names not in `live_names` and blobs that
+        are not mapped from any name, including the files kept beside them.
+        Names saved and blob files modified less than `min_age` seconds ago are
+        kept so that files being saved are not removed.
+
+        Returns the removed names and blob files.
+        """
+        cutoff = time.time() - min_age
+        live_names = set(live_names)
+
+        with self._lock(fcntl.LOCK_EX):
+            removed_names = []
+            live_digests = set()
+            for shard in sorted({self._shard(name) for name in self.load_manifest()}):
+                with self._update_shard(shard) as entries:
+                    removed = [name for name, (_, saved) in entries.items()
+                               if name not in live_names and saved < cutoff]
+                    if not dry_run:
+                        for name in removed:
+                            del entries[name]
+                    live_digests.update(os.path.basename(blob).split('.')[0]
+                                        for name, (blob, _) in entries.items()
+                                        if name not in removed)
+                    removed_names.extend(removed)
+
+            removed_files = []
+            root = super().path(self.blob_directory)
+            manifest_root = super().path(self.manifest_directory)
+            for directory, _, filenames in os.walk(root):
+                if directory in (root, manifest_root):
+                    continue
+                for filename in filenames:
+                    file_path = os.path.join(directory, filename)
+                    if filename.split('.')[0] in live_digests:
+                        continue
+                    if os.stat(file_path).st_mtime >= cutoff:
+                        continue
+                    removed_files.append(os.path.relpath(file_path, super().path('')))
+                    if not dry_run:
+                        os.remove(file_path)
+        return sorted(removed_names), removed_files
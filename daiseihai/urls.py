@@ -3,8 +3,10 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path, re_path
 
+from daiseihai import compression
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('daiseihai.archive.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+] + static(settings.MEDIA_URL, view=compression.serve, document_root=settings.MEDIA_ROOT)